@@ -1,15 +1,370 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 import tempfile
 import os
 import subprocess
 import json
 import uuid
 import re
+import threading
+import time
+import cProfile
 from pathlib import Path
+from urllib.parse import parse_qs
 
 app = FastAPI(title="KML to MBTiles Converter API")
 
+# Préfixe des dossiers temporaires de conversion (mesurés par la métrique kml_api_temp_bytes)
+TEMP_PREFIX = "kml_api_"
+
+# Profilage des requêtes : off (défaut), param (requêtes avec ?profile=1) ou all (toutes les requêtes)
+PROFILE_MODE = os.environ.get("KML_API_PROFILE", "off")
+PROFILE_DIR = Path(os.environ.get("KML_API_PROFILE_DIR") or Path(tempfile.gettempdir()) / "kml_api_profiles")
+PROFILE_LIST_LIMIT = 100
+# Profils conservés dans PROFILE_DIR : au-delà, les plus anciens sont supprimés
+PROFILE_MAX_FILES = int(os.environ.get("KML_API_PROFILE_MAX", "200"))
+
+# Bornes des histogrammes (secondes, octets)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1e4, 1e5, 1e6, 1e7, 5e7, 1e8, 5e8)
+
+
+# Métriques au format texte Prometheus, exposées sur /metrics
+class Metric:
+    """Métrique avec étiquettes ; les valeurs sont indexées par le tuple des valeurs d'étiquettes"""
+
+    lock = threading.Lock()
+    registry = []
+
+    def __init__(self, name, help_text, kind, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labels = labels
+        self.values = {}
+        Metric.registry.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + "}"
+
+    def samples(self):
+        """Lignes (suffixe, étiquettes, valeur) à exposer"""
+        return [("", self.label_text(key), value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        with Metric.lock:
+            return self.samples()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        samples = self.snapshot()
+        lines.extend(f"{self.name}{suffix}{labels} {value:g}" for suffix, labels, value in samples)
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, "counter", labels)
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with Metric.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Jauge mise à jour explicitement, ou calculée à chaque lecture par `collect()`"""
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        super().__init__(name, help_text, "gauge", labels)
+        self.collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with Metric.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def snapshot(self):
+        # Valeur calculée hors du verrou : collect() peut parcourir le disque
+        if self.collect is not None:
+            return [("", "", self.collect())]
+        return super().snapshot()
+
+
+class Histogram(Metric):
+    def __init__(self, name, help_text, buckets, labels=()):
+        super().__init__(name, help_text, "histogram", labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with Metric.lock:
+            counts = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        samples = []
+        for key, counts in self.values.items():
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                samples.append(("_bucket", self.label_text(key, [("le", le)]), count))
+            samples.append(("_count", self.label_text(key), counts[-2]))
+            samples.append(("_sum", self.label_text(key), counts[-1]))
+        return samples
+
+
+def temp_bytes():
+    """Taille totale des dossiers temporaires de conversion"""
+    root = Path(tempfile.gettempdir())
+    total = 0
+    for directory in root.glob(f"{TEMP_PREFIX}*"):
+        for path in directory.rglob("*"):
+            try:
+                if path.is_file():
+                    total += path.stat().st_size
+            except OSError:
+                pass
+    return total
+
+
+HTTP_REQUESTS = Counter("kml_api_http_requests_total", "Requêtes HTTP par endpoint, méthode et statut",
+                        ("endpoint", "method", "status"))
+HTTP_LATENCY = Histogram("kml_api_http_request_duration_seconds", "Durée des requêtes HTTP par endpoint",
+                         LATENCY_BUCKETS, ("endpoint",))
+HTTP_IN_PROGRESS = Gauge("kml_api_http_requests_in_progress", "Requêtes HTTP en cours")
+CONVERSIONS = Counter("kml_api_conversions_total", "Conversions par endpoint et résultat (success, error)",
+                      ("endpoint", "result"))
+INPUT_BYTES = Histogram("kml_api_input_bytes", "Taille des fichiers envoyés par endpoint", SIZE_BUCKETS, ("endpoint",))
+TIPPECANOE_EXITS = Counter("kml_api_tippecanoe_exit_total", "Fins de Tippecanoe par code de sortie", ("code",))
+TIPPECANOE_LATENCY = Histogram("kml_api_tippecanoe_duration_seconds", "Durée d'exécution de Tippecanoe", LATENCY_BUCKETS)
+OGR2OGR_FALLBACKS = Counter("kml_api_ogr2ogr_fallback_total",
+                            "Conversions KML manuelles faute d'ogr2ogr (missing) ou après son échec (failed)",
+                            ("reason",))
+ACTIVE_SUBPROCESSES = Gauge("kml_api_active_subprocesses", "Sous-processus en cours par commande", ("command",))
+TEMP_BYTES = Gauge("kml_api_temp_bytes", "Octets occupés par les dossiers temporaires de conversion", collect=temp_bytes)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : nombre, statut et durée des requêtes HTTP par endpoint"""
+
+    def __init__(self, app):
+        self.app = app
+        self.paths = None
+
+    def endpoint(self, scope):
+        # Chemins inconnus regroupés pour borner le nombre de séries
+        if self.paths is None:
+            self.paths = {route.path for route in app.routes}
+        return scope["path"] if scope["path"] in self.paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self.endpoint(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            HTTP_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            HTTP_REQUESTS.inc(endpoint=endpoint, method=scope["method"], status=status)
+
+
+app.add_middleware(MetricsMiddleware)
+
+
+def run_subprocess(cmd, **kwargs):
+    """subprocess.run comptabilisé dans les sous-processus actifs"""
+    command = os.path.basename(cmd[0])
+    ACTIVE_SUBPROCESSES.inc(command=command)
+    try:
+        return subprocess.run(cmd, **kwargs)
+    finally:
+        ACTIVE_SUBPROCESSES.dec(command=command)
+
+
+def run_tippecanoe(cmd):
+    """Exécute Tippecanoe en enregistrant sa durée et son code de sortie"""
+    start = time.perf_counter()
+    try:
+        result = run_subprocess(cmd, capture_output=True, text=True)
+    except FileNotFoundError:
+        TIPPECANOE_EXITS.inc(code="missing")
+        raise
+    TIPPECANOE_LATENCY.observe(time.perf_counter() - start)
+    TIPPECANOE_EXITS.inc(code=result.returncode)
+    return result
+
+
+def profile_entries():
+    """Étiquettes (.json) des profils enregistrés, les plus récents d'abord"""
+    entries = []
+    for path in PROFILE_DIR.glob("*.json"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            pass
+    return [path for _, path in sorted(entries, reverse=True)]
+
+
+def prune_profiles():
+    """Supprime les profils au-delà des PROFILE_MAX_FILES plus récents"""
+    for path in profile_entries()[PROFILE_MAX_FILES:]:
+        path.with_suffix(".pstats").unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI : profil cProfile d'une requête, enregistré dans PROFILE_DIR
+
+    L'identifiant du profil est renvoyé dans l'en-tête X-Profile-Id ; le profil est téléchargeable
+    via /profiles/{id}. Un seul profil à la fois : les requêtes concurrentes ne sont pas profilées.
+    cProfile reste actif pendant les await : les requêtes traitées entre-temps par la boucle
+    d'événements figurent dans le profil, qui n'est donc propre que sous charge séquentielle.
+    Leur nombre est noté dans l'étiquette overlapping_requests (0 : profil isolé).
+    """
+
+    # Marqueurs comptés dans le corps envoyé (objets GeoJSON et KML)
+    OBJECT_MARKERS = (b'"Feature"', b"<Placemark")
+
+    def __init__(self, app):
+        self.app = app
+        self.active = False
+        self.in_flight = 0
+        self.overlapping = 0
+
+    def wanted(self, scope):
+        if scope["type"] != "http" or PROFILE_MODE not in ("param", "all"):
+            return False
+        if scope["path"] == "/metrics" or scope["path"].startswith("/profiles"):
+            return False
+        if PROFILE_MODE == "all":
+            return True
+        return parse_qs(scope["query_string"].decode("latin-1")).get("profile") == ["1"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.active or not self.wanted(scope):
+            if self.active:
+                self.overlapping += 1
+            self.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+            return
+
+        # Pas de chaîne de requête dans les étiquettes : /profiles les liste sans authentification
+        profile_id = uuid.uuid4().hex
+        tags = {"id": profile_id, "endpoint": scope["path"], "method": scope["method"],
+                "status": 500, "input_bytes": 0, "objects": 0}
+        tail = b""
+
+        async def counting_receive():
+            nonlocal tail
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                tags["input_bytes"] += len(body)
+                # Recouvrement avec le bloc précédent pour les marqueurs à cheval sur deux blocs
+                chunk = tail + body
+                tags["objects"] += sum(chunk.count(marker) for marker in self.OBJECT_MARKERS)
+                tail = chunk[-(max(map(len, self.OBJECT_MARKERS)) - 1):]
+            return message
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                tags["status"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        self.active = True
+        # Requêtes déjà en cours, puis celles démarrées pendant le profil
+        self.overlapping = self.in_flight
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, counting_receive, send_with_id)
+        finally:
+            profiler.disable()
+            self.active = False
+            tags["duration_s"] = round(time.perf_counter() - start, 6)
+            tags["created"] = time.time()
+            tags["overlapping_requests"] = self.overlapping
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(PROFILE_DIR / f"{profile_id}.pstats")
+            (PROFILE_DIR / f"{profile_id}.json").write_text(json.dumps(tags), encoding="utf-8")
+            prune_profiles()
+
+
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.get("/profiles")
+async def list_profiles():
+    """Profils enregistrés (les plus récents d'abord), avec leurs étiquettes"""
+    if PROFILE_MODE not in ("param", "all"):
+        raise HTTPException(status_code=404, detail="Profilage désactivé (KML_API_PROFILE)")
+    profiles = []
+    for path in profile_entries()[:PROFILE_LIST_LIMIT]:
+        try:
+            profiles.append(json.loads(path.read_text(encoding="utf-8")))
+        except OSError:
+            pass
+    return profiles
+
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    """Fichier pstats d'un profil, nommé d'après l'endpoint, la taille envoyée et le nombre d'objets"""
+    if PROFILE_MODE not in ("param", "all"):
+        raise HTTPException(status_code=404, detail="Profilage désactivé (KML_API_PROFILE)")
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id) or not (PROFILE_DIR / f"{profile_id}.pstats").exists():
+        raise HTTPException(status_code=404, detail="Profil introuvable")
+    tags = json.loads((PROFILE_DIR / f"{profile_id}.json").read_text(encoding="utf-8"))
+    endpoint = tags["endpoint"].strip("/").replace("/", "_") or "root"
+    return FileResponse(
+        path=PROFILE_DIR / f"{profile_id}.pstats",
+        filename=f"profil_{endpoint}_{tags['input_bytes']}o_{tags['objects']}objets_{profile_id[:8]}.pstats",
+        media_type="application/octet-stream"
+    )
+
+
+# Endpoint synchrone, exécuté dans le pool de threads : kml_api_temp_bytes parcourt les dossiers temporaires
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métriques au format texte Prometheus"""
+    body = "\n".join(metric.render() for metric in Metric.registry) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     """Endpoint racine"""
@@ -29,15 +384,18 @@ async def convert_geojson_to_mbtiles(
     if not file.filename.endswith('.geojson'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un GeoJSON")
     
+    endpoint = "/convert-geojson-to-mbtiles"
+    content = await file.read()
+    INPUT_BYTES.observe(len(content), endpoint=endpoint)
+    
     # Créer un dossier temporaire unique
-    temp_dir = Path(tempfile.mkdtemp())
+    temp_dir = Path(tempfile.mkdtemp(prefix=TEMP_PREFIX))
     temp_id = str(uuid.uuid4())
     
     try:
         # Sauvegarder le fichier GeoJSON
         geojson_path = temp_dir / f"{temp_id}.geojson"
         with open(geojson_path, "wb") as buffer:
-            content = await file.read()
             buffer.write(content)
         
         # Générer MBTiles avec Tippecanoe - paramètres compatibles SDVFR
@@ -68,7 +426,7 @@ async def convert_geojson_to_mbtiles(
             
         tippecanoe_cmd.append(str(geojson_path))
         
-        result = subprocess.run(tippecanoe_cmd, capture_output=True, text=True)
+        result = run_tippecanoe(tippecanoe_cmd)
         
         if result.returncode != 0:
             raise HTTPException(
@@ -76,6 +434,8 @@ async def convert_geojson_to_mbtiles(
                 detail=f"Erreur Tippecanoe: {result.stderr}"
             )
         
+        CONVERSIONS.inc(endpoint=endpoint, result="success")
+        
         # Retourner le fichier MBTiles
         return FileResponse(
             path=mbtiles_path,
@@ -84,6 +444,7 @@ async def convert_geojson_to_mbtiles(
         )
         
     except Exception as e:
+        CONVERSIONS.inc(endpoint=endpoint, result="error")
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
@@ -104,15 +465,18 @@ async def convert_kml_to_mbtiles(
     if not file.filename.endswith('.kml'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un KML")
     
+    endpoint = "/convert-to-mbtiles"
+    content = await file.read()
+    INPUT_BYTES.observe(len(content), endpoint=endpoint)
+    
     # Créer un dossier temporaire unique
-    temp_dir = Path(tempfile.mkdtemp())
+    temp_dir = Path(tempfile.mkdtemp(prefix=TEMP_PREFIX))
     temp_id = str(uuid.uuid4())
     
     try:
         # Sauvegarder le fichier KML
         kml_path = temp_dir / f"{temp_id}.kml"
         with open(kml_path, "wb") as buffer:
-            content = await file.read()
             buffer.write(content)
         
         # Convertir KML en GeoJSON (requis par Tippecanoe)
@@ -146,7 +510,7 @@ async def convert_kml_to_mbtiles(
             
         tippecanoe_cmd.append(str(geojson_path))
         
-        result = subprocess.run(tippecanoe_cmd, capture_output=True, text=True)
+        result = run_tippecanoe(tippecanoe_cmd)
         
         if result.returncode != 0:
             raise HTTPException(
@@ -154,6 +518,8 @@ async def convert_kml_to_mbtiles(
                 detail=f"Erreur Tippecanoe: {result.stderr}"
             )
         
+        CONVERSIONS.inc(endpoint=endpoint, result="success")
+        
         # Retourner le fichier MBTiles
         return FileResponse(
             path=mbtiles_path,
@@ -162,6 +528,7 @@ async def convert_kml_to_mbtiles(
         )
         
     except Exception as e:
+        CONVERSIONS.inc(endpoint=endpoint, result="error")
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
@@ -180,14 +547,16 @@ def convert_kml_to_geojson(kml_path: Path, geojson_path: Path):
             str(geojson_path), 
             str(kml_path)
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_subprocess(cmd, capture_output=True, text=True)
         
         if result.returncode != 0:
             # Fallback: conversion manuelle optimisée
+            OGR2OGR_FALLBACKS.inc(reason="failed")
             convert_kml_manual(kml_path, geojson_path)
             
     except FileNotFoundError:
         # ogr2ogr non disponible, conversion manuelle
+        OGR2OGR_FALLBACKS.inc(reason="missing")
         convert_kml_manual(kml_path, geojson_path)
 
 def convert_kml_manual(kml_path: Path, geojson_path: Path):
@@ -445,14 +814,17 @@ async def convert_geojson_minimal(
     if not file.filename.endswith('.geojson'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un GeoJSON")
     
-    temp_dir = Path(tempfile.mkdtemp())
+    endpoint = "/convert-geojson-minimal"
+    content = await file.read()
+    INPUT_BYTES.observe(len(content), endpoint=endpoint)
+    
+    temp_dir = Path(tempfile.mkdtemp(prefix=TEMP_PREFIX))
     temp_id = str(uuid.uuid4())
     
     try:
         # Sauvegarder le fichier GeoJSON
         geojson_path = temp_dir / f"{temp_id}.geojson"
         with open(geojson_path, "wb") as buffer:
-            content = await file.read()
             buffer.write(content)
         
         # MBTiles avec paramètres ULTRA-minimaux
@@ -465,7 +837,7 @@ async def convert_geojson_minimal(
             str(geojson_path)
         ]
         
-        result = subprocess.run(tippecanoe_cmd, capture_output=True, text=True)
+        result = run_tippecanoe(tippecanoe_cmd)
         
         if result.returncode != 0:
             raise HTTPException(
@@ -473,6 +845,8 @@ async def convert_geojson_minimal(
                 detail=f"Erreur Tippecanoe: {result.stderr}"
             )
         
+        CONVERSIONS.inc(endpoint=endpoint, result="success")
+        
         return FileResponse(
             path=mbtiles_path,
             filename=f"{name}.mbtiles",
@@ -480,6 +854,7 @@ async def convert_geojson_minimal(
         )
         
     except Exception as e:
+        CONVERSIONS.inc(endpoint=endpoint, result="error")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/debug-kml")
@@ -488,14 +863,15 @@ async def debug_kml_conversion(file: UploadFile = File(...)):
     if not file.filename.endswith('.kml'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un KML")
     
-    temp_dir = Path(tempfile.mkdtemp())
+    content = await file.read()
+    INPUT_BYTES.observe(len(content), endpoint="/debug-kml")
+    temp_dir = Path(tempfile.mkdtemp(prefix=TEMP_PREFIX))
     temp_id = str(uuid.uuid4())
     
     try:
         # Sauvegarder le fichier KML
         kml_path = temp_dir / f"{temp_id}.kml"
         with open(kml_path, "wb") as buffer:
-            content = await file.read()
             buffer.write(content)
         
         # Convertir en GeoJSON
@@ -523,7 +899,7 @@ async def health_check():
 def check_tippecanoe():
     """Vérifie si Tippecanoe est disponible"""
     try:
-        result = subprocess.run(["tippecanoe", "--version"], capture_output=True)
+        result = run_subprocess(["tippecanoe", "--version"], capture_output=True)
         return result.returncode == 0
     except FileNotFoundError:
         return False
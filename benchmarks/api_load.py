@@ -0,0 +1,268 @@
+# Test de charge de l'API de conversion (api/main.py) avec un Tippecanoe factice
+#
+# L'application FastAPI est appelée en mémoire (httpx + ASGITransport, sans serveur ni réseau).
+# Un exécutable "tippecanoe" factice est placé en tête du PATH : il attend une latence réglable
+# (fixe + proportionnelle à la taille de l'entrée) puis écrit un fichier de sortie, ce qui permet
+# de mesurer l'API sans le vrai binaire.
+#
+# Pour chaque endpoint, taille d'envoi et niveau de concurrence : latences p50/p95/p99, débit,
+# erreurs, pic mémoire Python (tracemalloc) et croissance du dossier temporaire de l'API.
+#
+#   python benchmarks/api_load.py
+#   python benchmarks/api_load.py --sizes 100,10000 --concurrency 1,16 --requests 100 --latency 0.2
+#   python benchmarks/api_load.py --endpoints convert-geojson-minimal --output v2.json --baseline v1.json
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import stat
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+API_PATH = os.path.join(REPO_ROOT, "api", "main.py")
+sys.path.insert(0, REPO_ROOT)
+
+from kml_core import generate_kml, generate_geojson  # noqa: E402
+from export_pipeline import synthetic_session  # noqa: E402
+
+# Endpoint -> format envoyé
+ENDPOINTS = {
+    "convert-geojson-to-mbtiles": "geojson",
+    "convert-geojson-minimal": "geojson",
+    "convert-to-mbtiles": "kml",
+    "debug-kml": "kml",
+}
+
+STUB_TIPPECANOE = """#!{python}
+# tippecanoe factice : latence TIPPECANOE_STUB_LATENCY (s) + TIPPECANOE_STUB_LATENCY_PER_MB (s/Mo)
+import os, sys, time
+args = sys.argv[1:]
+if "--version" in args:
+    print("tippecanoe v0.0.0 (stub)")
+    sys.exit(0)
+source = args[-1]
+size_mb = os.path.getsize(source) / 1e6
+time.sleep(float(os.environ.get("TIPPECANOE_STUB_LATENCY", "0"))
+           + size_mb * float(os.environ.get("TIPPECANOE_STUB_LATENCY_PER_MB", "0")))
+with open(args[args.index("-o") + 1], "wb") as f:
+    f.write(b"\\0" * max(1024, int(size_mb * 1e6) // 10))
+sys.exit(int(os.environ.get("TIPPECANOE_STUB_EXIT_CODE", "0")))
+"""
+
+
+def install_stub(directory):
+    """Écrit le tippecanoe factice dans `directory` et le place en tête du PATH"""
+    path = os.path.join(directory, "tippecanoe")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(STUB_TIPPECANOE.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = directory + os.pathsep + os.environ.get("PATH", "")
+
+
+def load_api(temp_root):
+    """Module api/main.py, avec ses dossiers temporaires redirigés vers `temp_root`"""
+    tempfile.tempdir = temp_root
+    spec = importlib.util.spec_from_file_location("kml_api", API_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def payloads(sizes):
+    """{(format, nombre d'objets): octets} pour chaque taille demandée"""
+    result = {}
+    for count in sizes:
+        session = synthetic_session(
+            points=count // 2, lines=count // 4, line_vertices=20,
+            circles=count // 8, circle_segments=36, rectangles=count - count // 2 - count // 4 - count // 8
+        )
+        result[("geojson", count)] = json.dumps(generate_geojson(**session), ensure_ascii=False).encode("utf-8")
+        result[("kml", count)] = generate_kml(**session).kml().encode("utf-8")
+    return result
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def percentile(sorted_values, fraction):
+    """Percentile au rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, endpoint, filename, content, requests, concurrency):
+    """(latences en s des réponses 200, nombre d'erreurs, durée totale)"""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/{endpoint}", files={"file": (filename, content)})
+                await response.aread()
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_all(api, data, endpoints, concurrency_levels, requests, memory, temp_root):
+    import httpx
+
+    transport = httpx.ASGITransport(app=api.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=None) as client:
+        for endpoint in endpoints:
+            fmt = ENDPOINTS[endpoint]
+            for (data_fmt, count), content in data.items():
+                if data_fmt != fmt:
+                    continue
+                for concurrency in concurrency_levels:
+                    temp_before = directory_size(temp_root)
+                    if memory:
+                        tracemalloc.start()
+                    latencies, errors, elapsed = await run_scenario(
+                        client, endpoint, f"charge.{fmt}", content, requests, concurrency
+                    )
+                    peak = None
+                    if memory:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    latencies.sort()
+                    result = {
+                        "endpoint": endpoint, "objects": count, "upload_bytes": len(content),
+                        "concurrency": concurrency, "requests": requests, "errors": errors,
+                        "p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95),
+                        "p99": percentile(latencies, 0.99), "throughput": len(latencies) / elapsed,
+                        "peak_bytes": peak, "temp_growth_bytes": directory_size(temp_root) - temp_before,
+                    }
+                    results.append(result)
+                    print_result(result, None)
+    return results
+
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if abs(value) < 1024 or unit == "Go":
+            return f"{value:.0f} {unit}" if unit == "o" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+HEADER = (f"{'endpoint':<28}{'objets':>8}{'envoi':>10}{'conc.':>6}{'err.':>6}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}{'pic mém.':>11}{'temp +':>11}")
+
+
+def print_result(result, previous):
+    line = (f"{result['endpoint']:<28}{result['objects']:>8}{format_bytes(result['upload_bytes']):>10}"
+            f"{result['concurrency']:>6}{result['errors']:>6}{format_ms(result['p50']):>9}"
+            f"{format_ms(result['p95']):>9}{format_ms(result['p99']):>9}{result['throughput']:>8.1f}"
+            f"{format_bytes(result['peak_bytes']):>11}{format_bytes(result['temp_growth_bytes']):>11}")
+    if previous and previous["throughput"]:
+        line += f"{result['throughput'] / previous['throughput']:>8.2f}x"
+    print(line)
+
+
+def scenario_key(result):
+    return result["endpoint"], result["objects"], result["concurrency"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latences, débit, mémoire et disque temporaire de l'API sous charge")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"parmi {','.join(ENDPOINTS)}")
+    parser.add_argument("--sizes", default="100,1000", help="nombres d'objets par envoi")
+    parser.add_argument("--concurrency", default="1,8", help="niveaux de concurrence")
+    parser.add_argument("--requests", type=int, default=20, help="requêtes par scénario")
+    parser.add_argument("--latency", type=float, default=0.05, help="latence fixe du tippecanoe factice (s)")
+    parser.add_argument("--latency-per-mb", type=float, default=0.5, help="latence par Mo envoyé (s)")
+    parser.add_argument("--no-memory", action="store_true", help="ne mesure pas le pic mémoire (plus rapide)")
+    parser.add_argument("--keep-temp", action="store_true", help="conserve le dossier temporaire de l'API")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats JSON précédents à comparer (rapport de débit)")
+    args = parser.parse_args(argv)
+
+    endpoints = args.endpoints.split(',')
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"endpoint inconnu : {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(',')]
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+
+    work_dir = tempfile.mkdtemp(prefix="kml_api_load_")
+    stub_dir, temp_root = os.path.join(work_dir, "bin"), os.path.join(work_dir, "tmp")
+    os.makedirs(stub_dir)
+    os.makedirs(temp_root)
+    install_stub(stub_dir)
+    os.environ["TIPPECANOE_STUB_LATENCY"] = str(args.latency)
+    os.environ["TIPPECANOE_STUB_LATENCY_PER_MB"] = str(args.latency_per_mb)
+
+    try:
+        data = payloads(sizes)
+        api = load_api(temp_root)
+        print(f"{args.requests} requêtes par scénario, tippecanoe factice : "
+              f"{args.latency:.3f} s + {args.latency_per_mb:.3f} s/Mo")
+        print(HEADER)
+        results = asyncio.run(run_all(api, data, endpoints, concurrency_levels, args.requests,
+                                      not args.no_memory, temp_root))
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Ko sous Linux
+        print(f"\nRSS maximal du processus : {format_bytes(max_rss)}, "
+              f"dossier temporaire de l'API : {format_bytes(directory_size(temp_root))}")
+    finally:
+        tempfile.tempdir = None
+        if args.keep_temp:
+            print(f"Dossier temporaire conservé : {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {scenario_key(result): result for result in json.load(f)["scenarios"]}
+        print(f"\nComparaison avec {args.baseline} (débit relatif) :")
+        print(HEADER)
+        for result in results:
+            print_result(result, baseline.get(scenario_key(result)))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "latency": args.latency,
+                       "latency_per_mb": args.latency_per_mb, "max_rss_bytes": max_rss,
+                       "scenarios": results}, f, indent=2)
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
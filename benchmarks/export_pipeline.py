@@ -0,0 +1,211 @@
+# Benchmark de bout en bout de la chaîne d'export sur une session synthétique
+#
+# Synthétise une session de taille paramétrable (points, lignes de K sommets, cercles, rectangles),
+# puis mesure chaque étape : KML (generate_kml().kml()), réimport (parse_kml_file), GeoJSON
+# (generate_geojson + sérialisation), regroupement par couleur (MBTiles) et carte (create_map,
+# rendu HTML à froid puis avec le cache des couches). Pour chaque étape : durée, pic mémoire
+# Python (tracemalloc) et taille produite.
+#
+# Les fonctions de l'application sont celles de streamlit_app.py, exécuté une fois en mode "bare".
+#
+#   python benchmarks/export_pipeline.py
+#   python benchmarks/export_pipeline.py --points 100000 --lines 10000 --line-vertices 100 --output v2.json
+#   python benchmarks/export_pipeline.py --scale 5 --baseline v1.json
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import runpy
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "streamlit_app.py")
+sys.path.insert(0, REPO_ROOT)
+
+COLORS = ["rouge", "vert", "bleu", "jaune", "orange", "cyan", "magenta", "noir", "blanc"]
+
+# Centre des objets synthétiques et étendue (degrés)
+CENTER_LAT, CENTER_LON, SPREAD_DEG = 44.5, -1.1, 2.0
+
+
+def ring(lat, lon, radius_deg, segments, rotation=0.0):
+    """Anneau fermé (lon, lat) approché dans le plan, suffisant pour mesurer les exports"""
+    cos_lat = math.cos(math.radians(lat))
+    return [
+        (lon + radius_deg * math.sin(a) / cos_lat, lat + radius_deg * math.cos(a))
+        for a in (rotation + 2 * math.pi * i / segments for i in range(segments + 1))
+    ]
+
+
+def synthetic_session(points, lines, line_vertices, circles, circle_segments, rectangles, seed=0):
+    """Objets par type, avec les mêmes champs que ceux créés par l'application"""
+    rng = random.Random(seed)
+
+    def position():
+        return CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+
+    session = {"points": [], "lines": [], "circles": [], "rectangles": []}
+    for i in range(points):
+        lat, lon = position()
+        session["points"].append({"type": "Point", "name": f"P{i}", "lat": lat, "lon": lon,
+                                  "description": "Point de report" if i % 4 == 0 else ""})
+    for i in range(lines):
+        lat, lon = position()
+        coords = [(lon, lat)]
+        for _ in range(line_vertices - 1):
+            lon, lat = lon + rng.uniform(-0.01, 0.01), lat + rng.uniform(-0.01, 0.01)
+            coords.append((lon, lat))
+        session["lines"].append({"name": f"L{i}", "points": coords, "color": rng.choice(COLORS),
+                                 "width": 3, "description": ""})
+    for i in range(circles):
+        lat, lon = position()
+        radius_km = rng.choice([0.5, 1.852, 5.556])
+        session["circles"].append({
+            "type": "Cercle", "name": f"C{i}", "center_lat": lat, "center_lon": lon,
+            "radius_km": radius_km, "radius_unit": "nautiques", "num_segments": circle_segments,
+            "points": ring(lat, lon, radius_km / 111.32, circle_segments),
+            "color": rng.choice(COLORS), "width": 2, "fill": i % 2 == 0
+        })
+    for i in range(rectangles):
+        lat, lon = position()
+        bearing = rng.uniform(0, 360)
+        session["rectangles"].append({
+            "type": "Rectangle", "name": f"R{i}", "center_lat": lat, "center_lon": lon,
+            "length_km": 1.852, "width_km": 0.926, "bearing_deg": bearing,
+            "length_unit": "nautiques", "width_unit": "nautiques",
+            "points": ring(lat, lon, 0.01, 4, math.radians(bearing)),
+            "color": rng.choice(COLORS), "width": 2, "fill": False, "add_arrow": False
+        })
+    return session
+
+
+def load_app():
+    """Fonctions et session de l'application (exécution "bare" de streamlit_app.py)"""
+    logging.disable(logging.WARNING)  # avertissements "missing ScriptRunContext" du mode bare, à chaque appel de st
+    return runpy.run_path(APP_PATH, run_name="kml_app")
+
+
+def measure(func, repeat, memory):
+    """(meilleure durée en s, pic mémoire en octets ou None, dernier résultat)"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        # Passage séparé : tracemalloc ralentit l'exécution et fausserait les durées
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def output_size(result):
+    if isinstance(result, (str, bytes)):
+        return len(result.encode("utf-8") if isinstance(result, str) else result)
+    if isinstance(result, tuple):  # parse_kml_file : (points, lignes, polygones)
+        return sum(len(part) for part in result)
+    if isinstance(result, dict):  # regroupement par couleur
+        return sum(len(group["features"]) for group in result.values())
+    return None
+
+
+def run_pipeline(app, session, repeat, memory):
+    """Mesures de chaque étape ; retourne {étape: {...}}"""
+    import streamlit as st
+    from kml_core import generate_kml, generate_geojson, group_objects_by_color
+
+    state = st.session_state
+    app["clear_objects"](*app["OBJECT_KINDS"])
+    for kind, objects in session.items():
+        app["add_objects"](kind, objects)
+    kml_text = generate_kml(**session).kml()
+
+    def map_html(cold):
+        if cold:
+            state.map_layer_cache = {}
+        return app["create_map"]().get_root().render()
+
+    stages = [
+        ("kml", "octets", lambda: generate_kml(**session).kml()),
+        ("parse_kml_file", "objets", lambda: app["parse_kml_file"](kml_text)),
+        ("geojson", "octets", lambda: json.dumps(generate_geojson(**session), indent=2, ensure_ascii=False)),
+        ("group_objects_by_color", "features", lambda: group_objects_by_color(**session)),
+        ("create_map (froid)", "octets", lambda: map_html(cold=True)),
+        ("create_map (cache)", "octets", lambda: map_html(cold=False)),
+    ]
+    results = {}
+    for name, unit, func in stages:
+        duration, peak, result = measure(func, repeat, memory)
+        results[name] = {"seconds": duration, "peak_bytes": peak, "output": output_size(result), "unit": unit}
+        print_stage(name, results[name], None)
+    return results
+
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if value < 1024 or unit == "Go":
+            return f"{value:.0f} {unit}" if unit == "o" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def print_stage(name, result, previous):
+    output = format_bytes(result["output"]) if result["unit"] == "octets" else f"{result['output']} {result['unit']}"
+    line = f"{name:<26}{result['seconds']:>10.2f}{format_bytes(result['peak_bytes']):>14}{output:>16}"
+    if previous:
+        line += f"{previous['seconds'] / result['seconds']:>9.2f}x"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durée et pic mémoire de chaque étape de la chaîne d'export")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--line-vertices", type=int, default=50)
+    parser.add_argument("--circles", type=int, default=2000)
+    parser.add_argument("--circle-segments", type=int, default=72)
+    parser.add_argument("--rectangles", type=int, default=2000)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplie tous les nombres d'objets")
+    parser.add_argument("--repeat", type=int, default=1, help="passages chronométrés par étape (le meilleur est retenu)")
+    parser.add_argument("--no-memory", action="store_true", help="ne mesure pas le pic mémoire (plus rapide)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats JSON précédents à comparer")
+    args = parser.parse_args(argv)
+
+    sizes = {
+        "points": int(args.points * args.scale), "lines": int(args.lines * args.scale),
+        "line_vertices": args.line_vertices, "circles": int(args.circles * args.scale),
+        "circle_segments": args.circle_segments, "rectangles": int(args.rectangles * args.scale),
+    }
+    session = synthetic_session(**sizes)
+    print(", ".join(f"{key}={value}" for key, value in sizes.items()))
+
+    app = load_app()
+    print(f"{'étape':<26}{'durée (s)':>10}{'pic mémoire':>14}{'sortie':>16}")
+    results = run_pipeline(app, session, args.repeat, not args.no_memory)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+        print(f"\nComparaison avec {args.baseline} :")
+        for name, result in results.items():
+            print_stage(name, result, baseline.get(name))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "sizes": sizes, "stages": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+# Micro-benchmark des fonctions géodésiques de kml_core, avec contrôle de précision
+#
+# Les jeux de données (aléatoires à graine fixe, plus des cas limites : quasi-antipodes, équateur,
+# méridiens, très courtes distances) et leurs valeurs de référence (GeographicLib, précision
+# nanométrique) sont stockés dans benchmarks/fixtures/geodesy_reference.json, un cas par ligne.
+#
+# Pour chaque fonction : débit scalaire (latence médiane d'un appel), débit en lot (passage complet
+# du jeu de données) et erreur maximale par catégorie par rapport à la référence ; les quasi-antipodes
+# du problème inverse, où Vincenty ne converge pas, sont rapportés à part. Les résultats
+# sont écrits en JSON ; --baseline compare à un résultat précédent (accélération, dérive d'erreur).
+#
+#   python benchmarks/geodesy.py --output avant.json
+#   python benchmarks/geodesy.py --baseline avant.json --output apres.json
+#   python benchmarks/geodesy.py --regenerate-fixtures   # nécessite geographiclib
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from kml_core import (  # noqa: E402
+    calculate_distance, calculate_bearing, create_point_from_bearing_distance,
+    calculate_circle_points, calculate_rectangle_points
+)
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "geodesy_reference.json")
+FIXTURES_SEED = 20240613
+
+# Écarts tolérés par rapport à GeographicLib (m pour les positions et distances, degrés pour les gisements)
+TOLERANCES = {
+    "distance_m": {"default": 0.001},
+    "bearing_deg": {"default": 1e-6},
+    "direct_m": {"default": 0.001},
+    "circle_m": {"default": 0.001},
+    "rectangle_m": {"default": 0.001},
+}
+
+# Vincenty ne converge pas près des antipodes (erreurs de l'ordre de 100 km et 150°) : ces catégories
+# sont rapportées à part, sans tolérance absolue ; seule une dégradation par rapport à --baseline est signalée
+UNCHECKED_CATEGORIES = {
+    "distance_m": ("antipodal", "equatorial_antipodal"),
+    "bearing_deg": ("antipodal", "equatorial_antipodal"),
+}
+
+# Nombre de cas aléatoires des problèmes inverse et direct (les cas limites en sont des fractions)
+FIXTURES_CASES = 200
+
+# Décimales conservées sur les entrées des fixtures (1e-9° ≈ 0.1 mm) ; les références restent en pleine précision
+FIXTURES_INPUT_DIGITS = 9
+
+# Marge tolérée sur l'erreur maximale par rapport à --baseline avant de signaler une perte de précision
+BASELINE_ERROR_MARGIN = 1e-9
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def random_position(rng):
+    """Position uniforme sur la sphère (lat, lon)"""
+    return math.degrees(math.asin(rng.uniform(-1, 1))), rng.uniform(-180, 180)
+
+
+def inverse_cases(rng, count):
+    """Couples de positions par catégorie : (catégorie, lat1, lon1, lat2, lon2)"""
+    cases = []
+    for _ in range(count):
+        cases.append(("random",) + random_position(rng) + random_position(rng))
+    for _ in range(count // 4):
+        lat, lon = random_position(rng)
+        cases.append(("short", lat, lon, lat + rng.uniform(-0.01, 0.01), lon + rng.uniform(-0.01, 0.01)))
+    for _ in range(count // 4):
+        lon = rng.uniform(-180, 180)
+        cases.append(("equatorial", 0.0, lon, 0.0, lon + rng.uniform(-170, 170)))
+        # Sur l'équateur au-delà de 179.4° d'écart, la géodésique passe par un pôle : Vincenty ne converge plus
+        cases.append(("equatorial_antipodal", rng.uniform(-1e-3, 1e-3), 0.0, rng.uniform(-1e-3, 1e-3), rng.uniform(170, 179.9)))
+    for _ in range(count // 4):
+        lon = rng.uniform(-180, 180)
+        cases.append(("meridian", rng.uniform(-89, 89), lon, rng.uniform(-89, 89), lon))
+    for _ in range(count // 4):
+        lat, lon = random_position(rng)
+        cases.append(("antipodal", lat, lon, -lat + rng.uniform(-0.5, 0.5), (lon + 180 + rng.uniform(-0.5, 0.5) + 180) % 360 - 180))
+    for _ in range(10):
+        lat, lon = random_position(rng)
+        cases.append(("coincident", lat, lon, lat, lon))
+    return cases
+
+
+def direct_cases(rng, count):
+    """Points de départ, gisements et distances : (catégorie, lat, lon, gisement, distance en km)"""
+    cases = []
+    for _ in range(count):
+        lat, lon = random_position(rng)
+        cases.append(("random", lat, lon, rng.uniform(0, 360), rng.uniform(0.001, 5000)))
+    for _ in range(count // 4):
+        lat, lon = random_position(rng)
+        cases.append(("short", lat, lon, rng.uniform(0, 360), rng.uniform(0.001, 50)))
+    for _ in range(count // 4):
+        cases.append(("equatorial", 0.0, rng.uniform(-180, 180), rng.choice([90.0, 270.0]), rng.uniform(1, 19000)))
+    for _ in range(count // 4):
+        lat, lon = random_position(rng)
+        cases.append(("antipodal", lat, lon, rng.uniform(0, 360), rng.uniform(19900, 20000)))
+    return cases
+
+
+def circle_cases(rng, count):
+    """Cercles et arcs : paramètres de calculate_circle_points"""
+    cases = []
+    for i in range(count):
+        lat, lon = random_position(rng)
+        lat = max(-85.0, min(85.0, lat))
+        radius_km = rng.choice([0.025, 0.5, 5.0, 50.0])
+        if i % 2:
+            start, end = rng.uniform(0, 360), rng.uniform(0, 360)
+            cases.append({"lat": lat, "lon": lon, "radius_km": radius_km, "segments": 36,
+                          "is_arc": True, "start": start, "end": end, "close_arc": bool(i % 4 == 1)})
+        else:
+            cases.append({"lat": lat, "lon": lon, "radius_km": radius_km, "segments": 72,
+                          "is_arc": False, "start": 0, "end": 360, "close_arc": True})
+    return cases
+
+
+def rectangle_cases(rng, count):
+    """Rectangles : paramètres de calculate_rectangle_points"""
+    cases = []
+    for _ in range(count):
+        lat, lon = random_position(rng)
+        cases.append({"lat": max(-85.0, min(85.0, lat)), "lon": lon, "length_km": rng.uniform(0.05, 20),
+                      "width_km": rng.uniform(0.05, 10), "bearing": rng.uniform(0, 360)})
+    return cases
+
+
+def circle_bearings(case):
+    """Gisements des sommets d'un cercle/arc, selon la définition de calculate_circle_points"""
+    if not case["is_arc"]:
+        return [(360 / case["segments"]) * i for i in range(case["segments"] + 1)]
+    start, end = case["start"], case["end"]
+    if end < start:
+        end += 360
+    angle_range = end - start
+    segments = max(case["segments"], int(abs(angle_range)))
+    return [start + (angle_range / segments) * i for i in range(segments + 1)]
+
+
+def rectangle_corners(case):
+    """(distance en km, gisement) du centre vers chaque coin, selon calculate_rectangle_points"""
+    half_length, half_width = case["length_km"] / 2, case["width_km"] / 2
+    corners = []
+    for x, y in [(half_length, half_width), (half_length, -half_width), (-half_length, -half_width), (-half_length, half_width)]:
+        corners.append((math.hypot(x, y), (case["bearing"] + math.degrees(math.atan2(y, x))) % 360))
+    return corners
+
+
+def rounded(value):
+    """Entrée de fixture arrondie à FIXTURES_INPUT_DIGITS décimales (listes et dictionnaires compris)"""
+    if isinstance(value, float):
+        return round(value, FIXTURES_INPUT_DIGITS)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(rounded(item) for item in value)
+    return value
+
+
+def write_fixtures(fixtures, path):
+    """JSON lisible et comparable ligne à ligne : un cas par ligne"""
+    lines = []
+    for key, value in fixtures.items():
+        if isinstance(value, list):
+            cases = ",\n".join("    " + json.dumps(case, separators=(",", ":")) for case in value)
+            lines.append(f"  {json.dumps(key)}: [\n{cases}\n  ]")
+        else:
+            lines.append(f"  {json.dumps(key)}: {json.dumps(value)}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+def regenerate_fixtures():
+    """Jeux de données et valeurs de référence GeographicLib"""
+    from geographiclib.geodesic import Geodesic
+    geod = Geodesic.WGS84
+    rng = random.Random(FIXTURES_SEED)
+
+    def direct(lat, lon, bearing, distance_km):
+        result = geod.Direct(lat, lon, bearing, distance_km * 1000)
+        return [result["lat2"], (result["lon2"] + 180) % 360 - 180]
+
+    inverse = []
+    for case in inverse_cases(rng, FIXTURES_CASES):
+        category, lat1, lon1, lat2, lon2 = rounded(case)
+        result = geod.Inverse(lat1, lon1, lat2, lon2)
+        inverse.append({"category": category, "args": [lat1, lon1, lat2, lon2],
+                        "distance_m": result["s12"], "bearing_deg": result["azi1"] % 360})
+    forward = [
+        {"category": category, "args": [lat, lon, bearing, distance_km], "position": direct(lat, lon, bearing, distance_km)}
+        for category, lat, lon, bearing, distance_km in rounded(direct_cases(rng, FIXTURES_CASES))
+    ]
+    circles = []
+    for case in rounded(circle_cases(rng, 12)):
+        vertices = [direct(case["lat"], case["lon"], b, case["radius_km"]) for b in circle_bearings(case)]
+        if case["is_arc"] and case["close_arc"]:
+            vertices = [[case["lat"], case["lon"]]] + vertices + [[case["lat"], case["lon"]]]
+        circles.append({"category": "arc" if case["is_arc"] else "circle", "args": case, "vertices": vertices})
+    rectangles = []
+    for case in rounded(rectangle_cases(rng, 20)):
+        vertices = [direct(case["lat"], case["lon"], b, d) for d, b in rectangle_corners(case)]
+        rectangles.append({"category": "rectangle", "args": case, "vertices": vertices + vertices[:1]})
+
+    fixtures = {
+        "generator": "geographiclib.Geodesic.WGS84", "seed": FIXTURES_SEED,
+        "inverse": inverse, "direct": forward, "circles": circles, "rectangles": rectangles,
+    }
+    os.makedirs(os.path.dirname(FIXTURES_PATH), exist_ok=True)
+    write_fixtures(fixtures, FIXTURES_PATH)
+    print(f"Fixtures écrites : {FIXTURES_PATH}")
+
+
+def position_error_m(lat, lon, ref_lat, ref_lon):
+    """Écart en mètres entre deux positions proches (approximation locale, suffisante au mm)"""
+    dlon = (lon - ref_lon + 180) % 360 - 180
+    dx = math.radians(dlon) * math.cos(math.radians(ref_lat))
+    return EARTH_RADIUS_M * math.hypot(math.radians(lat - ref_lat), dx)
+
+
+def angle_error_deg(value, reference):
+    return abs((value - reference + 180) % 360 - 180)
+
+
+def scalar_latency_us(func, args_list, sample=200):
+    """Latence médiane d'un appel (µs) sur un échantillon des cas"""
+    timings = []
+    for args in args_list[:sample]:
+        start = time.perf_counter_ns()
+        func(*args)
+        timings.append(time.perf_counter_ns() - start)
+    return statistics.median(timings) / 1000
+
+
+def batch_throughput(func, args_list, repeat):
+    """Appels par seconde sur le jeu complet (meilleur de `repeat` passages) et résultats"""
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(*args) for args in args_list]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(args_list) / best, results
+
+
+def errors_by_category(categories, errors):
+    """Erreur maximale par catégorie"""
+    summary = {}
+    for category, error in zip(categories, errors):
+        summary[category] = max(summary.get(category, 0.0), error)
+    return summary
+
+
+def run_benchmarks(fixtures, repeat):
+    """Mesures de temps et d'erreur pour chaque fonction"""
+    results = {}
+
+    def record(name, func, cases, metric, errors_of):
+        args_list = [tuple(case["args"]) if isinstance(case["args"], list) else case["args"] for case in cases]
+        call_args = [args if isinstance(args, tuple) else (args,) for args in args_list]
+        throughput, outputs = batch_throughput(func, call_args, repeat)
+        errors = errors_by_category([case["category"] for case in cases],
+                                    [errors_of(case, output) for case, output in zip(cases, outputs)])
+        unchecked = UNCHECKED_CATEGORIES.get(metric, ())
+        results[name] = {
+            "metric": metric,
+            "cases": len(cases),
+            "scalar_us": scalar_latency_us(func, call_args),
+            "batch_per_s": throughput,
+            "max_error": {category: error for category, error in errors.items() if category not in unchecked},
+            "unchecked_error": {category: error for category, error in errors.items() if category in unchecked},
+        }
+
+    record("calculate_distance", calculate_distance, fixtures["inverse"], "distance_m",
+           lambda case, d: abs(d - case["distance_m"]))
+    record("calculate_bearing", calculate_bearing, fixtures["inverse"], "bearing_deg",
+           lambda case, b: 0.0 if case["category"] == "coincident" else angle_error_deg(b, case["bearing_deg"]))
+    record("create_point_from_bearing_distance",
+           lambda lat, lon, bearing, distance: create_point_from_bearing_distance({"lat": lat, "lon": lon}, distance, bearing),
+           fixtures["direct"], "direct_m",
+           lambda case, pos: position_error_m(pos[0], pos[1], *case["position"]))
+
+    def vertices_error(case, points):
+        if len(points) != len(case["vertices"]):
+            return math.inf
+        return max(position_error_m(lat, lon, *ref) for (lon, lat), ref in zip(points, case["vertices"]))
+
+    record("calculate_circle_points",
+           lambda c: calculate_circle_points(c["lat"], c["lon"], c["radius_km"], c["segments"], c["is_arc"], c["start"], c["end"], c["close_arc"]),
+           fixtures["circles"], "circle_m", vertices_error)
+    record("calculate_rectangle_points",
+           lambda c: calculate_rectangle_points(c["lat"], c["lon"], c["length_km"], c["width_km"], c["bearing"]),
+           fixtures["rectangles"], "rectangle_m", vertices_error)
+    return results
+
+
+def check_accuracy(results, baseline):
+    """Messages d'échec : tolérance absolue dépassée, ou erreur supérieure à celle de la référence"""
+    failures = []
+    for name, result in results.items():
+        tolerances = TOLERANCES[result["metric"]]
+        previous_errors = {}
+        for key in ("max_error", "unchecked_error"):
+            previous_errors.update((baseline or {}).get(name, {}).get(key, {}))
+        for category, error in result["max_error"].items():
+            tolerance = tolerances.get(category, tolerances["default"])
+            if error > tolerance:
+                failures.append(f"{name} [{category}] : erreur {error:.3g} > tolérance {tolerance:.3g}")
+        for category, error in {**result["max_error"], **result["unchecked_error"]}.items():
+            previous = previous_errors.get(category)
+            if previous is not None and error > previous + BASELINE_ERROR_MARGIN + previous * 1e-6:
+                failures.append(f"{name} [{category}] : erreur {error:.3g} > référence précédente {previous:.3g}")
+    return failures
+
+
+def print_report(results, baseline):
+    header = f"{'fonction':<36}{'cas':>6}{'µs/appel':>11}{'appels/s':>12}"
+    if baseline:
+        header += f"{'accél.':>9}"
+    print(header + "  erreur max (pire catégorie)")
+    for name, result in results.items():
+        worst = max(result["max_error"].items(), key=lambda item: item[1])
+        line = f"{name:<36}{result['cases']:>6}{result['scalar_us']:>11.1f}{result['batch_per_s']:>12.0f}"
+        if baseline and name in baseline:
+            line += f"{result['batch_per_s'] / baseline[name]['batch_per_s']:>8.2f}x"
+        elif baseline:
+            line += f"{'-':>9}"
+        print(line + f"  {worst[1]:.3g} {result['metric'].split('_')[-1]} ({worst[0]})")
+
+    unchecked = [(name, category, error, result["metric"].split('_')[-1])
+                 for name, result in results.items() for category, error in result["unchecked_error"].items()]
+    if unchecked:
+        print("\nCas hors tolérance absolue (Vincenty ne converge pas), comparés seulement à --baseline :")
+        for name, category, error, unit in unchecked:
+            print(f"  {name:<34}{category:<22}{error:.3g} {unit}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark et contrôle de précision des fonctions géodésiques")
+    parser.add_argument("--repeat", type=int, default=3, help="passages en lot (le meilleur est retenu)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats JSON précédents à comparer")
+    parser.add_argument("--regenerate-fixtures", action="store_true", help="recalcule les références avec geographiclib")
+    args = parser.parse_args(argv)
+
+    if args.regenerate_fixtures:
+        regenerate_fixtures()
+        return 0
+
+    with open(FIXTURES_PATH, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = run_benchmarks(fixtures, args.repeat)
+    print_report(results, baseline)
+
+    failures = check_accuracy(results, baseline)
+    for failure in failures:
+        print(f"ÉCHEC : {failure}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
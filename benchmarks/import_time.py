@@ -0,0 +1,92 @@
+# Rapport des temps d'import au démarrage de l'application (python -X importtime)
+#
+# Exécute streamlit_app.py en mode "bare" (premier rendu, session vide), agrège le temps d'import
+# cumulé par paquet de premier niveau et échoue si un module lourd censé être chargé à la demande
+# est importé au démarrage, ou si le budget total est dépassé.
+#
+#   python benchmarks/import_time.py
+#   python benchmarks/import_time.py --repeat 5 --max-total-ms 2500 --forbid openpyxl,rasterio
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "streamlit_app.py")
+
+# Modules chargés uniquement par les onglets/exports qui en ont besoin (la carte est masquée au premier rendu)
+DEFAULT_FORBIDDEN = "openpyxl,rasterio,PIL,simplekml,folium,streamlit_folium,branca,pandas"
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Temps cumulé (µs) par paquet de premier niveau, à partir de la sortie de -X importtime"""
+    totals = Counter()
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Un seul espace d'indentation : import de premier niveau (les sous-imports sont déjà cumulés)
+        if match and len(match.group(3)) == 1:
+            totals[match.group(4).split('.')[0]] += int(match.group(2))
+    return totals
+
+
+def run_once():
+    """Lance l'application en mode bare ; retourne (temps cumulés par paquet, durée totale en s)"""
+    code = f"import runpy; runpy.run_path({APP_PATH!r}, run_name='__main__')"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(f"L'application a échoué (code {result.returncode})")
+    return parse_importtime(result.stderr), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps d'import au démarrage de l'application")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre d'exécutions (on garde le minimum)")
+    parser.add_argument("--top", type=int, default=15, help="Nombre de paquets affichés")
+    parser.add_argument("--max-total-ms", type=float, default=None, help="Budget total d'import (ms)")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                        help="Paquets qui ne doivent pas être importés au démarrage (séparés par des virgules)")
+    args = parser.parse_args()
+
+    best, best_elapsed = None, None
+    for _ in range(args.repeat):
+        totals, elapsed = run_once()
+        if best is None:
+            best, best_elapsed = totals, elapsed
+        else:
+            best = Counter({name: min(best[name], totals[name]) for name in best.keys() | totals.keys()})
+            best_elapsed = min(best_elapsed, elapsed)
+
+    total_ms = sum(best.values()) / 1000
+    print(f"{'Paquet':30s}{'Import (ms)':>12s}")
+    for name, micros in best.most_common(args.top):
+        print(f"{name:30s}{micros / 1000:12.1f}")
+    print(f"{'TOTAL':30s}{total_ms:12.1f}")
+    print(f"Premier rendu (processus complet) : {best_elapsed:.2f} s")
+
+    failures = []
+    forbidden = [name.strip() for name in args.forbid.split(",") if name.strip()]
+    loaded = [name for name in forbidden if best.get(name)]
+    if loaded:
+        failures.append(f"Modules importés au démarrage alors qu'ils devraient être différés : {', '.join(loaded)}")
+    if args.max_total_ms is not None and total_ms > args.max_total_ms:
+        failures.append(f"Temps d'import total {total_ms:.0f} ms > budget {args.max_total_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"ÉCHEC : {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Export séquentiel vs parallèle (KML, GeoJSON, MBTiles par couleur) sur une session synthétique
+#
+# Vérifie que les sorties parallèles sont identiques octet pour octet aux sorties séquentielles
+# et affiche l'accélération pour chaque nombre de processus.
+#
+#   python benchmarks/parallel_export.py
+#   python benchmarks/parallel_export.py --features 200000 --workers 1,2,4,8
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from kml_core import (  # noqa: E402
+    calculate_circle_points, export_kml_text, export_geojson_text, export_groups_by_color
+)
+
+COLORS = ["rouge", "vert", "bleu", "jaune", "magenta"]
+
+
+def synthetic_session(count, seed=0):
+    """Session de `count` objets : moitié points, un quart lignes, un quart cercles"""
+    rng = random.Random(seed)
+    circle = calculate_circle_points(44.5, -1.1, 2, 72)
+    n_points, n_lines = count // 2, count // 4
+    points = [
+        {"type": "Point", "name": f"P{i}", "lat": 44 + rng.random(), "lon": -1 + rng.random(),
+         "description": "Point de report" if i % 3 == 0 else ""}
+        for i in range(n_points)
+    ]
+    lines = [
+        {"name": f"L{i}", "points": circle[:12], "color": rng.choice(COLORS), "width": 3}
+        for i in range(n_lines)
+    ]
+    circles = [
+        {"type": "Cercle", "name": f"C{i}", "points": circle, "color": rng.choice(COLORS), "width": 2, "fill": i % 2 == 0}
+        for i in range(count - n_points - n_lines)
+    ]
+    return {"points": points, "lines": lines, "circles": circles, "rectangles": []}
+
+
+EXPORTS = {
+    "kml": lambda session, workers: export_kml_text(**session, workers=workers),
+    "geojson": lambda session, workers: export_geojson_text(**session, workers=workers)[0],
+    "couleurs": lambda session, workers: json.dumps(export_groups_by_color(**session, workers=workers)),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accélération de l'export parallèle")
+    parser.add_argument("--features", type=int, default=50000, help="nombre d'objets (défaut : 50000)")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="nombres de processus à comparer")
+    parser.add_argument("--formats", default=",".join(EXPORTS), help=f"parmi {','.join(EXPORTS)}")
+    args = parser.parse_args(argv)
+
+    session = synthetic_session(args.features)
+    worker_counts = sorted({int(w) for w in args.workers.split(',')} | {1})
+    failed = False
+
+    print(f"{args.features} objets, {os.cpu_count()} cœur(s)")
+    print(f"{'format':<10}{'processus':>10}{'durée (s)':>12}{'accélération':>14}  identique")
+    for name in args.formats.split(','):
+        export = EXPORTS[name]
+        reference, sequential_time = None, None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            output = export(session, workers)
+            elapsed = time.perf_counter() - start
+            if workers == 1:
+                reference, sequential_time = output, elapsed
+            identical = output == reference
+            failed |= not identical
+            print(f"{name:<10}{workers:>10}{elapsed:>12.2f}{sequential_time / elapsed:>13.2f}x  {'oui' if identical else 'NON'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
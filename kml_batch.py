@@ -0,0 +1,292 @@
+# Génération en lot de dossiers de briefing (KML, GeoJSON, MBTiles par couleur) sans interface
+#
+# Chaque fichier de description (YAML ou CSV) produit un dossier <sortie>/<nom>/ ; les fichiers
+# sont traités en parallèle par un pool de processus (un par cœur par défaut).
+#
+#   python kml_batch.py briefings/ -o exports/
+#   python kml_batch.py lfcd.yaml arcachon.csv -o exports/ --formats kml,geojson,mbtiles --mbtiles local
+#
+# YAML :
+#   name: lfcd
+#   points:     [{name: P1, lat: 44.52, lon: -1.12, description: "..."}]
+#   lines:      [{name: L1, points: [P1, [44.6, -1.2]], color: bleu, width: 3, geodesic: true}]
+#   circles:    [{name: C1, lat: 44.52, lon: -1.12, radius: 2, unit: nautiques, segments: 72, fill: true}]
+#   arcs:       [{name: A1, lat: 44.52, lon: -1.12, radius: 500, unit: mètres, start_angle: 0, end_angle: 90, close_arc: true}]
+#   rectangles: [{name: R1, lat: 44.52, lon: -1.12, length: 1, breadth: 0.5, unit: nautiques, bearing: 90}]
+#
+# CSV : une ligne par objet, colonne "kind" (point, circle, arc, rectangle) et mêmes noms de colonnes.
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lazy_modules import lazy_import
+from kml_core import (
+    DEFAULT_API_URL, DEFAULT_API_TIMEOUT, calculate_circle_points, calculate_rectangle_points,
+    generate_kml, generate_geojson, group_objects_by_color, generate_geojson_for_tippecanoe,
+    convert_geojson_minimal, convert_geojson_local
+)
+
+yaml = lazy_import("yaml")
+
+SPEC_EXTENSIONS = ('.yaml', '.yml', '.csv')
+OUTPUT_FORMATS = ('kml', 'geojson', 'mbtiles')
+COLORS = ("rouge", "vert", "bleu", "jaune", "orange", "cyan", "magenta", "noir", "blanc")
+
+UNIT_ALIASES = {"nautiques": "nautiques", "nm": "nautiques", "mètres": "mètres", "metres": "mètres", "m": "mètres"}
+
+# Nom d'un dossier de briefing : simple nom de répertoire sous le dossier de sortie (ni chemin, ni lecteur)
+INVALID_NAME_CHARS = re.compile(r'[/\\:\x00]')
+
+# Types d'objets des lignes CSV -> clé de section YAML
+CSV_KINDS = {"point": "points", "circle": "circles", "arc": "arcs", "rectangle": "rectangles"}
+
+
+def to_km(value, unit):
+    """Distance en km à partir d'une valeur en nautiques ou en mètres (conventions de l'application)"""
+    return float(value) * 1.852 if unit == "nautiques" else float(value) / 1000
+
+
+def parse_bool(value, default=False):
+    """Booléen YAML ou texte CSV ("1", "true", "oui"...)"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'oui', 'o', 'y')
+    return bool(value)
+
+
+def parse_unit(item):
+    unit = str(item.get('unit') or 'nautiques').strip().lower()
+    if unit not in UNIT_ALIASES:
+        raise ValueError(f"Unité inconnue pour '{item.get('name')}' : {unit}")
+    return UNIT_ALIASES[unit]
+
+
+def parse_style(item, default_width):
+    color = str(item.get('color') or 'rouge').strip()
+    if color not in COLORS:
+        raise ValueError(f"Couleur inconnue pour '{item.get('name')}' : {color}")
+    return color, int(float(item.get('width') or default_width))
+
+
+def build_point(item):
+    return {
+        "type": "Point", "name": str(item['name']), "lat": float(item['lat']), "lon": float(item['lon']),
+        "description": str(item.get('description') or '')
+    }
+
+
+def build_line(item, points_by_name):
+    coords = []
+    for ref in item['points']:
+        if isinstance(ref, str):
+            if ref not in points_by_name:
+                raise ValueError(f"Point inconnu dans la ligne '{item['name']}' : {ref}")
+            ref = (points_by_name[ref]['lat'], points_by_name[ref]['lon'])
+        lat, lon = ref
+        coords.append((float(lon), float(lat)))
+    color, width = parse_style(item, 3)
+    return {
+        "name": str(item['name']), "points": coords, "color": color, "width": width,
+        "description": str(item.get('description') or ''), "geodesic": bool(item.get('geodesic', False))
+    }
+
+
+def build_circle(item, is_arc):
+    radius_unit = parse_unit(item)
+    radius_km = to_km(item['radius'], radius_unit)
+    num_segments = int(float(item.get('segments') or 72))
+    center_lat, center_lon = float(item['lat']), float(item['lon'])
+    color, width = parse_style(item, 5)
+
+    if is_arc:
+        start_angle, end_angle = float(item.get('start_angle') or 0), float(item.get('end_angle') or 90)
+        close_arc = parse_bool(item.get('close_arc'), default=True)
+    else:
+        start_angle, end_angle, close_arc = 0, 360, True
+
+    circle = {
+        "type": "Arc" if is_arc else "Cercle", "name": str(item['name']), "center_lat": center_lat, "center_lon": center_lon,
+        "radius_km": radius_km, "radius_unit": radius_unit, "num_segments": num_segments,
+        "points": calculate_circle_points(center_lat, center_lon, radius_km, num_segments, is_arc, start_angle, end_angle, close_arc),
+        "color": color, "width": width, "fill": parse_bool(item.get('fill'))
+    }
+    if is_arc:
+        circle["start_angle"] = start_angle
+        circle["end_angle"] = end_angle
+        circle["close_arc"] = close_arc
+    if item.get('description'):
+        circle["description"] = str(item['description'])
+    return circle
+
+
+def build_rectangle(item):
+    unit = parse_unit(item)
+    length_km, width_km = to_km(item['length'], unit), to_km(item['breadth'], unit)
+    center_lat, center_lon = float(item['lat']), float(item['lon'])
+    bearing_deg = float(item.get('bearing') or 0)
+    color, width = parse_style(item, 5)
+    return {
+        "type": "Rectangle", "name": str(item['name']), "center_lat": center_lat, "center_lon": center_lon,
+        "length_km": length_km, "width_km": width_km, "bearing_deg": bearing_deg,
+        "length_unit": unit, "width_unit": unit,
+        "points": calculate_rectangle_points(center_lat, center_lon, length_km, width_km, bearing_deg),
+        "color": color, "width": width, "fill": parse_bool(item.get('fill')), "add_arrow": False
+    }
+
+
+def read_spec(path):
+    """Description d'un dossier : dict avec name et les sections points/lines/circles/arcs/rectangles"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if path.lower().endswith('.csv'):
+        spec = {"name": stem}
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                kind = (row.get('kind') or '').strip().lower()
+                if kind not in CSV_KINDS:
+                    raise ValueError(f"{path}:{line_number} : type d'objet inconnu '{kind}'")
+                spec.setdefault(CSV_KINDS[kind], []).append({k: v for k, v in row.items() if v not in (None, '')})
+        return spec
+
+    with open(path, encoding='utf-8') as f:
+        spec = yaml.safe_load(f) or {}
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path} : la description doit être un dictionnaire")
+    spec.setdefault("name", stem)
+    return spec
+
+
+def build_objects(spec):
+    """Objets (mêmes structures que dans l'application) par type, à partir d'une description"""
+    points = [build_point(item) for item in spec.get('points') or []]
+    points_by_name = {p['name']: p for p in points}
+    return {
+        "points": points,
+        "lines": [build_line(item, points_by_name) for item in spec.get('lines') or []],
+        "circles": [build_circle(item, False) for item in spec.get('circles') or []]
+                   + [build_circle(item, True) for item in spec.get('arcs') or []],
+        "rectangles": [build_rectangle(item) for item in spec.get('rectangles') or []],
+    }
+
+
+def convert_mbtiles(geojson_data, name, options):
+    if options['mbtiles'] == 'local':
+        return convert_geojson_local(geojson_data, name=name, tippecanoe=options['tippecanoe'])
+    return convert_geojson_minimal(geojson_data, name=name, api_url=options['api_url'], timeout=options['api_timeout'])
+
+
+def pack_name(spec):
+    """Nom du dossier de briefing, refusé s'il sortirait du dossier de sortie ("../x", chemin absolu...)"""
+    name = str(spec['name']).strip()
+    if not name or name in ('.', '..') or INVALID_NAME_CHARS.search(name):
+        raise ValueError(f"Nom de dossier invalide '{name}' (un simple nom de répertoire est attendu)")
+    return name
+
+
+def process_spec(path, output_dir, options):
+    """Génère les fichiers d'un dossier de briefing ; retourne (nom, fichiers écrits, durée en s)"""
+    start = time.perf_counter()
+    spec = read_spec(path)
+    name = pack_name(spec)
+    objects = build_objects(spec)
+
+    pack_dir = os.path.join(output_dir, name)
+    os.makedirs(pack_dir, exist_ok=True)
+    written = []
+
+    def write(filename, data):
+        file_path = os.path.join(pack_dir, filename)
+        with open(file_path, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+        written.append(file_path)
+
+    if 'kml' in options['formats']:
+        write(f"{name}.kml", generate_kml(**objects).kml())
+    if 'geojson' in options['formats']:
+        write(f"{name}.geojson", json.dumps(generate_geojson(**objects), indent=2, ensure_ascii=False))
+    if 'mbtiles' in options['formats']:
+        if options['mbtiles_mode'] == 'single':
+            geojson_data = generate_geojson_for_tippecanoe(**objects)
+            if geojson_data['features']:
+                write(f"{name}.mbtiles", convert_mbtiles(geojson_data, name, options))
+        else:
+            for color, geojson_data in group_objects_by_color(**objects).items():
+                if geojson_data['features']:
+                    write(f"{name}_{color}.mbtiles", convert_mbtiles(geojson_data, f"{name}_{color}", options))
+
+    return name, written, time.perf_counter() - start
+
+
+def find_specs(inputs):
+    """Fichiers de description, les répertoires étant parcourus (non récursivement)"""
+    specs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            specs.extend(sorted(
+                os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(SPEC_EXTENSIONS)
+            ))
+        else:
+            specs.append(path)
+    return specs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génération en lot de fichiers KML, GeoJSON et MBTiles")
+    parser.add_argument("inputs", nargs='+', help="fichiers YAML/CSV ou répertoires les contenant")
+    parser.add_argument("-o", "--output", default="exports", help="répertoire de sortie (défaut : exports)")
+    parser.add_argument("--formats", default="kml,geojson", help=f"formats parmi {','.join(OUTPUT_FORMATS)} (défaut : kml,geojson)")
+    parser.add_argument("--mbtiles", choices=['auto', 'local', 'api'], default='auto',
+                        help="conversion MBTiles : Tippecanoe local, API, ou local s'il est installé (défaut)")
+    parser.add_argument("--mbtiles-mode", choices=['color', 'single'], default='color',
+                        help="un fichier MBTiles par couleur (défaut) ou un fichier unique")
+    parser.add_argument("--tippecanoe", default="tippecanoe", help="exécutable Tippecanoe local")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL, help="URL de l'API de conversion")
+    parser.add_argument("--api-timeout", type=float, default=DEFAULT_API_TIMEOUT)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="processus (défaut : nombre de cœurs)")
+    args = parser.parse_args(argv)
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        parser.error(f"formats inconnus : {', '.join(sorted(unknown))}")
+    mbtiles = args.mbtiles
+    if mbtiles == 'auto':
+        mbtiles = 'local' if shutil.which(args.tippecanoe) else 'api'
+
+    specs = find_specs(args.inputs)
+    if not specs:
+        parser.error("aucun fichier de description trouvé")
+
+    options = {
+        'formats': formats, 'mbtiles': mbtiles, 'mbtiles_mode': args.mbtiles_mode,
+        'tippecanoe': args.tippecanoe, 'api_url': args.api_url, 'api_timeout': args.api_timeout,
+    }
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [(path, pool.submit(process_spec, path, args.output, options)) for path in specs]
+        for path, future in futures:
+            try:
+                name, written, duration = future.result()
+                print(f"✅ {name} : {len(written)} fichier(s) en {duration:.2f} s")
+            except Exception as e:
+                failures += 1
+                print(f"❌ {path} : {e}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(specs) - failures}/{len(specs)} dossier(s) en {elapsed:.1f} s "
+          f"({(len(specs) - failures) / elapsed * 3600:.0f} dossiers/heure)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,942 @@
+# Génération des géométries et des exports (KML, GeoJSON, MBTiles) à partir de données simples
+# Aucune dépendance à la session Streamlit : utilisé par l'application et par la génération en lot (kml_batch.py)
+
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from lazy_modules import lazy_import
+from perf import timed
+
+simplekml = lazy_import("simplekml")
+requests = lazy_import("requests")
+np = lazy_import("numpy")
+
+# API de conversion GeoJSON -> MBTiles (Tippecanoe distant)
+DEFAULT_API_URL = "https://kml-api-docker.onrender.com"
+DEFAULT_API_TIMEOUT = 300
+
+# Constantes WGS84
+WGS84_A = 6378137.0  # Demi-grand axe (m)
+WGS84_F = 1/298.257223563  # Aplatissement
+WGS84_B = WGS84_A * (1 - WGS84_F)  # Demi-petit axe
+
+# Densification géodésique des lignes : écart maximal (m) entre la géodésique et chaque segment tracé,
+# nombre maximal de segments par tronçon, points de contrôle par segment et lignes gardées en cache
+GEODESIC_MAX_ERROR_M = 50.0
+GEODESIC_MAX_SEGMENTS = 1024
+GEODESIC_CHECK_SAMPLES = 4
+GEODESIC_CACHE_SIZE = 1024
+
+
+# Fonctions géodésiques haute précision (Vincenty)
+@timed
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Distance Vincenty inverse - précision sub-métrique"""
+    if lat1 == lat2 and lon1 == lon2:
+        return 0.0
+    
+    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
+    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
+    
+    L = lon2_rad - lon1_rad
+    U1 = math.atan((1 - WGS84_F) * math.tan(lat1_rad))
+    U2 = math.atan((1 - WGS84_F) * math.tan(lat2_rad))
+    
+    sin_U1, cos_U1 = math.sin(U1), math.cos(U1)
+    sin_U2, cos_U2 = math.sin(U2), math.cos(U2)
+    
+    lambda_val = L
+    for _ in range(100):
+        sin_lambda, cos_lambda = math.sin(lambda_val), math.cos(lambda_val)
+        sin_sigma = math.sqrt((cos_U2 * sin_lambda) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda) ** 2)
+        
+        if sin_sigma == 0:
+            return 0.0
+        
+        cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lambda
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_U1 * cos_U2 * sin_lambda / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        
+        if cos2_alpha == 0:
+            cos_2sigma_m = 0
+        else:
+            cos_2sigma_m = cos_sigma - 2 * sin_U1 * sin_U2 / cos2_alpha
+        
+        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lambda_prev = lambda_val
+        lambda_val = L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        
+        if abs(lambda_val - lambda_prev) < 1e-12:
+            break
+    
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / (WGS84_B ** 2)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    
+    return WGS84_B * A * (sigma - delta_sigma)
+
+
+@timed
+def calculate_bearing(lat1, lon1, lat2, lon2):
+    """Gisement initial Vincenty - précision sub-métrique"""
+    if lat1 == lat2 and lon1 == lon2:
+        return 0.0
+    
+    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
+    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
+    
+    L = lon2_rad - lon1_rad
+    U1 = math.atan((1 - WGS84_F) * math.tan(lat1_rad))
+    U2 = math.atan((1 - WGS84_F) * math.tan(lat2_rad))
+    
+    sin_U1, cos_U1 = math.sin(U1), math.cos(U1)
+    sin_U2, cos_U2 = math.sin(U2), math.cos(U2)
+    
+    lambda_val = L
+    for _ in range(100):
+        sin_lambda, cos_lambda = math.sin(lambda_val), math.cos(lambda_val)
+        sin_sigma = math.sqrt((cos_U2 * sin_lambda) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda) ** 2)
+        
+        if sin_sigma == 0:
+            return 0.0
+        
+        cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lambda
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_U1 * cos_U2 * sin_lambda / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        
+        if cos2_alpha == 0:
+            cos_2sigma_m = 0
+        else:
+            cos_2sigma_m = cos_sigma - 2 * sin_U1 * sin_U2 / cos2_alpha
+        
+        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lambda_prev = lambda_val
+        lambda_val = L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        
+        if abs(lambda_val - lambda_prev) < 1e-12:
+            break
+    
+    alpha1 = math.atan2(cos_U2 * sin_lambda, cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda)
+    return (math.degrees(alpha1) + 360) % 360
+
+
+@timed
+def calculate_circle_points(center_lat, center_lon, radius_km, num_segments, is_arc=False, start_angle_deg=0, end_angle_deg=360, close_arc=True):
+    """Calcul de cercles avec précision Vincenty"""
+    points = []
+    center_point = {"lat": center_lat, "lon": center_lon}
+
+    if is_arc:
+        if end_angle_deg < start_angle_deg:
+            end_angle_deg += 360
+        
+        # Pour les arcs fermés, ajouter le centre au début
+        if close_arc:
+            points.append((center_lon, center_lat))
+        
+        angle_range = end_angle_deg - start_angle_deg
+        effective_num_segments = max(num_segments, int(abs(angle_range)))
+        
+        # Générer les points de l'arc
+        for i in range(effective_num_segments + 1):
+            angle_deg = start_angle_deg + (angle_range / effective_num_segments) * i
+            if angle_deg > 360:
+                angle_deg -= 360
+            
+            new_lat, new_lon = create_point_from_bearing_distance(center_point, radius_km, angle_deg)
+            points.append((new_lon, new_lat))
+        
+        # Pour les arcs fermés, fermer vers le centre
+        if close_arc:
+            points.append((center_lon, center_lat))
+    else:
+        # Cercle complet
+        for i in range(num_segments + 1):
+            angle_deg = (360 / num_segments) * i
+            new_lat, new_lon = create_point_from_bearing_distance(center_point, radius_km, angle_deg)
+            points.append((new_lon, new_lat))
+    return points
+
+
+@timed
+def calculate_rectangle_points(center_lat, center_lon, length_km, width_km, bearing_deg):
+    """Calcul de rectangles avec précision Vincenty"""
+    center_point = {"lat": center_lat, "lon": center_lon}
+    half_length_km = length_km / 2
+    half_width_km = width_km / 2
+    
+    corners_local = [
+        (half_length_km, half_width_km),
+        (half_length_km, -half_width_km),
+        (-half_length_km, -half_width_km),
+        (-half_length_km, half_width_km)
+    ]
+    
+    rectangle_points = []
+
+    for x_local, y_local in corners_local:
+        dist_to_corner = math.sqrt(x_local**2 + y_local**2)
+        angle_relative = math.degrees(math.atan2(y_local, x_local))
+        absolute_bearing = (bearing_deg + angle_relative) % 360
+        
+        new_lat, new_lon = create_point_from_bearing_distance(center_point, dist_to_corner, absolute_bearing)
+        rectangle_points.append((new_lon, new_lat))
+    
+    rectangle_points.append(rectangle_points[0])  # Fermer le rectangle
+    return rectangle_points
+
+
+@timed
+def create_point_from_bearing_distance(start_point, distance_km, bearing_deg):
+    """Formule directe Vincenty - précision sub-métrique"""
+    lat1_rad = math.radians(start_point["lat"])
+    lon1_rad = math.radians(start_point["lon"])
+    alpha1_rad = math.radians(bearing_deg)
+    s = distance_km * 1000  # Convertir en mètres
+    
+    sin_alpha1, cos_alpha1 = math.sin(alpha1_rad), math.cos(alpha1_rad)
+    tan_U1 = (1 - WGS84_F) * math.tan(lat1_rad)
+    cos_U1 = 1 / math.sqrt(1 + tan_U1 ** 2)
+    sin_U1 = tan_U1 * cos_U1
+    
+    sigma1 = math.atan2(tan_U1, cos_alpha1)
+    sin_alpha = cos_U1 * sin_alpha1
+    cos2_alpha = 1 - sin_alpha ** 2
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / (WGS84_B ** 2)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    
+    sigma = s / (WGS84_B * A)
+    for _ in range(100):
+        cos_2sigma_m = math.cos(2 * sigma1 + sigma)
+        sin_sigma, cos_sigma = math.sin(sigma), math.cos(sigma)
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        sigma_prev = sigma
+        sigma = s / (WGS84_B * A) + delta_sigma
+        
+        if abs(sigma - sigma_prev) < 1e-12:
+            break
+    
+    tmp = sin_U1 * sin_sigma - cos_U1 * cos_sigma * cos_alpha1
+    lat2_rad = math.atan2(sin_U1 * cos_sigma + cos_U1 * sin_sigma * cos_alpha1, (1 - WGS84_F) * math.sqrt(sin_alpha ** 2 + tmp ** 2))
+    lambda_val = math.atan2(sin_sigma * sin_alpha1, cos_U1 * cos_sigma - sin_U1 * sin_sigma * cos_alpha1)
+    C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+    L = lambda_val - (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+    lon2_rad = (lon1_rad + L + 3 * math.pi) % (2 * math.pi) - math.pi
+    
+    return math.degrees(lat2_rad), math.degrees(lon2_rad)
+
+
+def vincenty_direct_array(lat1, lon1, bearing_deg, distances_m):
+    """Formule directe Vincenty vectorisée : tableaux (lat, lon) en degrés atteints aux distances données (m)"""
+    lat1_rad = np.radians(lat1)
+    alpha1_rad = np.radians(bearing_deg)
+    s = np.asarray(distances_m, dtype=float)
+
+    sin_alpha1, cos_alpha1 = np.sin(alpha1_rad), np.cos(alpha1_rad)
+    tan_U1 = (1 - WGS84_F) * np.tan(lat1_rad)
+    cos_U1 = 1 / np.sqrt(1 + tan_U1 ** 2)
+    sin_U1 = tan_U1 * cos_U1
+
+    sigma1 = np.arctan2(tan_U1, cos_alpha1)
+    sin_alpha = cos_U1 * sin_alpha1
+    cos2_alpha = 1 - sin_alpha ** 2
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / (WGS84_B ** 2)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+
+    sigma = s / (WGS84_B * A)
+    for _ in range(100):
+        cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+        sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        sigma_prev = sigma
+        sigma = s / (WGS84_B * A) + delta_sigma
+
+        if np.all(np.abs(sigma - sigma_prev) < 1e-12):
+            break
+
+    cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+    sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+    tmp = sin_U1 * sin_sigma - cos_U1 * cos_sigma * cos_alpha1
+    lat2_rad = np.arctan2(sin_U1 * cos_sigma + cos_U1 * sin_sigma * cos_alpha1, (1 - WGS84_F) * np.sqrt(sin_alpha ** 2 + tmp ** 2))
+    lambda_val = np.arctan2(sin_sigma * sin_alpha1, cos_U1 * cos_sigma - sin_U1 * sin_sigma * cos_alpha1)
+    C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+    L = lambda_val - (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+    lon2 = (lon1 + np.degrees(L) + 540) % 360 - 180
+
+    return np.degrees(lat2_rad), lon2
+
+
+def chord_errors(lat, lon, samples):
+    """Écart (m) de chaque segment tracé à la géodésique, échantillonnée `samples` fois par segment
+
+    Les sommets du tracé sont aux indices multiples de `samples`, les points intermédiaires de la
+    géodésique entre eux ; l'écart est mesuré dans le plan tangent local (équirectangulaire).
+    """
+    starts = np.arange(0, len(lat) - 1, samples)
+    ends = starts + samples
+    inner = starts[:, None] + np.arange(1, samples)
+    lat_a, lat_b, lat_m = lat[starts, None], lat[ends, None], lat[inner]
+    # Longitudes relatives au début de chaque segment (continuité à l'antiméridien)
+    lon_b = (lon[ends, None] - lon[starts, None] + 180) % 360 - 180
+    lon_m = (lon[inner] - lon[starts, None] + 180) % 360 - 180
+    meters_per_deg = WGS84_A * math.pi / 180
+    cos_lat = np.cos(np.radians((lat_a + lat_b) / 2))
+    bx, by = lon_b * cos_lat * meters_per_deg, (lat_b - lat_a) * meters_per_deg
+    mx, my = lon_m * cos_lat * meters_per_deg, (lat_m - lat_a) * meters_per_deg
+    length = np.hypot(bx, by)
+    cross = np.abs(bx * my - by * mx) / np.where(length > 0, length, 1)
+    return np.where(length > 0, cross, np.hypot(mx, my)).max(axis=1)
+
+
+def densify_geodesic_leg(lat1, lon1, lat2, lon2, max_error_m=GEODESIC_MAX_ERROR_M):
+    """Sommets (lat, lon) de la géodésique entre deux points, extrémités comprises
+
+    Le nombre de segments double jusqu'à ce que chaque segment reste à moins de max_error_m de la
+    géodésique (contrôlée en GEODESIC_CHECK_SAMPLES points par segment) ; un calcul direct vectorisé par essai.
+    """
+    distance = calculate_distance(lat1, lon1, lat2, lon2)
+    if distance == 0:
+        return np.array([lat1, lat2]), np.array([lon1, lon2])
+    bearing = calculate_bearing(lat1, lon1, lat2, lon2)
+
+    samples = GEODESIC_CHECK_SAMPLES
+    segments = 1
+    while True:
+        lat, lon = vincenty_direct_array(lat1, lon1, bearing, np.linspace(0, distance, samples * segments + 1))
+        if segments >= GEODESIC_MAX_SEGMENTS or chord_errors(lat, lon, samples).max() <= max_error_m:
+            break
+        segments *= 2
+    lat, lon = lat[::samples], lon[::samples]
+    lat[0], lon[0], lat[-1], lon[-1] = lat1, lon1, lat2, lon2
+    return lat, lon
+
+
+@timed
+@lru_cache(maxsize=GEODESIC_CACHE_SIZE)
+def densify_geodesic_path(points, max_error_m=GEODESIC_MAX_ERROR_M):
+    """Tracé géodésique d'une suite de points ((lon, lat), ...) : tuple de sommets (lon, lat), mis en cache"""
+    path = [tuple(points[0])]
+    for (lon1, lat1), (lon2, lat2) in zip(points, points[1:]):
+        lat, lon = densify_geodesic_leg(lat1, lon1, lat2, lon2, max_error_m)
+        path.extend(zip(lon[1:].tolist(), lat[1:].tolist()))
+    return tuple(path)
+
+
+def line_coords(line):
+    """Coordonnées tracées d'une ligne : géodésique densifiée si line['geodesic'], sinon les points saisis"""
+    points = line['points']
+    if not line.get('geodesic') or len(points) < 2:
+        return points
+    return densify_geodesic_path(tuple((float(lon), float(lat)) for lon, lat, *_ in points))
+
+
+# Analyse de route : distance, route vraie et cumul de chaque tronçon en un seul calcul vectorisé
+def vincenty_inverse_array(lat1, lon1, lat2, lon2):
+    """Formule inverse Vincenty vectorisée : (distances en m, gisements initiaux en degrés) de chaque couple de points"""
+    lat1, lon1, lat2, lon2 = (np.asarray(value, dtype=float) for value in (lat1, lon1, lat2, lon2))
+    coincident = (lat1 == lat2) & (lon1 == lon2)
+
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    lambda_val = L
+    for _ in range(100):
+        sin_lambda, cos_lambda = np.sin(lambda_val), np.cos(lambda_val)
+        sin_sigma = np.sqrt((cos_U2 * sin_lambda) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda) ** 2)
+        # Points confondus : valeurs neutres, la distance est forcée à 0 ensuite
+        sin_sigma = np.where(sin_sigma == 0, 1e-300, sin_sigma)
+        cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lambda
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_U1 * cos_U2 * sin_lambda / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_U1 * sin_U2 / np.where(cos2_alpha == 0, 1, cos2_alpha))
+
+        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lambda_prev = lambda_val
+        lambda_val = L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+
+        if np.all(np.abs(lambda_val - lambda_prev) < 1e-12):
+            break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / (WGS84_B ** 2)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distance = np.where(coincident, 0.0, WGS84_B * A * (sigma - delta_sigma))
+
+    sin_lambda, cos_lambda = np.sin(lambda_val), np.cos(lambda_val)
+    alpha1 = np.arctan2(cos_U2 * sin_lambda, cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda)
+    bearing = np.where(coincident, 0.0, (np.degrees(alpha1) + 360) % 360)
+    return distance, bearing
+
+
+def lonlat_array(points):
+    """Sommets (lon, lat[, alt]) en tableau (n, 2) ; l'altitude, présente ou non selon les sommets, est ignorée"""
+    return np.asarray([point[:2] for point in points], dtype=float).reshape(len(points), 2)
+
+
+@timed
+def route_legs(points):
+    """Tronçons d'une suite de sommets (lon, lat) : tableaux distance_m, bearing_deg (route vraie) et cumulative_m"""
+    coords = lonlat_array(points)
+    if len(coords) < 2:
+        empty = np.zeros(0)
+        return {"distance_m": empty, "bearing_deg": empty, "cumulative_m": empty}
+    distance, bearing = vincenty_inverse_array(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+    return {"distance_m": distance, "bearing_deg": bearing, "cumulative_m": np.cumsum(distance)}
+
+
+@timed
+def routes_summary(lines):
+    """Résumé de chaque ligne (points, tronçons, distance totale en m, route initiale, plus long tronçon)
+
+    Tous les sommets de toutes les lignes sont concaténés : un seul calcul vectorisé, les couples
+    de points à cheval sur deux lignes étant ensuite écartés.
+    """
+    counts = np.array([len(line['points']) for line in lines], dtype=np.int64)
+    if counts.sum() < 2:
+        return [{"points": int(count), "legs": 0, "distance_m": 0.0, "initial_bearing_deg": None, "longest_leg_m": 0.0}
+                for count in counts]
+    coords = np.concatenate([lonlat_array(line['points']) for line in lines if len(line['points'])])
+    owner = np.repeat(np.arange(len(lines)), counts)
+    same_line = owner[:-1] == owner[1:]
+    leg_owner = owner[:-1][same_line]
+    start, end = coords[:-1][same_line], coords[1:][same_line]
+    distance, bearing = vincenty_inverse_array(start[:, 1], start[:, 0], end[:, 1], end[:, 0])
+
+    legs = np.bincount(leg_owner, minlength=len(lines))
+    totals = np.bincount(leg_owner, weights=distance, minlength=len(lines))
+    longest = np.zeros(len(lines))
+    np.maximum.at(longest, leg_owner, distance)
+    # Route initiale : premier tronçon non nul de chaque ligne (les points répétés sont ignorés)
+    moving = np.flatnonzero(distance > 0)
+    owners, first = np.unique(leg_owner[moving], return_index=True)
+    initial_bearing = dict(zip(owners.tolist(), bearing[moving[first]].tolist()))
+    return [
+        {"points": int(counts[i]), "legs": int(legs[i]), "distance_m": float(totals[i]),
+         "initial_bearing_deg": initial_bearing.get(i), "longest_leg_m": float(longest[i])}
+        for i in range(len(lines))
+    ]
+
+
+def kml_color_map():
+    """Couleurs de l'application -> couleurs KML"""
+    return {
+        "rouge": simplekml.Color.red, "vert": simplekml.Color.green, "bleu": simplekml.Color.blue,
+        "jaune": simplekml.Color.yellow, "orange": simplekml.Color.orange, "cyan": simplekml.Color.cyan,
+        "magenta": simplekml.Color.magenta, "noir": simplekml.Color.black, "blanc": simplekml.Color.white
+    }
+
+
+def add_kml_point(folder, p_data, color_map):
+    p = folder.newpoint(name=p_data['name'], coords=[(p_data['lon'], p_data['lat'])])
+    if p_data.get('description'):
+        p.description = p_data['description']
+
+
+def add_kml_line(folder, l_data, color_map):
+    ls = folder.newlinestring(name=l_data['name'], coords=line_coords(l_data))
+    if l_data.get('description'):
+        ls.description = l_data['description']
+    ls.style.linestyle.width = l_data['width']
+    ls.style.linestyle.color = color_map.get(l_data['color'], simplekml.Color.red)
+
+
+def add_kml_open_arc(folder, c_data, color_map):
+    if 'points' in c_data:
+        line = folder.newlinestring(name=c_data['name'], coords=c_data['points'])
+        if c_data.get('description'):
+            line.description = c_data['description']
+        line.style.linestyle.width = c_data.get('width', 2)
+        line.style.linestyle.color = color_map.get(c_data.get('color', 'rouge'), simplekml.Color.red)
+
+
+def add_kml_closed_shape(folder, c_data, color_map):
+    if 'points' in c_data:
+        # Créer un polygone avec style explicite
+        poly = folder.newpolygon(name=c_data['name'], outerboundaryis=c_data['points'])
+        if c_data.get('description'):
+            poly.description = c_data['description']
+
+        # Style de ligne
+        poly.style.linestyle.width = c_data.get('width', 2)
+        poly.style.linestyle.color = color_map.get(c_data.get('color', 'rouge'), simplekml.Color.red)
+
+        # Style de remplissage
+        if c_data.get('fill', False):
+            base_color = color_map.get(c_data.get('color', 'rouge'), simplekml.Color.red)
+            poly.style.polystyle.color = simplekml.Color.changealphaint(150, base_color)
+            poly.style.polystyle.fill = 1
+        else:
+            poly.style.polystyle.fill = 0
+            poly.style.polystyle.outline = 1  # Forcer l'affichage du contour
+
+
+def add_kml_rectangle(folder, r_data, color_map):
+    poly = folder.newpolygon(name=r_data['name'], outerboundaryis=r_data['points'])
+    poly.style.linestyle.width = r_data.get('width', 2)
+    poly.style.linestyle.color = color_map.get(r_data.get('color', 'rouge'), simplekml.Color.red)
+
+    if r_data.get('fill', False):
+        base_color = color_map.get(r_data.get('color', 'rouge'), simplekml.Color.red)
+        poly.style.polystyle.color = simplekml.Color.changealphaint(150, base_color)
+        poly.style.polystyle.fill = 1
+    else:
+        poly.style.polystyle.fill = 0
+
+
+def kml_folders(points=(), lines=(), circles=(), rectangles=()):
+    """Dossiers du document KML dans l'ordre : [(nom, [(fonction d'ajout, objet), ...])]"""
+    folders = []
+    if points:
+        folders.append(("Points Générés", [(add_kml_point, p) for p in points]))
+
+    # Les arcs ouverts vont dans le dossier des lignes, les cercles et arcs fermés dans le leur
+    line_items = [(add_kml_line, l) for l in lines]
+    circle_items = []
+    for c in circles:
+        if c.get('type') == 'Arc' and not c.get('close_arc', True):
+            line_items.append((add_kml_open_arc, c))
+        else:
+            circle_items.append((add_kml_closed_shape, c))
+    if line_items:
+        folders.append(("Lignes Générées", line_items))
+    if circle_items:
+        folders.append(("Cercles et Arcs Fermés", circle_items))
+
+    if rectangles:
+        folders.append(("Rectangles Générés", [(add_kml_rectangle, r) for r in rectangles]))
+    return folders
+
+
+@timed
+def generate_kml(points=(), lines=(), circles=(), rectangles=()):
+    """Document KML (simplekml) des objets ; identifiants numérotés depuis 0 à chaque document"""
+    simplekml.Kml.resetidcounter()
+    kml = simplekml.Kml()
+    color_map = kml_color_map()
+    for name, items in kml_folders(points, lines, circles, rectangles):
+        folder = kml.newfolder(name=name)
+        for add, obj in items:
+            add(folder, obj, color_map)
+    return kml
+
+
+def clean_coordinates(coords):
+    """Coordonnées [lon, lat] valides d'une géométrie (les sommets invalides sont ignorés)"""
+    coordinates = []
+    for coord in coords:
+        try:
+            lon, lat = float(coord[0]), float(coord[1])
+            if -180 <= lon <= 180 and -90 <= lat <= 90:
+                coordinates.append([lon, lat])
+        except (ValueError, TypeError, IndexError):
+            continue
+    return coordinates
+
+
+def point_feature(point):
+    """Feature Point, ou None si les coordonnées sont invalides"""
+    try:
+        lon, lat = float(point['lon']), float(point['lat'])
+        if -180 <= lon <= 180 and -90 <= lat <= 90:
+            return {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [lon, lat]
+                },
+                "properties": {
+                    "name": str(point['name']),
+                    "description": str(point.get('description', ''))
+                }
+            }
+    except (ValueError, TypeError, KeyError):
+        pass
+    return None
+
+
+def point_circle_feature(point):
+    """Point converti en cercle de 25 m de rayon (Polygon), pour SD VFR Next"""
+    try:
+        lat, lon = float(point['lat']), float(point['lon'])
+        if -180 <= lon <= 180 and -90 <= lat <= 90:
+            circle_points = calculate_circle_points(lat, lon, 0.025, 36, is_arc=False)
+
+            if len(circle_points) >= 3:
+                if circle_points[0] != circle_points[-1]:
+                    circle_points.append(circle_points[0])
+
+                return {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [circle_points]
+                    },
+                    "properties": {
+                        "name": str(point['name']),
+                        "description": str(point.get('description', ''))
+                    }
+                }
+    except (ValueError, TypeError, KeyError):
+        pass
+    return None
+
+
+def line_feature(line):
+    """Ligne en MultiLineString (format attendu par Tippecanoe), ou None"""
+    if 'points' in line and line['points'] and len(line['points']) >= 2:
+        coordinates = clean_coordinates(line_coords(line))
+        if len(coordinates) >= 2:
+            return {
+                "type": "Feature",
+                "geometry": {
+                    "type": "MultiLineString",
+                    "coordinates": [coordinates]
+                },
+                "properties": {
+                    "name": str(line['name']),
+                    "description": str(line.get('description', ''))
+                }
+            }
+    return None
+
+
+def polygon_feature(shape, with_description=True):
+    """Cercle, arc ou polygone en Polygon fermé, ou None (les cercles n'exportent que leur nom)"""
+    if 'points' in shape and shape['points'] and len(shape['points']) >= 3:
+        coordinates = clean_coordinates(shape['points'])
+        if len(coordinates) >= 3:
+            # Assurer fermeture du polygone
+            if coordinates[0] != coordinates[-1]:
+                coordinates.append(coordinates[0])
+
+            if len(coordinates) >= 4:
+                properties = {"name": str(shape['name'])}
+                if with_description:
+                    properties["description"] = str(shape.get('description', ''))
+                return {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [coordinates]
+                    },
+                    "properties": properties
+                }
+    return None
+
+
+def circle_feature(circle):
+    return polygon_feature(circle, with_description=False)
+
+
+def geojson_sources(points_feature, points=(), lines=(), circles=(), rectangles=()):
+    """Objets et fonction de conversion en feature, dans l'ordre des exports : [(fonction, objets), ...]"""
+    return [(points_feature, points), (line_feature, lines), (circle_feature, circles), (polygon_feature, rectangles)]
+
+
+@timed
+def generate_geojson(points=(), lines=(), circles=(), rectangles=()):
+    """Génère un GeoJSON strictement conforme aux spécifications Tippecanoe"""
+    features = []
+    for to_feature, objects in geojson_sources(point_feature, points, lines, circles, rectangles):
+        features.extend(f for f in map(to_feature, objects) if f is not None)
+
+    # Structure GeoJSON strictement conforme
+    return {
+        "type": "FeatureCollection",
+        "features": features
+    }
+
+
+def feature_color(obj, to_feature):
+    """Fichier MBTiles d'un objet : "points" pour les points, sinon sa couleur"""
+    return "points" if to_feature is point_circle_feature else obj.get('color', 'rouge')
+
+
+@timed
+def group_objects_by_color(points=(), lines=(), circles=(), rectangles=()):
+    """Groupe les objets par couleur pour créer des MBTiles séparés"""
+    colors_data = {}
+    for to_feature, objects in geojson_sources(point_circle_feature, points, lines, circles, rectangles):
+        for obj in objects:
+            feature = to_feature(obj)
+            if feature is not None:
+                color = feature_color(obj, to_feature)
+                colors_data.setdefault(color, {"type": "FeatureCollection", "features": []})["features"].append(feature)
+    return colors_data
+
+
+@timed
+def generate_geojson_for_tippecanoe(points=(), lines=(), circles=(), rectangles=()):
+    """Génère un GeoJSON pour Tippecanoe - fichier unique avec points convertis en cercles"""
+    features = []
+    for to_feature, objects in geojson_sources(point_circle_feature, points, lines, circles, rectangles):
+        features.extend(f for f in map(to_feature, objects) if f is not None)
+    return {
+        "type": "FeatureCollection",
+        "features": features
+    }
+
+# Export parallèle des très grandes sessions : les objets sont découpés en tranches, chaque processus
+# construit et sérialise les fragments de sa tranche, concaténés dans l'ordre. Le texte produit est
+# identique octet pour octet à celui de l'export séquentiel.
+# La numérotation des identifiants KML de chaque tranche passe par le compteur interne de simplekml
+# (Kmlable._globalid, version fixée dans requirements.txt) : si une autre version ne le numérote plus
+# de la même façon, le KML est construit séquentiellement.
+EXPORT_CHUNK_SIZE = 5000
+KML_FOLDER_INDENT = ' ' * 8  # kml > Document > Folder
+
+
+def chunked(items, size):
+    """Tranches successives d'une liste"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def use_process_pool(workers, chunk_size, *collections):
+    """Vrai si l'export parallèle vaut le coût de démarrage des processus (plus d'une tranche)"""
+    return workers > 1 and sum(len(objects) for objects in collections) > chunk_size
+
+
+def kml_id_counter_supported():
+    """Vrai si simplekml numérote ses objets avec un compteur global réglable, comme le suppose l'export parallèle"""
+    counter = getattr(getattr(simplekml, 'base', None), 'Kmlable', None)
+    if not isinstance(getattr(counter, '_globalid', None), int):
+        return False
+    saved = counter._globalid
+    try:
+        counter._globalid = 1000
+        folder = simplekml.Kml().newfolder()
+        # Identifiants pris dans le compteur, dans l'ordre de création : le dossier est le dernier créé
+        return int(folder._id) >= 1000 and folder._id == str(counter._globalid - 1)
+    except (AttributeError, ValueError):
+        return False
+    finally:
+        counter._globalid = saved
+
+
+KML_PARALLEL_SUPPORTED = kml_id_counter_supported()
+
+
+def kml_id_count(add, obj, cache):
+    """Identifiants simplekml consommés par un objet, mesurés une fois par forme d'objet"""
+    key = (add, tuple(sorted(obj)), bool(obj.get('description')), bool(obj.get('fill')))
+    if key not in cache:
+        counter = simplekml.base.Kmlable
+        saved = counter._globalid
+        folder = simplekml.Kml().newfolder()
+        before = counter._globalid
+        add(folder, obj, kml_color_map())
+        cache[key] = counter._globalid - before
+        counter._globalid = saved
+    return cache[key]
+
+
+def kml_chunk_fragments(name, start_id, items):
+    """Styles et placemarks d'une tranche d'un dossier KML, numérotés à partir de start_id"""
+    kml = simplekml.Kml()
+    folder = kml.newfolder(name=name)
+    simplekml.base.Kmlable._globalid = start_id
+    color_map = kml_color_map()
+    for add, obj in items:
+        add(folder, obj, color_map)
+
+    # Le dossier est au même niveau d'indentation que dans le document complet : ses styles
+    # précèdent la ligne <name>, ses placemarks la suivent
+    lines = kml.kml().split('\n')
+    start = next(i for i, line in enumerate(lines) if line.startswith(KML_FOLDER_INDENT + '<Folder'))
+    end = len(lines) - 1 - next(i for i, line in enumerate(reversed(lines)) if line == KML_FOLDER_INDENT + '</Folder>')
+    name_line = next(i for i in range(start + 1, end) if lines[i].startswith(KML_FOLDER_INDENT + '    <name>'))
+    return lines[start + 1:name_line], lines[name_line + 1:end]
+
+
+@timed
+def export_kml_text(points=(), lines=(), circles=(), rectangles=(), workers=1, chunk_size=EXPORT_CHUNK_SIZE):
+    """Texte KML des objets, identique à generate_kml(...).kml() ; construit en parallèle si workers > 1"""
+    points, lines, circles, rectangles = list(points), list(lines), list(circles), list(rectangles)
+    if not KML_PARALLEL_SUPPORTED or not use_process_pool(workers, chunk_size, points, lines, circles, rectangles):
+        return generate_kml(points, lines, circles, rectangles).kml()
+
+    # Plan de numérotation : identifiant de départ de chaque tranche, comme si les objets
+    # étaient ajoutés un par un au document
+    folders = kml_folders(points, lines, circles, rectangles)
+    cache = {}
+    counts = [[kml_id_count(add, obj, cache) for add, obj in items] for _, items in folders]
+
+    simplekml.Kml.resetidcounter()
+    skeleton = simplekml.Kml()
+    tasks = []
+    for (name, items), item_counts in zip(folders, counts):
+        skeleton.newfolder(name=name)
+        next_id = simplekml.base.Kmlable._globalid
+        for offset in range(0, len(items), chunk_size):
+            tasks.append((len(tasks), name, next_id, items[offset:offset + chunk_size]))
+            next_id += sum(item_counts[offset:offset + chunk_size])
+        simplekml.base.Kmlable._globalid = next_id
+    skeleton_lines = skeleton.kml().split('\n')
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        fragments = list(pool.map(kml_chunk_fragments, *zip(*[task[1:] for task in tasks])))
+
+    # Insertion des fragments dans le squelette (dossiers vides) : styles avant <name>, placemarks après
+    folder_fragments = []
+    for name, items in folders:
+        chunk_count = len(chunked(items, chunk_size))
+        folder_fragments.append(fragments[:chunk_count])
+        fragments = fragments[chunk_count:]
+    output = []
+    folder_index = -1
+    for line in skeleton_lines:
+        if line.startswith(KML_FOLDER_INDENT + '<Folder'):
+            folder_index += 1
+            output.append(line)
+            for styles, _ in folder_fragments[folder_index]:
+                output.extend(styles)
+        elif line.startswith(KML_FOLDER_INDENT + '    <name>') and folder_index >= 0:
+            output.append(line)
+            for _, placemarks in folder_fragments[folder_index]:
+                output.extend(placemarks)
+        else:
+            output.append(line)
+    return '\n'.join(output)
+
+
+def geojson_chunk_features(to_feature, objects):
+    """Features (dicts) d'une tranche d'objets"""
+    return [f for f in map(to_feature, objects) if f is not None]
+
+
+def geojson_chunk_text(to_feature, objects):
+    """(features d'une tranche sérialisées au niveau d'indentation de la liste "features", nombre de features)"""
+    features = geojson_chunk_features(to_feature, objects)
+    text = ',\n'.join(
+        '    ' + json.dumps(feature, indent=2, ensure_ascii=False).replace('\n', '\n    ') for feature in features
+    )
+    return text, len(features)
+
+
+def map_geojson_chunks(worker, sources, workers, chunk_size):
+    """Résultats de worker(fonction, tranche) pour toutes les tranches, dans l'ordre"""
+    tasks = [(to_feature, chunk) for to_feature, objects in sources for chunk in chunked(list(objects), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(worker, *zip(*tasks))) if tasks else []
+
+
+@timed
+def export_geojson_text(points=(), lines=(), circles=(), rectangles=(), workers=1, chunk_size=EXPORT_CHUNK_SIZE):
+    """(texte GeoJSON indenté, nombre de features) ; texte identique à json.dumps(generate_geojson(...), indent=2, ensure_ascii=False)"""
+    points, lines, circles, rectangles = list(points), list(lines), list(circles), list(rectangles)
+    if not use_process_pool(workers, chunk_size, points, lines, circles, rectangles):
+        geojson_data = generate_geojson(points, lines, circles, rectangles)
+        return json.dumps(geojson_data, indent=2, ensure_ascii=False), len(geojson_data['features'])
+
+    sources = geojson_sources(point_feature, points, lines, circles, rectangles)
+    results = [result for result in map_geojson_chunks(geojson_chunk_text, sources, workers, chunk_size) if result[1]]
+    if not results:
+        return json.dumps({"type": "FeatureCollection", "features": []}, indent=2, ensure_ascii=False), 0
+    text = '{\n  "type": "FeatureCollection",\n  "features": [\n' + ',\n'.join(t for t, _ in results) + '\n  ]\n}'
+    return text, sum(count for _, count in results)
+
+
+def color_chunk_features(to_feature, objects):
+    """(couleur, feature) des objets d'une tranche"""
+    pairs = []
+    for obj in objects:
+        feature = to_feature(obj)
+        if feature is not None:
+            pairs.append((feature_color(obj, to_feature), feature))
+    return pairs
+
+
+@timed
+def export_groups_by_color(points=(), lines=(), circles=(), rectangles=(), workers=1, chunk_size=EXPORT_CHUNK_SIZE):
+    """Même résultat que group_objects_by_color, features construites en parallèle si workers > 1"""
+    points, lines, circles, rectangles = list(points), list(lines), list(circles), list(rectangles)
+    if not use_process_pool(workers, chunk_size, points, lines, circles, rectangles):
+        return group_objects_by_color(points, lines, circles, rectangles)
+
+    sources = geojson_sources(point_circle_feature, points, lines, circles, rectangles)
+    results = iter(map_geojson_chunks(color_chunk_features, sources, workers, chunk_size))
+    colors_data = {}
+    for to_feature, objects in sources:
+        for _ in chunked(objects, chunk_size):
+            for color, feature in next(results):
+                colors_data.setdefault(color, {"type": "FeatureCollection", "features": []})["features"].append(feature)
+    return colors_data
+
+
+@timed
+def export_geojson_for_tippecanoe(points=(), lines=(), circles=(), rectangles=(), workers=1, chunk_size=EXPORT_CHUNK_SIZE):
+    """Même résultat que generate_geojson_for_tippecanoe, features construites en parallèle si workers > 1"""
+    points, lines, circles, rectangles = list(points), list(lines), list(circles), list(rectangles)
+    if not use_process_pool(workers, chunk_size, points, lines, circles, rectangles):
+        return generate_geojson_for_tippecanoe(points, lines, circles, rectangles)
+
+    sources = geojson_sources(point_circle_feature, points, lines, circles, rectangles)
+    features = []
+    for chunk_features in map_geojson_chunks(geojson_chunk_features, sources, workers, chunk_size):
+        features.extend(chunk_features)
+    return {
+        "type": "FeatureCollection",
+        "features": features
+    }
+
+
+
+@timed
+def convert_geojson_minimal(geojson_data, name="minimal_tiles", api_url=DEFAULT_API_URL, timeout=DEFAULT_API_TIMEOUT):
+    """Convertit GeoJSON en MBTiles avec paramètres ultra-minimaux (API de conversion)"""
+    try:
+        files = {'file': (f'{name}.geojson', json.dumps(geojson_data), 'application/geo+json')}
+        
+        response = requests.post(
+            f"{api_url}/convert-geojson-minimal",
+            files=files,
+            data={'name': name},
+            timeout=timeout
+        )
+        
+        if response.status_code == 200:
+            return response.content
+        else:
+            error_msg = response.json().get('detail', 'Erreur inconnue') if response.headers.get('content-type') == 'application/json' else response.text
+            raise Exception(f"Erreur API: {error_msg}")
+            
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Erreur de connexion à l'API: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Erreur lors de la conversion: {str(e)}")
+
+
+@timed
+def convert_geojson_local(geojson_data, name="minimal_tiles", tippecanoe="tippecanoe"):
+    """Convertit GeoJSON en MBTiles avec le Tippecanoe local (mêmes paramètres que l'API)"""
+    executable = shutil.which(tippecanoe)
+    if executable is None:
+        raise Exception(f"Tippecanoe introuvable : {tippecanoe}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        geojson_path = os.path.join(temp_dir, f"{name}.geojson")
+        mbtiles_path = os.path.join(temp_dir, f"{name}.mbtiles")
+        with open(geojson_path, "w", encoding="utf-8") as f:
+            json.dump(geojson_data, f)
+
+        result = subprocess.run([executable, "-o", mbtiles_path, geojson_path], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Erreur Tippecanoe: {result.stderr}")
+        with open(mbtiles_path, "rb") as f:
+            return f.read()
@@ -0,0 +1,42 @@
+# Import différé des dépendances lourdes
+# Le module n'est réellement importé qu'au premier accès à l'un de ses attributs
+
+import importlib
+import importlib.util
+import sys
+
+
+class LazyModule:
+    """Mandataire d'un module importé au premier accès à un attribut
+
+    Contrairement à importlib.util.LazyLoader, rien n'est inscrit dans sys.modules avant l'import
+    réel : Streamlit parcourt sys.modules (inspect.getmodule) et déclencherait sinon tous les imports.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "chargé" if self._module is not None else "non chargé"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """Module déjà importé, ou mandataire qui l'importera au premier usage"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def module_available(name):
+    """Vrai si le module est installé, sans l'importer"""
+    return name in sys.modules or importlib.util.find_spec(name) is not None
@@ -0,0 +1,341 @@
+# Construction des couches folium de la carte de visualisation
+# Chaque couche est construite à partir de données simples (listes de dicts) pour pouvoir être
+# mise en cache et reconstruite uniquement quand ses données changent
+
+import math
+
+from lazy_modules import lazy_import
+from perf import timed
+from kml_core import line_coords
+
+folium = lazy_import("folium")
+np = lazy_import("numpy")
+
+COLOR_MAPPING = {
+    'rouge': 'red', 'vert': 'green', 'bleu': 'blue', 'jaune': 'yellow',
+    'orange': 'orange', 'cyan': 'cyan', 'magenta': 'magenta', 'noir': 'black', 'blanc': 'white'
+}
+
+BASE_LAYERS = [
+    ('https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}', 'Esri', 'Satellite'),
+    ('https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}', 'Esri', 'Plan'),
+    ('https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}', 'Google', 'Satellite (Google)'),
+    ('https://mt1.google.com/vt/lyrs=y&x={x}&y={y}&z={z}', 'Google', 'Hybride (Google)'),
+]
+
+# Simplification des géométries pour l'affichage (Douglas-Peucker en Web Mercator)
+EARTH_CIRCUMFERENCE_M = 40075016.686
+MERCATOR_MAX_LAT = 85.05112878
+SIMPLIFY_TOLERANCE_PX = 1.0  # Écart maximal toléré, en pixels au zoom de référence
+DETAIL_ZOOM_BANDS = (8, 11, 14, 17)  # Zooms de référence possibles (au-delà : géométrie complète)
+DISPLAY_DECIMALS = 6  # Précision des coordonnées envoyées à Leaflet (~0.1 m)
+
+# Au-delà de ce nombre de points, les marqueurs sont regroupés (un seul tableau JSON au lieu d'un marqueur par point)
+DEFAULT_CLUSTER_THRESHOLD = 500
+
+# Marqueur créé côté navigateur pour chaque ligne [lat, lon, popup, tooltip, couleur, icône]
+CLUSTER_MARKER_CALLBACK = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: row[5], markerColor: row[4], prefix: 'glyphicon'});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    marker.bindTooltip(row[3]);
+    return marker;
+};
+"""
+
+
+def detail_zoom_band(zoom):
+    """Zoom de référence (arrondi à la bande supérieure) ou None si la géométrie complète est nécessaire"""
+    for band in DETAIL_ZOOM_BANDS:
+        if zoom <= band:
+            return band
+    return None
+
+
+def zoom_tolerance(zoom):
+    """Tolérance de simplification en mètres Mercator pour un zoom donné (None : pas de simplification)"""
+    if zoom is None:
+        return 0.0
+    return SIMPLIFY_TOLERANCE_PX * EARTH_CIRCUMFERENCE_M / (256 * 2 ** zoom)
+
+
+def lonlat_to_mercator(coords):
+    """Coordonnées (lon, lat) en mètres Web Mercator (tableau N x 2)"""
+    lonlat = np.asarray(coords, dtype=float)
+    lat = np.radians(np.clip(lonlat[:, 1], -MERCATOR_MAX_LAT, MERCATOR_MAX_LAT))
+    radius = EARTH_CIRCUMFERENCE_M / (2 * math.pi)
+    return np.column_stack((radius * np.radians(lonlat[:, 0]), radius * np.log(np.tan(math.pi / 4 + lat / 2))))
+
+
+def douglas_peucker(xy, tolerance):
+    """Indices des sommets conservés par l'algorithme de Douglas-Peucker"""
+    n = len(xy)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = xy[end] - xy[start]
+        offsets = xy[start + 1:end] - xy[start]
+        length = math.hypot(segment[0], segment[1])
+        if length == 0:
+            # Anneau fermé : distance au point de départ
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def display_coords(coords, tolerance=0.0, closed=False):
+    """Coordonnées [lat, lon] simplifiées pour l'affichage (la géométrie d'origine n'est pas modifiée)"""
+    if not coords:
+        return []
+    lonlat = np.asarray(coords, dtype=float)
+    if tolerance > 0 and len(lonlat) > 3:
+        kept = douglas_peucker(lonlat_to_mercator(lonlat), tolerance)
+        # Un anneau doit garder au moins un triangle
+        if not closed or len(kept) >= 4:
+            lonlat = lonlat[kept]
+    return np.round(lonlat[:, ::-1], DISPLAY_DECIMALS).tolist()
+
+
+def object_extent(obj):
+    """Emprise d'un objet : (lat_min, lon_min, lat_max, lon_max, somme des lat, somme des lon, nombre de sommets)"""
+    if 'points' in obj:
+        if not obj['points']:
+            return None
+        lonlat = np.asarray(obj['points'], dtype=float)
+        lon_min, lat_min = lonlat.min(axis=0)
+        lon_max, lat_max = lonlat.max(axis=0)
+        lon_sum, lat_sum = lonlat.sum(axis=0)
+        return (float(lat_min), float(lon_min), float(lat_max), float(lon_max), float(lat_sum), float(lon_sum), len(lonlat))
+    if 'lat' in obj and 'lon' in obj:
+        return (obj['lat'], obj['lon'], obj['lat'], obj['lon'], obj['lat'], obj['lon'], 1)
+    return None
+
+
+def merge_extents(extents):
+    """Emprise [[sud, ouest], [nord, est]] et centre (moyenne des sommets) d'un ensemble d'emprises, ou None"""
+    extents = [extent for extent in extents if extent]
+    if not extents:
+        return None
+    lat_min, lon_min, lat_max, lon_max, lat_sum, lon_sum, count = zip(*extents)
+    total = sum(count)
+    bounds = [[min(lat_min), min(lon_min)], [max(lat_max), max(lon_max)]]
+    return bounds, (sum(lat_sum) / total, sum(lon_sum) / total)
+
+
+def bounds_fit_zoom(bounds, width_px=800, height_px=500, max_zoom=18):
+    """Zoom auquel Leaflet affichera l'emprise avec fit_bounds (approximation)"""
+    (south, west), (north, east) = bounds
+    xy = lonlat_to_mercator([(west, south), (east, north)])
+    span_x, span_y = np.abs(xy[1] - xy[0])
+    zooms = [max_zoom]
+    if span_x > 0:
+        zooms.append(math.log2(width_px * EARTH_CIRCUMFERENCE_M / (256 * span_x)))
+    if span_y > 0:
+        zooms.append(math.log2(height_px * EARTH_CIRCUMFERENCE_M / (256 * span_y)))
+    return max(0, int(math.floor(min(zooms))))
+
+
+def create_base_map(center_lat, center_lon, zoom_start=11, prefer_canvas=False):
+    """Carte vide avec les fonds de carte (prefer_canvas : lignes et polygones dessinés sur canvas)"""
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=zoom_start,
+        prefer_canvas=prefer_canvas,
+        max_zoom=18
+    )
+
+    for tiles, attr, name in BASE_LAYERS:
+        folium.TileLayer(
+            tiles=tiles,
+            attr=attr,
+            name=name,
+            overlay=False,
+            control=True
+        ).add_to(m)
+
+    return m
+
+
+def build_clicked_marker(position):
+    """Marqueur temporaire de la position cliquée"""
+    return folium.Marker(
+        position,
+        popup="📍 Position cliquée",
+        tooltip=f"Clic: {position[0]:.6f}, {position[1]:.6f}",
+        icon=folium.Icon(color='red', icon='star')
+    )
+
+
+def build_cluster_layer(name, rows):
+    """Couche de marqueurs regroupés, créés côté navigateur à partir d'un tableau de données"""
+    from folium.plugins import FastMarkerCluster
+
+    layer = folium.FeatureGroup(name=name)
+    FastMarkerCluster(rows, callback=CLUSTER_MARKER_CALLBACK).add_to(layer)
+    return layer
+
+
+@timed
+def build_reference_layer(reference_points, cluster_threshold=DEFAULT_CLUSTER_THRESHOLD):
+    """Couche des points de référence SDVFR"""
+    if len(reference_points) > cluster_threshold:
+        return build_cluster_layer("Référence SDVFR", [
+            [point['lat'], point['lon'], f"📍 REF: {point['name']}", f"Référence: {point['name']}", 'blue', 'star']
+            for point in reference_points
+        ])
+
+    layer = folium.FeatureGroup(name="Référence SDVFR")
+    for point in reference_points:
+        folium.Marker(
+            [point['lat'], point['lon']],
+            popup=f"📍 REF: {point['name']}",
+            tooltip=f"Référence: {point['name']}",
+            icon=folium.Icon(color='blue', icon='star')
+        ).add_to(layer)
+    return layer
+
+
+@timed
+def build_points_layer(points, cluster_threshold=DEFAULT_CLUSTER_THRESHOLD):
+    """Couche des points utilisateur"""
+    if len(points) > cluster_threshold:
+        return build_cluster_layer("Points", [
+            [point['lat'], point['lon'], point['name'],
+             f"{point['name']}: {point['lat']:.4f}, {point['lon']:.4f}", 'blue', 'info-sign']
+            for point in points
+        ])
+
+    layer = folium.FeatureGroup(name="Points")
+    for point in points:
+        folium.Marker(
+            [point['lat'], point['lon']],
+            popup=point['name'],
+            tooltip=f"{point['name']}: {point['lat']:.4f}, {point['lon']:.4f}"
+        ).add_to(layer)
+    return layer
+
+
+@timed
+def build_lines_layer(lines, tolerance=0.0):
+    """Couche des lignes (tracé géodésique densifié pour les lignes marquées 'geodesic')"""
+    layer = folium.FeatureGroup(name="Lignes")
+    for line in lines:
+        coords = display_coords(line_coords(line), tolerance)
+        line_color = COLOR_MAPPING.get(line.get('color', 'rouge'), 'red')
+        folium.PolyLine(
+            coords,
+            color=line_color,
+            weight=line.get('width', 2),
+            popup=line['name'],
+            tooltip=f"Ligne: {line['name']}"
+        ).add_to(layer)
+    return layer
+
+
+@timed
+def build_circles_layer(circles, tolerance=0.0):
+    """Couche des cercles et arcs"""
+    layer = folium.FeatureGroup(name="Cercles/Arcs")
+    for circle in circles:
+        if 'points' in circle:
+            open_arc = circle.get('type') == 'Arc' and not circle.get('close_arc', True)
+            coords = display_coords(circle['points'], tolerance, closed=not open_arc)
+            circle_color = COLOR_MAPPING.get(circle.get('color', 'rouge'), 'red')
+
+            # Utiliser PolyLine pour les arcs ouverts, Polygon pour les arcs fermés et cercles
+            if open_arc:
+                folium.PolyLine(
+                    coords,
+                    color=circle_color,
+                    weight=circle.get('width', 2),
+                    popup=circle['name']
+                ).add_to(layer)
+            else:
+                folium.Polygon(
+                    coords,
+                    color=circle_color,
+                    weight=circle.get('width', 2),
+                    fill=circle.get('fill', False),
+                    popup=circle['name']
+                ).add_to(layer)
+    return layer
+
+
+def rectangle_arrow_coords(rect):
+    """Extrémités [lat, lon] de la flèche d'orientation d'un rectangle"""
+    center_lat = rect['center_lat']
+    center_lon = rect['center_lon']
+    bearing = rect['bearing_deg']
+    length_km = rect.get('length_km', 0.001)
+    width_km = rect.get('width_km', 0.001)
+
+    R = 6371.0
+    bearing_rad = math.radians(bearing)
+    lat_rad = math.radians(center_lat)
+    lon_rad = math.radians(center_lon)
+
+    # Point de départ : milieu du côté avant (orienté vers le cap)
+    front_offset_km = length_km / 2
+    arrow_start_lat_rad = math.asin(math.sin(lat_rad) * math.cos(front_offset_km / R) +
+                                  math.cos(lat_rad) * math.sin(front_offset_km / R) * math.cos(bearing_rad))
+
+    arrow_start_lon_rad = lon_rad + math.atan2(math.sin(bearing_rad) * math.sin(front_offset_km / R) * math.cos(lat_rad),
+                                             math.cos(front_offset_km / R) - math.sin(lat_rad) * math.sin(arrow_start_lat_rad))
+
+    arrow_start_lat = math.degrees(arrow_start_lat_rad)
+    arrow_start_lon = math.degrees(arrow_start_lon_rad)
+
+    # Point de fin de la flèche (longueur = moitié de la largeur)
+    arrow_length_km = width_km / 2
+    arrow_end_lat_rad = math.asin(math.sin(math.radians(arrow_start_lat)) * math.cos(arrow_length_km / R) +
+                                math.cos(math.radians(arrow_start_lat)) * math.sin(arrow_length_km / R) * math.cos(bearing_rad))
+
+    arrow_end_lon_rad = math.radians(arrow_start_lon) + math.atan2(math.sin(bearing_rad) * math.sin(arrow_length_km / R) * math.cos(math.radians(arrow_start_lat)),
+                                                                 math.cos(arrow_length_km / R) - math.sin(math.radians(arrow_start_lat)) * math.sin(arrow_end_lat_rad))
+
+    arrow_end_lat = math.degrees(arrow_end_lat_rad)
+    arrow_end_lon = math.degrees(arrow_end_lon_rad)
+
+    return [[arrow_start_lat, arrow_start_lon], [arrow_end_lat, arrow_end_lon]]
+
+
+@timed
+def build_rectangles_layer(rectangles, tolerance=0.0):
+    """Couche des polygones et rectangles (avec flèche d'orientation optionnelle)"""
+    layer = folium.FeatureGroup(name="Polygones/Rectangles")
+    for rect in rectangles:
+        if 'points' in rect:
+            coords = display_coords(rect['points'], tolerance, closed=True)
+            rect_color = COLOR_MAPPING.get(rect.get('color', 'rouge'), 'red')
+            folium.Polygon(
+                coords,
+                color=rect_color,
+                weight=rect.get('width', 2),
+                fill=rect.get('fill', False),
+                popup=rect['name']
+            ).add_to(layer)
+
+            # Ajouter la flèche d'orientation si demandée
+            if rect.get('add_arrow', False) and 'center_lat' in rect and 'bearing_deg' in rect:
+                folium.PolyLine(
+                    rectangle_arrow_coords(rect),
+                    color=rect_color,
+                    weight=rect.get('width', 2),
+                    popup=f"Orientation {rect['name']}: {rect['bearing_deg']}°"
+                ).add_to(layer)
+    return layer
@@ -0,0 +1,199 @@
+# Index de recherche des points aéronautiques
+# Trie sur les préfixes (codes OACI/IATA et mots du nom) + recherche approchée mot à mot
+# (trigrammes, et distance d'édition pour les mots courts)
+
+import re
+import unicodedata
+from collections import Counter
+from itertools import islice
+
+# Format des clés de la base : "LFSB - BSL Bâle-Mulhouse", "ABB - Abbeville VOR" ou "Stade de France"
+# (code OACI ou indicatif de balise, code IATA optionnel, nom)
+KEY_PATTERN = re.compile(r'^([A-Z0-9]{3,4}) - (?:([A-Z]{3}) )?(.*)$')
+
+# Scores de pertinence (plus haut = meilleur)
+SCORE_EXACT_CODE = 100
+SCORE_PREFIX_CODE = 60
+SCORE_PREFIX_IATA = 50
+SCORE_PREFIX_WORD = 30
+FUZZY_MIN_SIMILARITY = 0.3
+# En dessous de cette longueur, les trigrammes discriminent mal : distance d'édition (1 faute) en plus
+FUZZY_EDIT_MAX_LENGTH = 6
+FUZZY_EDIT_MAX_DISTANCE = 1
+
+
+def normalize_text(text):
+    """Normalise un texte : minuscules, sans accents ni ponctuation ("Bâle-Mulhouse" -> "bale mulhouse")"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', ' ', stripped.lower()).strip()
+
+
+def trigrams(text):
+    """Trigrammes d'un texte normalisé, avec bornes de mots"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    """Distance de Damerau-Levenshtein (transpositions adjacentes), ou max_distance + 1 si elle est dépassée"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class NavSearchIndex:
+    """Index de recherche sur les codes OACI/balises, IATA et noms des points aéronautiques"""
+
+    def __init__(self, database):
+        self.names = list(database.keys())
+        self.types = [database[name].get('type', '') for name in self.names]
+        self.codes = []  # Code OACI ou indicatif de balise
+        self.iata = []
+        self._trie = {}
+        # Vocabulaire des mots indexés (codes et mots des noms) pour la recherche approchée
+        self._words = []
+        self._word_ids = {}
+        self._word_entries = []
+        self._word_trigrams = []
+        self._trigrams = {}  # trigramme -> identifiants de mots
+
+        for entry_id, key in enumerate(self.names):
+            match = KEY_PATTERN.match(key)
+            if match:
+                code, iata, label = match.group(1).lower(), (match.group(2) or '').lower(), match.group(3)
+            else:
+                code, iata, label = '', '', key
+            self.codes.append(code)
+            self.iata.append(iata)
+
+            words = normalize_text(label).split()
+            for token in {code, iata, *words}:
+                if token:
+                    self._insert(token, entry_id)
+                    self._add_word(token, entry_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _insert(self, token, entry_id):
+        """Ajoute un mot dans le trie ; chaque nœud garde les entrées qui passent par lui"""
+        node = self._trie
+        for char in token:
+            node = node.setdefault(char, {'': set()})
+            node[''].add(entry_id)
+
+    def _add_word(self, word, entry_id):
+        """Ajoute un mot au vocabulaire de la recherche approchée"""
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = self._word_ids[word] = len(self._words)
+            self._words.append(word)
+            self._word_entries.append(set())
+            word_trigrams = trigrams(word)
+            self._word_trigrams.append(len(word_trigrams))
+            for trigram in word_trigrams:
+                self._trigrams.setdefault(trigram, []).append(word_id)
+        self._word_entries[word_id].add(entry_id)
+
+    def _prefix_entries(self, prefix):
+        """Entrées dont au moins un mot commence par le préfixe"""
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node['']
+
+    def _prefix_score(self, token, entry_id):
+        """Score d'un mot de requête pour une entrée déjà trouvée par préfixe"""
+        if token == self.codes[entry_id] or token == self.iata[entry_id]:
+            return SCORE_EXACT_CODE
+        if self.codes[entry_id].startswith(token):
+            return SCORE_PREFIX_CODE
+        if self.iata[entry_id].startswith(token):
+            return SCORE_PREFIX_IATA
+        return SCORE_PREFIX_WORD
+
+    def _fuzzy_words(self, token):
+        """{identifiant de mot: similarité} des mots du vocabulaire proches d'un mot de requête"""
+        token_trigrams = trigrams(token)
+        shared = Counter()
+        for trigram in token_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+
+        results = {}
+        for word_id, count in shared.items():
+            similarity = count / (len(token_trigrams) + self._word_trigrams[word_id] - count)
+            if similarity < FUZZY_MIN_SIMILARITY and len(token) <= FUZZY_EDIT_MAX_LENGTH:
+                word = self._words[word_id]
+                distance = edit_distance(token, word, FUZZY_EDIT_MAX_DISTANCE)
+                if distance <= FUZZY_EDIT_MAX_DISTANCE:
+                    similarity = 1 - distance / max(len(token), len(word))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                results[word_id] = similarity
+        return results
+
+    def _fuzzy(self, query, allowed):
+        """Recherche approchée mot à mot (fautes de frappe) : chaque mot de la requête doit être proche
+        d'un mot de l'entrée (préfixe exact ou mot similaire) ; score = similarité moyenne"""
+        scores = None
+        tokens = query.split()
+        for token in tokens:
+            token_scores = dict.fromkeys(self._prefix_entries(token), 1.0)
+            for word_id, similarity in self._fuzzy_words(token).items():
+                for entry_id in self._word_entries[word_id]:
+                    if similarity > token_scores.get(entry_id, 0.0):
+                        token_scores[entry_id] = similarity
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {i: s + token_scores[i] for i, s in scores.items() if i in token_scores}
+
+        return {
+            entry_id: total / len(tokens) * SCORE_PREFIX_WORD
+            for entry_id, total in scores.items()
+            if allowed is None or entry_id in allowed
+        }
+
+    def search(self, query, limit=20, type_filter=None):
+        """Retourne les noms des meilleures correspondances (au plus `limit`)"""
+        allowed = None
+        if type_filter:
+            allowed = {i for i, t in enumerate(self.types) if t == type_filter}
+
+        normalized = normalize_text(query or '')
+        if not normalized:
+            candidates = range(len(self.names)) if allowed is None else sorted(allowed)
+            return [self.names[i] for i in islice(candidates, limit)]
+
+        # Tous les mots de la requête doivent préfixer un mot de l'entrée
+        tokens = normalized.split()
+        scores = None
+        for token in tokens:
+            entries = self._prefix_entries(token)
+            if scores is None:
+                scores = {i: self._prefix_score(token, i) for i in entries}
+            else:
+                scores = {i: s + self._prefix_score(token, i) for i, s in scores.items() if i in entries}
+        if allowed is not None:
+            scores = {i: s for i, s in scores.items() if i in allowed}
+
+        # Compléter par la recherche approchée si les préfixes ne suffisent pas
+        if len(scores) < limit:
+            for entry_id, score in self._fuzzy(normalized, allowed).items():
+                scores.setdefault(entry_id, score)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.names[i] for i, _ in ranked[:limit]]
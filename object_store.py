@@ -0,0 +1,320 @@
+# Collections d'objets KML de la session (points, lignes, cercles, polygones)
+# Remplacent les listes : ordre d'insertion conservé, index par nom, suppression en O(1)
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from lazy_modules import lazy_import
+from map_layers import object_extent
+
+np = lazy_import("numpy")
+
+
+class ObjectCollection:
+    """Liste ordonnée d'objets (dicts) avec un index nom -> objets"""
+
+    def __init__(self, objects=()):
+        self._items = {}  # id(objet) -> objet, dans l'ordre d'insertion
+        self._by_name = {}  # nom -> {id(objet): objet}
+        self.extend(objects)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __iter__(self):
+        # Itère sur une copie : un objet peut être supprimé pendant le parcours, comme avec une liste
+        return iter(list(self._items.values()))
+
+    def __getitem__(self, index):
+        return list(self._items.values())[index]
+
+    def __repr__(self):
+        return f"ObjectCollection({list(self._items.values())!r})"
+
+    def append(self, obj):
+        """Ajoute un objet en fin de collection"""
+        self._items[id(obj)] = obj
+        self._by_name.setdefault(obj.get('name'), {})[id(obj)] = obj
+
+    def extend(self, objects):
+        """Ajoute plusieurs objets"""
+        for obj in objects:
+            self.append(obj)
+
+    def remove(self, obj):
+        """Supprime un objet (ValueError s'il est absent, comme list.remove)"""
+        if self._items.pop(id(obj), None) is None:
+            raise ValueError("objet absent de la collection")
+        same_name = self._by_name[obj.get('name')]
+        del same_name[id(obj)]
+        if not same_name:
+            del self._by_name[obj.get('name')]
+
+    def remove_name(self, name):
+        """Supprime tous les objets portant ce nom ; retourne les objets supprimés"""
+        removed = list(self._by_name.pop(name, {}).values())
+        for obj in removed:
+            del self._items[id(obj)]
+        return removed
+
+    def clear(self):
+        """Vide la collection"""
+        self._items.clear()
+        self._by_name.clear()
+
+    def has_name(self, name):
+        """Vrai si au moins un objet porte ce nom"""
+        return name in self._by_name
+
+    def get(self, name, default=None):
+        """Premier objet portant ce nom"""
+        same_name = self._by_name.get(name)
+        return next(iter(same_name.values())) if same_name else default
+
+    def names(self):
+        """Noms des objets, dans l'ordre de la collection"""
+        return [obj.get('name') for obj in self._items.values()]
+
+
+# Stockage persistant partagé entre sessions (KML_OBJECT_STORE=chemin.db) : chaque objet est
+# sérialisé en JSON dans SQLite, son emprise indexée dans un R*Tree. Rien n'est gardé en mémoire
+# par la session hormis la référence à la base : les objets sont relus à chaque parcours.
+# Chaque collection a un numéro de révision en base, incrémenté à chaque écriture : les caches des
+# sessions qui partagent un espace de travail voient ainsi les modifications des autres.
+
+OBJECT_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    workspace TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    data TEXT NOT NULL,
+    lat_sum REAL NOT NULL DEFAULT 0,
+    lon_sum REAL NOT NULL DEFAULT 0,
+    vertices INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS objects_collection ON objects (workspace, kind, id);
+CREATE INDEX IF NOT EXISTS objects_name ON objects (workspace, kind, name);
+CREATE VIRTUAL TABLE IF NOT EXISTS objects_bounds USING rtree (id, lat_min, lat_max, lon_min, lon_max);
+CREATE TABLE IF NOT EXISTS revisions (
+    workspace TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    PRIMARY KEY (workspace, kind)
+);
+"""
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def json_default(value):
+    """Sérialisation JSON des scalaires et tableaux NumPy présents dans les objets"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def open_object_database(path):
+    """Base d'objets partagée par toutes les sessions du processus (une connexion par fichier)"""
+    path = os.path.abspath(path)
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = ObjectDatabase(path)
+        return _databases[path]
+
+
+class StoredObject(dict):
+    """Objet relu depuis la base ; store_id identifie sa ligne pour la suppression"""
+
+    __slots__ = ('store_id',)
+
+
+class ObjectDatabase:
+    """Connexion SQLite partagée (accès sérialisés par un verrou, journal WAL)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(OBJECT_STORE_SCHEMA)
+
+    def query(self, sql, params=()):
+        """Lignes résultat d'une requête de lecture"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Transaction d'écriture : tout est validé ou tout est annulé"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def collection(self, workspace, kind):
+        """Collection d'un type d'objet dans un espace de travail"""
+        return SQLiteObjectCollection(self, workspace, kind)
+
+
+class SQLiteObjectCollection:
+    """Même interface qu'ObjectCollection, écrite directement dans la base (write-through)"""
+
+    def __init__(self, database, workspace, kind):
+        self.database = database
+        self.workspace = workspace
+        self.kind = kind
+        self._scope = (workspace, kind)
+
+    def _select(self, columns, condition="", params=(), suffix=""):
+        sql = f"SELECT {columns} FROM objects WHERE workspace = ? AND kind = ?{condition} {suffix}"
+        return self.database.query(sql, self._scope + tuple(params))
+
+    @staticmethod
+    def _decode(store_id, data):
+        obj = StoredObject(json.loads(data))
+        if 'points' in obj:
+            obj['points'] = [tuple(point) for point in obj['points']]
+        obj.store_id = store_id
+        return obj
+
+    def __len__(self):
+        return self._select("COUNT(*)")[0][0]
+
+    def __bool__(self):
+        return bool(self._select("1", suffix="LIMIT 1"))
+
+    def __iter__(self):
+        rows = self._select("id, data", suffix="ORDER BY id")
+        return (self._decode(store_id, data) for store_id, data in rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.start or 0, index.stop, index.step
+            if start >= 0 and stop is not None and stop >= 0 and step in (None, 1):
+                # Tranche lue directement dans la base (premières lignes d'un tableau)
+                rows = self._select("id, data", suffix="ORDER BY id LIMIT ? OFFSET ?",
+                                    params=(max(0, stop - start), start))
+                return [self._decode(*row) for row in rows]
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        rows = self._select("id, data", suffix="ORDER BY id LIMIT 1 OFFSET ?", params=(index,)) if index >= 0 else []
+        if not rows:
+            raise IndexError("index hors de la collection")
+        return self._decode(*rows[0])
+
+    def __repr__(self):
+        return f"SQLiteObjectCollection({self.database.path!r}, {self.workspace!r}, {self.kind!r})"
+
+    def revision(self):
+        """Révision de la collection en base (0 si elle n'a jamais été modifiée)"""
+        rows = self.database.query("SELECT revision FROM revisions WHERE workspace = ? AND kind = ?", self._scope)
+        return rows[0][0] if rows else 0
+
+    def _bump_revision(self, conn):
+        conn.execute(
+            "INSERT INTO revisions (workspace, kind, revision) VALUES (?, ?, 1) "
+            "ON CONFLICT (workspace, kind) DO UPDATE SET revision = revision + 1",
+            self._scope
+        )
+
+    def _insert(self, conn, obj):
+        extent = object_extent(obj)
+        cursor = conn.execute(
+            "INSERT INTO objects (workspace, kind, name, data, lat_sum, lon_sum, vertices) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._scope + (obj.get('name'), json.dumps(obj, ensure_ascii=False, default=json_default))
+            + ((extent[4], extent[5], extent[6]) if extent else (0.0, 0.0, 0))
+        )
+        if extent:
+            lat_min, lon_min, lat_max, lon_max = extent[:4]
+            conn.execute("INSERT INTO objects_bounds VALUES (?, ?, ?, ?, ?)",
+                         (cursor.lastrowid, lat_min, lat_max, lon_min, lon_max))
+
+    def append(self, obj):
+        """Ajoute un objet en fin de collection"""
+        self.extend([obj])
+
+    def extend(self, objects):
+        """Ajoute plusieurs objets en une seule transaction (import en masse)"""
+        with self.database.transaction() as conn:
+            for obj in objects:
+                self._insert(conn, obj)
+            self._bump_revision(conn)
+
+    def _delete(self, conn, condition, params):
+        ids = [row[0] for row in conn.execute(
+            f"SELECT id FROM objects WHERE workspace = ? AND kind = ?{condition}", self._scope + params
+        )]
+        conn.executemany("DELETE FROM objects WHERE id = ?", [(i,) for i in ids])
+        conn.executemany("DELETE FROM objects_bounds WHERE id = ?", [(i,) for i in ids])
+        if ids:
+            self._bump_revision(conn)
+        return ids
+
+    def remove(self, obj):
+        """Supprime un objet relu depuis la collection (ValueError s'il est absent, comme list.remove)"""
+        store_id = getattr(obj, 'store_id', None)
+        with self.database.transaction() as conn:
+            if store_id is None or not self._delete(conn, " AND id = ?", (store_id,)):
+                raise ValueError("objet absent de la collection")
+
+    def remove_name(self, name):
+        """Supprime tous les objets portant ce nom ; retourne les objets supprimés"""
+        removed = [self._decode(*row) for row in self._select("id, data", " AND name IS ?", (name,), "ORDER BY id")]
+        with self.database.transaction() as conn:
+            self._delete(conn, " AND name IS ?", (name,))
+        return removed
+
+    def clear(self):
+        """Vide la collection"""
+        with self.database.transaction() as conn:
+            self._delete(conn, "", ())
+
+    def has_name(self, name):
+        """Vrai si au moins un objet porte ce nom"""
+        return bool(self._select("1", " AND name IS ?", (name,), "LIMIT 1"))
+
+    def get(self, name, default=None):
+        """Premier objet portant ce nom"""
+        rows = self._select("id, data", " AND name IS ?", (name,), "ORDER BY id LIMIT 1")
+        return self._decode(*rows[0]) if rows else default
+
+    def names(self):
+        """Noms des objets, dans l'ordre de la collection"""
+        return [row[0] for row in self._select("name", suffix="ORDER BY id")]
+
+    def query_bbox(self, south, west, north, east, limit=None):
+        """Objets dont l'emprise intersecte le rectangle (chargement de la vue courante de la carte),
+        au plus `limit` (les premiers ajoutés)"""
+        rows = self.database.query(
+            "SELECT o.id, o.data FROM objects_bounds b JOIN objects o ON o.id = b.id "
+            "WHERE o.workspace = ? AND o.kind = ? "
+            "AND b.lat_max >= ? AND b.lat_min <= ? AND b.lon_max >= ? AND b.lon_min <= ? ORDER BY o.id LIMIT ?",
+            self._scope + (south, north, west, east, -1 if limit is None else limit)
+        )
+        return [self._decode(*row) for row in rows]
+
+    def extent(self):
+        """Emprise agrégée de la collection (même forme qu'object_extent), calculée par la base, ou None"""
+        row = self.database.query(
+            "SELECT MIN(b.lat_min), MIN(b.lon_min), MAX(b.lat_max), MAX(b.lon_max), "
+            "SUM(o.lat_sum), SUM(o.lon_sum), SUM(o.vertices) "
+            "FROM objects_bounds b JOIN objects o ON o.id = b.id WHERE o.workspace = ? AND o.kind = ?",
+            self._scope
+        )[0]
+        return row if row[6] else None
@@ -0,0 +1,79 @@
+# Chronométrage des étapes coûteuses d'une exécution de l'application (parsing, géodésie, exports, carte, API)
+# Désactivé par défaut (KML_PERF=1 pour l'activer) : timed() renvoie alors la fonction d'origine
+# et timer() un contexte vide, sans coût à l'exécution
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+PERF_ENABLED = os.environ.get("KML_PERF", "0") == "1"
+
+# Nombre d'exécutions conservées par session pour le panneau "Performance"
+PERF_HISTORY_SIZE = int(os.environ.get("KML_PERF_HISTORY", "20"))
+
+# Mesures de l'exécution en cours, propres à chaque thread (Streamlit exécute chaque session
+# dans son propre thread) ; rien n'est collecté hors d'une collecte démarrée (processus d'export, CLI)
+_local = threading.local()
+_NULL_TIMER = nullcontext()
+
+
+def start_collection():
+    """Démarre la collecte des mesures du thread courant"""
+    _local.stages = {}
+    _local.started = time.perf_counter()
+
+
+def finish_collection(**info):
+    """Termine la collecte ; retourne {time, total, stages: {étape: [durée s, appels]}, **info} ou None"""
+    stages = getattr(_local, 'stages', None)
+    if stages is None:
+        return None
+    _local.stages = None
+    return {"time": time.time(), "total": time.perf_counter() - _local.started, "stages": stages, **info}
+
+
+def record(stage, elapsed):
+    """Ajoute une durée (s) à l'étape `stage` de la collecte en cours"""
+    stages = getattr(_local, 'stages', None)
+    if stages is None:
+        return
+    entry = stages.get(stage)
+    if entry is None:
+        stages[stage] = [elapsed, 1]
+    else:
+        entry[0] += elapsed
+        entry[1] += 1
+
+
+@contextmanager
+def _timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timer(stage):
+    """Contexte chronométrant un bloc sous le nom `stage`"""
+    if not PERF_ENABLED:
+        return _NULL_TIMER
+    return _timer(stage)
+
+
+def timed(func):
+    """Décorateur chronométrant chaque appel de la fonction (étape : nom de la fonction)"""
+    if not PERF_ENABLED:
+        return func
+    stage = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(stage, time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,117 @@
+# Import en masse de points depuis un tableau (CSV/Excel)
+# Conversion et validation vectorisées : pas de boucle Python par ligne sur les coordonnées
+
+from lazy_modules import lazy_import
+from perf import timed
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+COORD_FORMATS = ["Degrés décimaux", "Degrés Minutes", "Degrés Minutes Secondes", "Calamar"]
+
+# Angle sexagésimal : "44°31.2'N", "N 44 31 12.5", "-1:07:12", "1° 7' 12\" O"...
+NUMBER = r'\d+(?:[.,]\d+)?'
+ANGLE_PATTERN = (
+    r'^\s*(?P<prefix>[NSEWO+-])?\s*'
+    rf'(?P<deg>{NUMBER})\s*(?:[°º:dD]\s*|\s+|(?=$))'
+    rf'(?:(?P<min>{NUMBER})\s*(?:[\'′’:mM]\s*|\s+|(?=$)))?'
+    rf'(?:(?P<sec>{NUMBER})\s*(?:"|″|\'\'|[sS])?\s*)?'
+    r'(?P<suffix>[NSEWO])?\s*$'
+)
+
+# Valeur Calamar avec unité optionnelle : "120 mL", "-45.5", "30mG"
+CALAMAR_PATTERN = rf'^\s*(?P<value>-?{NUMBER})\s*(?P<unit>mL|mC|mD|mG)?\s*$'
+
+NEGATIVE_HEMISPHERES = ('S', 'W', 'O', '-')
+
+
+def to_number(series):
+    """Conversion numérique d'une colonne (virgule décimale acceptée), NaN si invalide"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return pd.to_numeric(series.astype(str).str.strip().str.replace(',', '.', regex=False), errors='coerce')
+
+
+def parse_angles(series, hemispheres):
+    """Angles DD/DM/DMS en degrés décimaux ; NaN si le format ou l'hémisphère est invalide"""
+    numeric = to_number(series)
+    parts = series.astype(str).str.upper().str.extract(ANGLE_PATTERN)
+
+    degrees = to_number(parts['deg'])
+    minutes = to_number(parts['min']).fillna(0.0)
+    seconds = to_number(parts['sec']).fillna(0.0)
+    value = degrees + minutes / 60 + seconds / 3600
+    value[(minutes >= 60) | (seconds >= 60)] = np.nan
+
+    # Un seul indicateur d'hémisphère (avant ou après), cohérent avec l'axe
+    both = parts['prefix'].notna() & parts['suffix'].notna() & ~parts['prefix'].isin(['+', '-'])
+    hemisphere = parts['suffix'].fillna(parts['prefix'])
+    allowed = hemisphere.isna() | hemisphere.isin(list(hemispheres) + ['+', '-'])
+    value[both | ~allowed] = np.nan
+    value[hemisphere.isin(NEGATIVE_HEMISPHERES)] *= -1
+
+    # Les nombres décimaux simples (y compris négatifs) restent acceptés
+    return numeric.where(numeric.notna(), value)
+
+
+def parse_calamar(series, positive_unit, negative_unit):
+    """Valeurs Calamar signées selon leur unité (unité positive par défaut)"""
+    parts = series.astype(str).str.extract(CALAMAR_PATTERN)
+    value = to_number(parts['value'])
+    value[parts['unit'] == negative_unit] *= -1
+    value[parts['unit'].notna() & ~parts['unit'].isin([positive_unit, negative_unit])] = np.nan
+    return value
+
+
+@timed
+def parse_points_frame(df, col_name, col_lat, col_lon, col_desc=None, coord_format=COORD_FORMATS[0],
+                       existing_names=(), calamar_converter=None):
+    """Convertit un tableau en points ; retourne (points, lignes rejetées avec leur motif)
+
+    Pour le format Calamar, col_lat est l'axe Y (mL/mC), col_lon l'axe X (mD/mG) et
+    calamar_converter(y, x, "mL", "mD") convertit des tableaux de valeurs signées en (lat, lon).
+    """
+    names = df[col_name].astype(str).str.strip()
+    names[df[col_name].isna()] = ''
+
+    if coord_format == "Calamar":
+        lat, lon = calamar_converter(
+            parse_calamar(df[col_lat], "mL", "mC").to_numpy(),
+            parse_calamar(df[col_lon], "mD", "mG").to_numpy(),
+            "mL", "mD"
+        )
+        lat, lon = pd.Series(lat, index=df.index), pd.Series(lon, index=df.index)
+    elif coord_format == "Degrés décimaux":
+        lat, lon = to_number(df[col_lat]), to_number(df[col_lon])
+    else:
+        lat, lon = parse_angles(df[col_lat], 'NS'), parse_angles(df[col_lon], 'EWO')
+
+    if col_desc:
+        descriptions = df[col_desc].astype(str).str.strip().where(df[col_desc].notna(), '')
+    else:
+        descriptions = pd.Series('', index=df.index)
+
+    # Motif de rejet par ligne (le premier qui s'applique)
+    reasons = pd.Series('', index=df.index)
+    checks = [
+        (names == '', "Nom manquant"),
+        (lat.isna() | lon.isna(), "Coordonnées invalides"),
+        ((lat.abs() > 90) | (lon.abs() > 180), "Coordonnées hors limites"),
+        (names.isin(set(existing_names)), "Point déjà existant"),
+    ]
+    for mask, reason in checks:
+        reasons[mask & (reasons == '')] = reason
+    # Doublons du fichier : seule la première ligne valide d'un nom est importée
+    duplicated = names.where(reasons == '').duplicated(keep='first')
+    reasons[duplicated & (reasons == '')] = "Nom en double dans le fichier"
+
+    accepted = reasons == ''
+    points = [
+        {"type": "Point", "name": name, "lat": float(la), "lon": float(lo), "description": desc}
+        for name, la, lo, desc in zip(names[accepted], lat[accepted], lon[accepted], descriptions[accepted])
+    ]
+
+    rejected = df.loc[~accepted].copy()
+    rejected.insert(0, "Motif", reasons[~accepted])
+    rejected.insert(0, "Ligne", rejected.index + 1)
+    return points, rejected.reset_index(drop=True)
@@ -0,0 +1,77 @@
+# Profilage d'une exécution complète de l'application, à la demande (?profile=1 ou KML_PROFILE=1)
+# Profileur déterministe cProfile (fichier .pstats) ou, si pyinstrument est installé, profileur
+# par échantillonnage (?profile=sampling, fichier speedscope JSON, ouvrable sur https://www.speedscope.app)
+
+import cProfile
+import marshal
+import os
+import time
+
+from lazy_modules import module_available
+
+PROFILE_ENV = os.environ.get("KML_PROFILE", "0") == "1"
+
+# Dossier où chaque profil est aussi enregistré (récupération côté serveur), facultatif
+PROFILE_DIR = os.environ.get("KML_PROFILE_DIR")
+
+SAMPLING_AVAILABLE = module_available("pyinstrument")
+
+PROFILE_MODES = ("1", "pstats", "sampling")
+
+
+def requested_mode(query_value):
+    """Mode demandé ('pstats' ou 'sampling') d'après le paramètre d'URL et KML_PROFILE, ou None"""
+    if query_value in PROFILE_MODES:
+        return "sampling" if query_value == "sampling" and SAMPLING_AVAILABLE else "pstats"
+    return "pstats" if PROFILE_ENV else None
+
+
+class RunProfiler:
+    """Profileur démarré en début d'exécution et arrêté en fin d'exécution"""
+
+    def __init__(self, mode="pstats"):
+        self.mode = mode
+        self.profiler = None
+        self.started = None
+        self.running = False
+
+    def start(self):
+        self.started = time.time()
+        self.running = True
+        if self.mode == "sampling":
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is None or not self.running:
+            return
+        self.running = False
+        if self.mode == "sampling":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def result(self, **tags):
+        """Profil exportable : {name, data (bytes), mime, tags} ; les tags sont repris dans le nom du fichier"""
+        self.stop()
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started))
+        label = "_".join(f"{key}{value}" for key, value in tags.items())
+        name = f"profil_{stamp}_{label}" if label else f"profil_{stamp}"
+        if self.mode == "sampling":
+            from pyinstrument.renderers import SpeedscopeRenderer
+            data = self.profiler.output(SpeedscopeRenderer()).encode("utf-8")
+            profile = {"name": f"{name}.speedscope.json", "data": data, "mime": "application/json", "tags": tags}
+        else:
+            self.profiler.create_stats()
+            data = marshal.dumps(self.profiler.stats)
+            profile = {"name": f"{name}.pstats", "data": data, "mime": "application/octet-stream", "tags": tags}
+
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, profile["name"]), "wb") as f:
+                f.write(data)
+        return profile
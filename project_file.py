@@ -0,0 +1,83 @@
+# Fichier projet : sauvegarde et restauration complètes de la session
+# Archive zip contenant un manifeste JSON (métadonnées de chaque objet) et, par type d'objet,
+# les coordonnées de tous les objets concaténées dans un tableau NumPy avec leurs offsets
+
+import json
+import zipfile
+from io import BytesIO
+
+from lazy_modules import lazy_import
+from object_store import json_default
+
+np = lazy_import("numpy")
+
+PROJECT_FORMAT = "kml-generator-project"
+PROJECT_VERSION = 1
+PROJECT_EXTENSION = "kmlproj"
+MANIFEST_NAME = "manifest.json"
+
+
+def save_project(collections):
+    """Archive projet (bytes) à partir d'un dict type -> objets"""
+    manifest = {"format": PROJECT_FORMAT, "version": PROJECT_VERSION, "objects": {}}
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for kind, objects in collections.items():
+            entries, coords, offsets = [], [], [0]
+            for obj in objects:
+                entry = {key: value for key, value in obj.items() if key != 'points'}
+                if 'points' in obj:
+                    entry['_points'] = True
+                    coords.extend(obj['points'])
+                offsets.append(len(coords))
+                entries.append(entry)
+            manifest["objects"][kind] = entries
+
+            for name, array in ((f"{kind}_coords.npy", np.asarray(coords, dtype=np.float64).reshape(-1, 2)),
+                                (f"{kind}_offsets.npy", np.asarray(offsets, dtype=np.int64))):
+                array_buffer = BytesIO()
+                np.save(array_buffer, array, allow_pickle=False)
+                archive.writestr(name, array_buffer.getvalue())
+
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, default=json_default))
+    return buffer.getvalue()
+
+
+def load_project(data):
+    """Dict type -> liste d'objets à partir d'une archive projet ; ValueError si le fichier est invalide"""
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Archive projet invalide : {e}")
+
+    with archive:
+        try:
+            manifest = json.loads(archive.read(MANIFEST_NAME))
+        except KeyError:
+            raise ValueError("Manifeste absent du projet")
+        if manifest.get("format") != PROJECT_FORMAT:
+            raise ValueError("Ce fichier n'est pas un projet KML Generator")
+        if manifest.get("version", 0) > PROJECT_VERSION:
+            raise ValueError(f"Version de projet non prise en charge : {manifest.get('version')}")
+
+        collections = {}
+        for kind, entries in manifest["objects"].items():
+            try:
+                coords = np.load(BytesIO(archive.read(f"{kind}_coords.npy")), allow_pickle=False)
+                offsets = np.load(BytesIO(archive.read(f"{kind}_offsets.npy")), allow_pickle=False)
+            except KeyError:
+                raise ValueError(f"Coordonnées absentes pour '{kind}'")
+            if len(offsets) != len(entries) + 1 or offsets[-1] != len(coords):
+                raise ValueError(f"Coordonnées incohérentes pour '{kind}'")
+
+            # Conversion unique en tuples Python (lon, lat), puis découpage par objet
+            all_points = list(zip(coords[:, 0].tolist(), coords[:, 1].tolist()))
+            bounds = offsets.tolist()
+            objects = []
+            for i, entry in enumerate(entries):
+                obj = dict(entry)
+                if obj.pop('_points', False):
+                    obj['points'] = all_points[bounds[i]:bounds[i + 1]]
+                objects.append(obj)
+            collections[kind] = objects
+    return collections
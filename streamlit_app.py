@@ -1,11 +1,5 @@
 import streamlit as st
-import simplekml
 import math
-import folium
-from streamlit_folium import st_folium
-import pandas as pd
-import numpy as np
-import openpyxl
 from io import BytesIO
 import base64
 import xml.etree.ElementTree as ET
@@ -13,15 +7,55 @@ import re
 import tempfile
 import os
 import json
+import logging
 import sqlite3
 import struct
 import zlib
-import requests
 import uuid
+from collections import deque
+from datetime import datetime
+from lazy_modules import lazy_import, module_available
+from nav_search import NavSearchIndex
+from perf import PERF_ENABLED, PERF_HISTORY_SIZE, start_collection, finish_collection, timed, timer
+from profiling import RunProfiler, requested_mode
+from object_store import ObjectCollection, SQLiteObjectCollection, open_object_database
+from point_import import COORD_FORMATS, parse_points_frame
+from project_file import PROJECT_EXTENSION, save_project, load_project
+from kml_core import (
+    calculate_distance, calculate_bearing, calculate_circle_points, calculate_rectangle_points,
+    create_point_from_bearing_distance, line_coords, route_legs, routes_summary, export_kml_text, export_geojson_text, export_groups_by_color,
+    export_geojson_for_tippecanoe, convert_geojson_minimal
+)
+from tile_server import TileServer, mbtiles_mosaic, read_mbtiles_metadata
+from map_layers import (
+    DEFAULT_CLUSTER_THRESHOLD, object_extent, merge_extents, bounds_fit_zoom, detail_zoom_band, zoom_tolerance,
+    create_base_map, build_clicked_marker, build_reference_layer, build_points_layer,
+    build_lines_layer, build_circles_layer, build_rectangles_layer
+)
+
+# Dépendances lourdes chargées au premier usage (démarrage à froid plus rapide)
+folium = lazy_import("folium")
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
 
 # Config de la page
 st.set_page_config(page_title="KML Generator", page_icon="🌍")
 
+# Chronométrage de l'exécution en cours (KML_PERF=1), affiché dans le panneau "Performance" en bas de page
+if PERF_ENABLED:
+    start_collection()
+
+# Profilage de l'exécution (?profile=1, ?profile=sampling ou KML_PROFILE=1), téléchargeable en bas de page
+if 'active_profiler' in st.session_state:
+    # Exécution précédente interrompue (st.rerun) avant l'arrêt de son profileur
+    st.session_state.pop('active_profiler').stop()
+profile_mode = requested_mode(st.query_params.get("profile"))
+if profile_mode:
+    st.session_state.active_profiler = RunProfiler(profile_mode)
+    st.session_state.active_profiler.start()
+
 # CSS pour masquer les boutons +/- des number_input et améliorer la sélection
 st.markdown("""
 <style>
@@ -81,29 +115,86 @@ API_BASE_URL = "https://kml-api-docker.onrender.com"
 API_TIMEOUT = 300
 MAX_KML_SIZE_MB = 50
 
+# Processus utilisés pour les exports des grandes sessions (1 : export séquentiel, par défaut car le
+# serveur Streamlit est partagé par toutes les sessions ; à augmenter pour un usage local)
+EXPORT_WORKERS = int(os.environ.get("KML_EXPORT_WORKERS", "1"))
+
+# Nombre maximal de candidats proposés par la recherche de points aéronautiques
+NAV_SEARCH_LIMIT = 20
+
+# Modifications gardées par type pour la mise à jour ligne à ligne des tableaux d'aperçu
+FRAME_CHANGE_LOG_SIZE = 64
+
+# Budget de pixels de l'overlay TIFF (au-delà, lecture décimée via les overviews)
+TIFF_OVERLAY_MAX_PIXELS = 4_000_000
+TIFF_OVERVIEW_MIN_SIZE = 256
+
+# Serveur de tuiles local pour les cartes personnalisées, à la place de l'overlay PNG (KML_TILE_SERVER=1)
+# Désactivé par défaut : les tuiles sont demandées par le navigateur, le serveur doit donc lui être
+# accessible (app locale, ou port exposé derrière un proxy avec KML_TILE_SERVER_URL)
+TILE_SERVER_ENABLED = os.environ.get("KML_TILE_SERVER", "0") == "1"
+TILE_SERVER_HOST = os.environ.get("KML_TILE_SERVER_HOST", "127.0.0.1")
+TILE_SERVER_PORT = int(os.environ.get("KML_TILE_SERVER_PORT", "0"))
+TILE_SERVER_URL = os.environ.get("KML_TILE_SERVER_URL")  # URL publique si l'app est derrière un proxy
+TILE_CACHE_MAX_MB = int(os.environ.get("KML_TILE_CACHE_MAX_MB", "512"))  # Cache disque des tuiles TIFF
+
 def get_api_url():
     return API_BASE_URL
 
 def is_api_configured():
     return not API_BASE_URL.startswith("https://your-api-url")
 
-try:
-    import rasterio
-    from rasterio.warp import transform_bounds
-    from PIL import Image
-    RASTERIO_AVAILABLE = True
-except ImportError:
-    RASTERIO_AVAILABLE = False
+# rasterio et Pillow ne sont chargés qu'au premier traitement d'un fichier TIFF
+PIL_AVAILABLE = module_available("PIL")
+RASTERIO_AVAILABLE = module_available("rasterio") and PIL_AVAILABLE
+if RASTERIO_AVAILABLE:
+    rasterio = lazy_import("rasterio")
+
+# Collections d'objets utilisateur (clé de session : <type>_data)
+OBJECT_KINDS = ('points', 'lines', 'circles', 'rectangles')
+
+# Stockage des objets : en mémoire dans chaque session (défaut) ou base SQLite partagée par toutes
+# les sessions et conservée au redémarrage ; l'espace de travail est repris du paramètre d'URL ?workspace=
+OBJECT_STORE_PATH = os.environ.get("KML_OBJECT_STORE")
+# Avec la base, la session ne garde qu'une partie des objets : ceux de la vue de la carte (par type)
+# et les premières lignes des tableaux d'aperçu
+STORE_MAP_MAX_OBJECTS = int(os.environ.get("KML_STORE_MAP_MAX_OBJECTS", "5000"))
+STORE_TABLE_MAX_ROWS = int(os.environ.get("KML_STORE_TABLE_MAX_ROWS", "1000"))
+
+# Couches de la carte dont la construction est mise en cache (clé de révision)
+MAP_LAYER_KINDS = OBJECT_KINDS + ('reference', 'custom_tiles')
+
+# Vue initiale de la carte : emprise des objets (zoom plafonné), ou centre par défaut sans objet
+MAP_DEFAULT_CENTER = (44.52, -1.12)
+MAP_ZOOM_START = 11
+MAP_FIT_MAX_ZOOM = 15
+
+# Niveau de détail des géométries affichées : zoom de référence de la simplification
+# ("Automatique" : zoom d'ajustement à l'emprise + marge pour zoomer sans artefacts visibles)
+MAP_DETAIL_ZOOM_MARGIN = 3
+MAP_DETAIL_LEVELS = {"Automatique": None, "Élevé": 17, "Moyen": 14, "Faible": 11, "Complet": 99}
+
+def new_object_collection(kind):
+    """Collection vide (mémoire) ou collection de l'espace de travail dans la base d'objets"""
+    if OBJECT_STORE_PATH:
+        return open_object_database(OBJECT_STORE_PATH).collection(st.session_state.workspace, kind)
+    return ObjectCollection()
 
 # Initialisation des données de session
+if OBJECT_STORE_PATH and 'workspace' not in st.session_state:
+    workspace = st.query_params.get("workspace", "")
+    if not re.fullmatch(r'[\w-]{1,64}', workspace):
+        workspace = uuid.uuid4().hex
+    st.query_params["workspace"] = workspace
+    st.session_state.workspace = workspace
 if 'points_data' not in st.session_state:
-    st.session_state.points_data = []
+    st.session_state.points_data = new_object_collection('points')
 if 'lines_data' not in st.session_state:
-    st.session_state.lines_data = []
+    st.session_state.lines_data = new_object_collection('lines')
 if 'circles_data' not in st.session_state:
-    st.session_state.circles_data = []
+    st.session_state.circles_data = new_object_collection('circles')
 if 'rectangles_data' not in st.session_state:
-    st.session_state.rectangles_data = []
+    st.session_state.rectangles_data = new_object_collection('rectangles')
 if 'current_line_points' not in st.session_state:
     st.session_state.current_line_points = []
 if 'current_polygon_points' not in st.session_state:
@@ -124,102 +215,288 @@ if 'generated_mbtiles' not in st.session_state:
     st.session_state.generated_mbtiles = {}
 if 'nav_database' not in st.session_state:
     st.session_state.nav_database = None
+if 'nav_search_index' not in st.session_state:
+    st.session_state.nav_search_index = None
+if 'mass_import_result' not in st.session_state:
+    st.session_state.mass_import_result = None
+if 'data_revisions' not in st.session_state:
+    # Compteurs de révision par couche de la carte, incrémentés à chaque modification des données
+    st.session_state.data_revisions = {kind: 0 for kind in MAP_LAYER_KINDS}
+if 'object_extents' not in st.session_state:
+    # Emprise de chaque objet affiché, indexée par id(objet) (l'objet est gardé pour que l'id reste unique)
+    st.session_state.object_extents = {kind: {} for kind in OBJECT_KINDS}
+if 'frame_cache' not in st.session_state:
+    st.session_state.frame_cache = {}
+if 'route_legs_cache' not in st.session_state:
+    # Tableau des tronçons de chaque ligne, indexé par id(ligne) (la ligne est gardée pour que l'id reste unique)
+    st.session_state.route_legs_cache = {}
+if 'frame_changes' not in st.session_state:
+    # Dernières modifications de chaque type (révision, objets ajoutés, objets supprimés), pour mettre à jour
+    # les tableaux d'aperçu ligne à ligne
+    st.session_state.frame_changes = {kind: deque(maxlen=FRAME_CHANGE_LOG_SIZE) for kind in OBJECT_KINDS}
+if 'map_layer_cache' not in st.session_state:
+    st.session_state.map_layer_cache = {}
+if 'show_map' not in st.session_state:
+    st.session_state.show_map = False
+if 'map_cluster_threshold' not in st.session_state:
+    st.session_state.map_cluster_threshold = DEFAULT_CLUSTER_THRESHOLD
+if 'map_prefer_canvas' not in st.session_state:
+    st.session_state.map_prefer_canvas = False
+if 'map_detail_level' not in st.session_state:
+    st.session_state.map_detail_level = "Automatique"
+if 'map_view' not in st.session_state:
+    # Dernière vue de la carte renvoyée par le navigateur (base d'objets : chargement de la vue seule)
+    st.session_state.map_view = None
+if 'perf_history' not in st.session_state:
+    st.session_state.perf_history = deque(maxlen=PERF_HISTORY_SIZE)
+if 'last_profile' not in st.session_state:
+    st.session_state.last_profile = None
+
+def bump_revision(*kinds):
+    """Signale une modification des données d'une ou plusieurs couches de la carte"""
+    for kind in kinds:
+        st.session_state.data_revisions[kind] += 1
+
+def data_revision(kind):
+    """Révision des données d'une couche : compteur de la session, ou révision en base pour une collection
+    de la base d'objets (modifiée aussi par les autres sessions du même espace de travail)"""
+    objects = st.session_state.get(f"{kind}_data")
+    if isinstance(objects, SQLiteObjectCollection):
+        return objects.workspace, objects.revision()
+    return st.session_state.data_revisions[kind]
+
+def log_change(kind, added=(), removed=()):
+    """Note les objets ajoutés/supprimés par la dernière révision de `kind` (tableaux mis à jour ligne à ligne)
+
+    Une révision sans entrée (vidage, import de projet, base d'objets) force la reconstruction des tableaux.
+    """
+    if isinstance(st.session_state[f"{kind}_data"], SQLiteObjectCollection):
+        return  # Objets relus depuis la base à chaque parcours : id(objet) n'identifie pas une ligne
+    st.session_state.frame_changes[kind].append((st.session_state.data_revisions[kind], list(added), list(removed)))
+
+def add_objects(kind, objects):
+    """Ajoute des objets à la collection `kind` et enregistre leur emprise"""
+    collection = st.session_state[f"{kind}_data"]
+    objects = list(objects)
+    collection.extend(objects)  # une seule transaction avec la base d'objets
+    if not isinstance(collection, SQLiteObjectCollection):
+        extents = st.session_state.object_extents[kind]
+        for obj in objects:
+            extents[id(obj)] = (obj, object_extent(obj))
+    bump_revision(kind)
+    log_change(kind, added=objects)
+
+def add_object(kind, obj):
+    """Ajoute un objet à la collection `kind`"""
+    add_objects(kind, [obj])
+
+def remove_object(kind, obj):
+    """Supprime un objet de la collection `kind` (O(1))"""
+    st.session_state[f"{kind}_data"].remove(obj)
+    st.session_state.object_extents[kind].pop(id(obj), None)
+    if kind == 'lines':
+        st.session_state.route_legs_cache.pop(id(obj), None)
+    bump_revision(kind)
+    log_change(kind, removed=[obj])
+
+def remove_objects_named(kind, name):
+    """Supprime les objets de la collection `kind` portant ce nom"""
+    extents = st.session_state.object_extents[kind]
+    removed = st.session_state[f"{kind}_data"].remove_name(name)
+    for obj in removed:
+        extents.pop(id(obj), None)
+        if kind == 'lines':
+            st.session_state.route_legs_cache.pop(id(obj), None)
+    bump_revision(kind)
+    log_change(kind, removed=removed)
+
+def clear_objects(*kinds):
+    """Vide les collections et leur index d'emprise"""
+    for kind in kinds:
+        st.session_state[f"{kind}_data"].clear()
+        st.session_state.object_extents[kind] = {}
+    if 'lines' in kinds:
+        st.session_state.route_legs_cache = {}
+    bump_revision(*kinds)
+
+# Tableaux d'aperçu (onglets Import/Export et Points), tenus à jour ligne à ligne depuis le journal des modifications
+PREVIEW_COLUMNS = {"Type": "string", "Nom": "string", "Détails": "string", "Description": "string"}
+POINTS_COLUMNS = {"name": "string", "lat": "float64", "lon": "float64", "description": "string"}
+
+def preview_row(kind, obj):
+    """Ligne d'aperçu d'un objet (type, nom, détails, description)"""
+    if kind == 'points':
+        details = f"Lat: {obj['lat']:.4f}, Lon: {obj['lon']:.4f}"
+        label = "📍 Point"
+    elif kind == 'lines':
+        details = f"{len(obj['points'])} points, {obj['color']}"
+        label = "📏 Ligne"
+    elif kind == 'circles':
+        radius_display = obj['radius_km'] / 1.852 if obj['radius_unit'] == 'nautiques' else obj['radius_km'] * 1000
+        unit_display = "NM" if obj['radius_unit'] == 'nautiques' else "m"
+        details = f"R={radius_display:.2f}{unit_display}, {obj['color']}"
+        label = "⭕ Cercle/Arc"
+    elif 'length_km' in obj:
+        details = f"{obj['length_km']*1000:.0f}m x {obj['width_km']*1000:.0f}m"
+        label = "🔷 Rectangle"
+    else:
+        details = f"{len(obj['points'])} points"
+        label = "🔷 Polygone"
+    return label, obj['name'], details, obj.get('description', '')
+
+def get_cached_frame(cache_name, cache_key, builder):
+    """DataFrame mis en cache dans la session, reconstruit uniquement si la clé change"""
+    cached = st.session_state.frame_cache.get(cache_name)
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, builder())
+        st.session_state.frame_cache[cache_name] = cached
+    return cached[1]
+
+def get_object_frame(cache_name, kind, row_builder, columns):
+    """Tableau des objets d'un type (une ligne par objet, indexée par id(objet)), mis en cache dans la session
+
+    Les révisions manquées sont rejouées depuis le journal des modifications : seules les lignes des objets
+    ajoutés sont calculées, celles des objets supprimés retirées. Le tableau n'est reconstruit entièrement
+    que si le journal ne couvre pas toutes ces révisions.
+    """
+    def build(objects):
+        return pd.DataFrame([row_builder(obj) for obj in objects], columns=list(columns),
+                            index=[id(obj) for obj in objects]).astype(columns)
+
+    objects = st.session_state[f"{kind}_data"]
+    revision = data_revision(kind)
+    cached = st.session_state.frame_cache.get(cache_name)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+
+    changes = None
+    if isinstance(objects, SQLiteObjectCollection):
+        objects = objects[:STORE_TABLE_MAX_ROWS]  # Seules les premières lignes sont gardées dans la session
+    elif cached is not None:
+        changes = [change for change in st.session_state.frame_changes[kind] if change[0] > cached[0]]
+        if [change[0] for change in changes] != list(range(cached[0] + 1, revision + 1)):
+            changes = None
+    if changes is None:
+        frame = build(objects)
+    else:
+        frame = cached[1]
+        for _, added, removed in changes:
+            if removed:
+                frame = frame.drop(index=[id(obj) for obj in removed], errors='ignore')
+            if added:
+                frame = pd.concat([frame, build(added)])
+    st.session_state.frame_cache[cache_name] = (revision, frame)
+    return frame
+
+def store_table_caption(*kinds):
+    """Signale les types dont le tableau ne montre que les premières lignes (base d'objets)"""
+    counts = {kind: len(st.session_state[f"{kind}_data"]) for kind in kinds
+              if isinstance(st.session_state[f"{kind}_data"], SQLiteObjectCollection)}
+    truncated = [f"{OBJECT_KIND_LABELS[kind]} : {count}" for kind, count in counts.items() if count > STORE_TABLE_MAX_ROWS]
+    if truncated:
+        st.caption(f"{STORE_TABLE_MAX_ROWS} premières lignes affichées par type ({', '.join(truncated)} au total)")
+
+def get_kind_preview_frame(kind):
+    """Aperçu d'un type d'objet"""
+    return get_object_frame(f"preview_{kind}", kind, lambda obj: preview_row(kind, obj), PREVIEW_COLUMNS)
+
+def get_preview_frame():
+    """Aperçu de tous les objets : concaténation des aperçus par type (seuls les types modifiés sont recalculés)"""
+    revisions = tuple(data_revision(kind) for kind in OBJECT_KINDS)
+    return get_cached_frame("preview", revisions, lambda: pd.concat(
+        [get_kind_preview_frame(kind) for kind in OBJECT_KINDS], ignore_index=True
+    ))
+
+def get_points_frame():
+    """Tableau des points existants"""
+    return get_object_frame("points_table", 'points', lambda p: (p['name'], p['lat'], p['lon'], p.get('description', '')),
+                            POINTS_COLUMNS)
+
+# Analyse des routes (onglet Lignes) : distances, routes vraies et temps de vol estimé
+ROUTES_COLUMNS = {"Nom": "string", "Points": "int64", "Tronçons": "int64", "Distance (NM)": "float64",
+                  "Distance (km)": "float64", "Route initiale (°)": "float64", "ETE": "string"}
+ROUTE_LEGS_COLUMNS = {"Tronçon": "int64", "Distance (NM)": "float64", "Route vraie (°)": "float64",
+                      "Cumul (NM)": "float64", "ETE cumulé": "string"}
+ROUTE_LEGS_DISPLAY_MAX = 500  # tronçons affichés par ligne (traces GPS de plusieurs milliers de points)
+
+def format_ete(hours):
+    """Durée en heures au format h:mm"""
+    minutes = round(hours * 60)
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+def get_routes_frame(ground_speed_kt):
+    """Résumé de toutes les lignes (un seul calcul vectorisé), mis en cache par révision et vitesse sol"""
+    def build():
+        lines = list(st.session_state.lines_data)
+        rows = []
+        for line, summary in zip(lines, routes_summary(lines)):
+            distance_nm = summary['distance_m'] / 1852
+            bearing = summary['initial_bearing_deg']
+            rows.append((line['name'], summary['points'], summary['legs'], round(distance_nm, 1),
+                         round(summary['distance_m'] / 1000, 1), round(bearing, 1) if bearing is not None else None,
+                         format_ete(distance_nm / ground_speed_kt)))
+        return pd.DataFrame(rows, columns=list(ROUTES_COLUMNS)).astype(ROUTES_COLUMNS)
+    return get_cached_frame("routes", (data_revision('lines'), ground_speed_kt), build)
+
+def get_route_legs_frame(line, ground_speed_kt):
+    """Tronçons d'une ligne (les ROUTE_LEGS_DISPLAY_MAX premiers), mis en cache par ligne et vitesse sol
+
+    Ajouter ou supprimer une autre ligne ne recalcule pas ce tableau ; l'entrée d'une ligne supprimée est
+    retirée avec elle. Avec la base d'objets, les lignes sont relues à chaque parcours : pas de cache.
+    """
+    def build():
+        legs = route_legs(line['points'][:ROUTE_LEGS_DISPLAY_MAX + 1])
+        cumulative_nm = legs['cumulative_m'] / 1852
+        return pd.DataFrame({
+            "Tronçon": np.arange(1, len(cumulative_nm) + 1),
+            "Distance (NM)": np.round(legs['distance_m'] / 1852, 2),
+            "Route vraie (°)": np.round(legs['bearing_deg'], 1),
+            "Cumul (NM)": np.round(cumulative_nm, 2),
+            "ETE cumulé": [format_ete(value / ground_speed_kt) for value in cumulative_nm.tolist()],
+        }).astype(ROUTE_LEGS_COLUMNS)
+    if isinstance(st.session_state.lines_data, SQLiteObjectCollection):
+        return build()
+    cache = st.session_state.route_legs_cache
+    cached = cache.get(id(line))
+    if cached is None or cached[1] != ground_speed_kt:
+        cached = (line, ground_speed_kt, build())
+        cache[id(line)] = cached
+    return cached[2]
+
+# Tableau de gestion des objets (onglet Visualisation)
+OBJECT_KIND_LABELS = {'points': "📍 Point", 'lines': "📏 Ligne", 'circles': "⭕ Cercle/Arc", 'rectangles': "🔷 Polygone"}
+OBJECT_TABLE_PAGE_SIZES = [25, 50, 100, 250]
+
+def object_details(kind, obj):
+    """Résumé d'un objet pour le tableau de gestion"""
+    if kind == 'points':
+        return f"{obj['lat']:.4f}, {obj['lon']:.4f}"
+    if kind == 'lines':
+        return f"{len(obj['points'])} points"
+    if kind == 'circles':
+        radius_display = obj['radius_km'] / 1.852 if obj['radius_unit'] == 'nautiques' else obj['radius_km'] * 1000
+        unit_display = "NM" if obj['radius_unit'] == 'nautiques' else "m"
+        return f"R={radius_display:.2f}{unit_display}"
+    if 'length_km' in obj:
+        return f"Rectangle {obj['length_km']*1000:.0f}m x {obj['width_km']*1000:.0f}m"
+    return f"Polygone {len(obj.get('points', []))} points"
+
+def filter_objects(kinds, colors, name_part):
+    """Objets (type, objet) correspondant aux filtres ; une liste vide de types ou couleurs = pas de filtre"""
+    name_part = name_part.strip().lower()
+    matches = []
+    for kind in kinds or OBJECT_KINDS:
+        for obj in st.session_state[f"{kind}_data"]:
+            if colors and obj.get('color') not in colors:
+                continue
+            if name_part and name_part not in str(obj.get('name', '')).lower():
+                continue
+            matches.append((kind, obj))
+    return matches
 
-# Constantes WGS84
-WGS84_A = 6378137.0  # Demi-grand axe (m)
-WGS84_F = 1/298.257223563  # Aplatissement
-WGS84_B = WGS84_A * (1 - WGS84_F)  # Demi-petit axe
-
-# Fonctions géodésiques haute précision (Vincenty)
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Distance Vincenty inverse - précision sub-métrique"""
-    if lat1 == lat2 and lon1 == lon2:
-        return 0.0
-    
-    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
-    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
-    
-    L = lon2_rad - lon1_rad
-    U1 = math.atan((1 - WGS84_F) * math.tan(lat1_rad))
-    U2 = math.atan((1 - WGS84_F) * math.tan(lat2_rad))
-    
-    sin_U1, cos_U1 = math.sin(U1), math.cos(U1)
-    sin_U2, cos_U2 = math.sin(U2), math.cos(U2)
-    
-    lambda_val = L
-    for _ in range(100):
-        sin_lambda, cos_lambda = math.sin(lambda_val), math.cos(lambda_val)
-        sin_sigma = math.sqrt((cos_U2 * sin_lambda) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda) ** 2)
-        
-        if sin_sigma == 0:
-            return 0.0
-        
-        cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lambda
-        sigma = math.atan2(sin_sigma, cos_sigma)
-        sin_alpha = cos_U1 * cos_U2 * sin_lambda / sin_sigma
-        cos2_alpha = 1 - sin_alpha ** 2
-        
-        if cos2_alpha == 0:
-            cos_2sigma_m = 0
-        else:
-            cos_2sigma_m = cos_sigma - 2 * sin_U1 * sin_U2 / cos2_alpha
-        
-        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
-        lambda_prev = lambda_val
-        lambda_val = L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
-        
-        if abs(lambda_val - lambda_prev) < 1e-12:
-            break
-    
-    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / (WGS84_B ** 2)
-    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
-    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
-    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
-    
-    return WGS84_B * A * (sigma - delta_sigma)
-
-def calculate_bearing(lat1, lon1, lat2, lon2):
-    """Gisement initial Vincenty - précision sub-métrique"""
-    if lat1 == lat2 and lon1 == lon2:
-        return 0.0
-    
-    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
-    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
-    
-    L = lon2_rad - lon1_rad
-    U1 = math.atan((1 - WGS84_F) * math.tan(lat1_rad))
-    U2 = math.atan((1 - WGS84_F) * math.tan(lat2_rad))
-    
-    sin_U1, cos_U1 = math.sin(U1), math.cos(U1)
-    sin_U2, cos_U2 = math.sin(U2), math.cos(U2)
-    
-    lambda_val = L
-    for _ in range(100):
-        sin_lambda, cos_lambda = math.sin(lambda_val), math.cos(lambda_val)
-        sin_sigma = math.sqrt((cos_U2 * sin_lambda) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda) ** 2)
-        
-        if sin_sigma == 0:
-            return 0.0
-        
-        cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lambda
-        sigma = math.atan2(sin_sigma, cos_sigma)
-        sin_alpha = cos_U1 * cos_U2 * sin_lambda / sin_sigma
-        cos2_alpha = 1 - sin_alpha ** 2
-        
-        if cos2_alpha == 0:
-            cos_2sigma_m = 0
-        else:
-            cos_2sigma_m = cos_sigma - 2 * sin_U1 * sin_U2 / cos2_alpha
-        
-        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
-        lambda_prev = lambda_val
-        lambda_val = L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
-        
-        if abs(lambda_val - lambda_prev) < 1e-12:
-            break
-    
-    alpha1 = math.atan2(cos_U2 * sin_lambda, cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda)
-    return (math.degrees(alpha1) + 360) % 360
+def session_objects():
+    """Objets de la session par type (arguments des fonctions d'export de kml_core)"""
+    return {kind: st.session_state[f"{kind}_data"] for kind in OBJECT_KINDS}
 
 def convert_calamar_to_gps(x_val, y_val, x_unit, y_unit):
     """Convertit des coordonnées Calamar en GPS"""
@@ -309,107 +586,7 @@ def load_nav_database():
             "Tour Eiffel": {"lat": 48.8584, "lon": 2.2945, "type": "Point VFR", "freq": ""},
         }
 
-def calculate_circle_points(center_lat, center_lon, radius_km, num_segments, is_arc=False, start_angle_deg=0, end_angle_deg=360, close_arc=True):
-    """Calcul de cercles avec précision Vincenty"""
-    points = []
-    center_point = {"lat": center_lat, "lon": center_lon}
-
-    if is_arc:
-        if end_angle_deg < start_angle_deg:
-            end_angle_deg += 360
-        
-        # Pour les arcs fermés, ajouter le centre au début
-        if close_arc:
-            points.append((center_lon, center_lat))
-        
-        angle_range = end_angle_deg - start_angle_deg
-        effective_num_segments = max(num_segments, int(abs(angle_range)))
-        
-        # Générer les points de l'arc
-        for i in range(effective_num_segments + 1):
-            angle_deg = start_angle_deg + (angle_range / effective_num_segments) * i
-            if angle_deg > 360:
-                angle_deg -= 360
-            
-            new_lat, new_lon = create_point_from_bearing_distance(center_point, radius_km, angle_deg)
-            points.append((new_lon, new_lat))
-        
-        # Pour les arcs fermés, fermer vers le centre
-        if close_arc:
-            points.append((center_lon, center_lat))
-    else:
-        # Cercle complet
-        for i in range(num_segments + 1):
-            angle_deg = (360 / num_segments) * i
-            new_lat, new_lon = create_point_from_bearing_distance(center_point, radius_km, angle_deg)
-            points.append((new_lon, new_lat))
-    return points
-
-def calculate_rectangle_points(center_lat, center_lon, length_km, width_km, bearing_deg):
-    """Calcul de rectangles avec précision Vincenty"""
-    center_point = {"lat": center_lat, "lon": center_lon}
-    half_length_km = length_km / 2
-    half_width_km = width_km / 2
-    
-    corners_local = [
-        (half_length_km, half_width_km),
-        (half_length_km, -half_width_km),
-        (-half_length_km, -half_width_km),
-        (-half_length_km, half_width_km)
-    ]
-    
-    rectangle_points = []
-
-    for x_local, y_local in corners_local:
-        dist_to_corner = math.sqrt(x_local**2 + y_local**2)
-        angle_relative = math.degrees(math.atan2(y_local, x_local))
-        absolute_bearing = (bearing_deg + angle_relative) % 360
-        
-        new_lat, new_lon = create_point_from_bearing_distance(center_point, dist_to_corner, absolute_bearing)
-        rectangle_points.append((new_lon, new_lat))
-    
-    rectangle_points.append(rectangle_points[0])  # Fermer le rectangle
-    return rectangle_points
-
-def create_point_from_bearing_distance(start_point, distance_km, bearing_deg):
-    """Formule directe Vincenty - précision sub-métrique"""
-    lat1_rad = math.radians(start_point["lat"])
-    lon1_rad = math.radians(start_point["lon"])
-    alpha1_rad = math.radians(bearing_deg)
-    s = distance_km * 1000  # Convertir en mètres
-    
-    sin_alpha1, cos_alpha1 = math.sin(alpha1_rad), math.cos(alpha1_rad)
-    tan_U1 = (1 - WGS84_F) * math.tan(lat1_rad)
-    cos_U1 = 1 / math.sqrt(1 + tan_U1 ** 2)
-    sin_U1 = tan_U1 * cos_U1
-    
-    sigma1 = math.atan2(tan_U1, cos_alpha1)
-    sin_alpha = cos_U1 * sin_alpha1
-    cos2_alpha = 1 - sin_alpha ** 2
-    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / (WGS84_B ** 2)
-    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
-    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
-    
-    sigma = s / (WGS84_B * A)
-    for _ in range(100):
-        cos_2sigma_m = math.cos(2 * sigma1 + sigma)
-        sin_sigma, cos_sigma = math.sin(sigma), math.cos(sigma)
-        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
-        sigma_prev = sigma
-        sigma = s / (WGS84_B * A) + delta_sigma
-        
-        if abs(sigma - sigma_prev) < 1e-12:
-            break
-    
-    tmp = sin_U1 * sin_sigma - cos_U1 * cos_sigma * cos_alpha1
-    lat2_rad = math.atan2(sin_U1 * cos_sigma + cos_U1 * sin_sigma * cos_alpha1, (1 - WGS84_F) * math.sqrt(sin_alpha ** 2 + tmp ** 2))
-    lambda_val = math.atan2(sin_sigma * sin_alpha1, cos_U1 * cos_sigma - sin_U1 * sin_sigma * cos_alpha1)
-    C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
-    L = lambda_val - (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
-    lon2_rad = (lon1_rad + L + 3 * math.pi) % (2 * math.pi) - math.pi
-    
-    return math.degrees(lat2_rad), math.degrees(lon2_rad)
-
+@timed
 def parse_kml_file(kml_content):
     """Parse un fichier KML et extrait les objets avec leurs styles"""
     try:
@@ -567,6 +744,7 @@ def load_reference_kml():
                 'lines': lines, 
                 'polygons': polygons
             }
+            bump_revision('reference')
             return True
         except Exception as e:
             st.error(f"Erreur chargement référence: {e}")
@@ -574,612 +752,240 @@ def load_reference_kml():
 
 def load_kml_data(points, lines, polygons):
     """Charge les données KML dans la session"""
-    st.session_state.points_data.extend(points)
-    st.session_state.lines_data.extend(lines)
-    st.session_state.rectangles_data.extend(polygons)
+    add_objects('points', points)
+    add_objects('lines', lines)
+    add_objects('rectangles', polygons)
     
     # Réinitialiser les listes temporaires
     st.session_state.current_line_points = []
     st.session_state.current_polygon_points = []
 
-def generate_kml():
-    kml = simplekml.Kml()
-    
-    color_map = {
-        "rouge": simplekml.Color.red, "vert": simplekml.Color.green, "bleu": simplekml.Color.blue,
-        "jaune": simplekml.Color.yellow, "orange": simplekml.Color.orange, "cyan": simplekml.Color.cyan, 
-        "magenta": simplekml.Color.magenta, "noir": simplekml.Color.black, "blanc": simplekml.Color.white
-    }
-
-    if st.session_state.points_data:
-        points_folder = kml.newfolder(name="Points Générés")
-        for p_data in st.session_state.points_data:
-            p = points_folder.newpoint(name=p_data['name'], coords=[(p_data['lon'], p_data['lat'])])
-            if p_data.get('description'):
-                p.description = p_data['description']
-
-    if st.session_state.lines_data:
-        lines_folder = kml.newfolder(name="Lignes Générées")
-        for l_data in st.session_state.lines_data:
-            ls = lines_folder.newlinestring(name=l_data['name'], coords=l_data['points'])
-            if l_data.get('description'):
-                ls.description = l_data['description']
-            ls.style.linestyle.width = l_data['width']
-            ls.style.linestyle.color = color_map.get(l_data['color'], simplekml.Color.red)
-
-    if st.session_state.circles_data:
-        # Séparer arcs ouverts et cercles/arcs fermés
-        open_arcs = [c for c in st.session_state.circles_data if c.get('type') == 'Arc' and not c.get('close_arc', True)]
-        closed_shapes = [c for c in st.session_state.circles_data if not (c.get('type') == 'Arc' and not c.get('close_arc', True))]
-        
-        # Arcs ouverts dans le dossier lignes
-        if open_arcs:
-            if not st.session_state.lines_data:
-                lines_folder = kml.newfolder(name="Lignes Générées")
-            for c_data in open_arcs:
-                if 'points' in c_data:
-                    line = lines_folder.newlinestring(name=c_data['name'], coords=c_data['points'])
-                    if c_data.get('description'):
-                        line.description = c_data['description']
-                    line.style.linestyle.width = c_data.get('width', 2)
-                    line.style.linestyle.color = color_map.get(c_data.get('color', 'rouge'), simplekml.Color.red)
-        
-        # Cercles et arcs fermés
-        if closed_shapes:
-            circles_folder = kml.newfolder(name="Cercles et Arcs Fermés")
-            for c_data in closed_shapes:
-                if 'points' in c_data:
-                    # Créer un polygone avec style explicite
-                    poly = circles_folder.newpolygon(name=c_data['name'], outerboundaryis=c_data['points'])
-                    if c_data.get('description'):
-                        poly.description = c_data['description']
-                    
-                    # Style de ligne
-                    poly.style.linestyle.width = c_data.get('width', 2)
-                    poly.style.linestyle.color = color_map.get(c_data.get('color', 'rouge'), simplekml.Color.red)
-                    
-                    # Style de remplissage
-                    if c_data.get('fill', False):
-                        base_color = color_map.get(c_data.get('color', 'rouge'), simplekml.Color.red)
-                        poly.style.polystyle.color = simplekml.Color.changealphaint(150, base_color)
-                        poly.style.polystyle.fill = 1
-                    else:
-                        poly.style.polystyle.fill = 0
-                        poly.style.polystyle.outline = 1  # Forcer l'affichage du contour
-
-    if st.session_state.rectangles_data:
-        rectangles_folder = kml.newfolder(name="Rectangles Générés")
-        for r_data in st.session_state.rectangles_data:
-            poly = rectangles_folder.newpolygon(name=r_data['name'], outerboundaryis=r_data['points'])
-            poly.style.linestyle.width = r_data.get('width', 2)
-            poly.style.linestyle.color = color_map.get(r_data.get('color', 'rouge'), simplekml.Color.red)
-            
-            if r_data.get('fill', False):
-                base_color = color_map.get(r_data.get('color', 'rouge'), simplekml.Color.red)
-                poly.style.polystyle.color = simplekml.Color.changealphaint(150, base_color)
-                poly.style.polystyle.fill = 1
-            else:
-                poly.style.polystyle.fill = 0
-
-    return kml
-
-def generate_geojson():
-    """Génère un GeoJSON strictement conforme aux spécifications Tippecanoe"""
-    features = []
-    
-    # Points
-    for point in st.session_state.points_data:
-        try:
-            lon, lat = float(point['lon']), float(point['lat'])
-            if -180 <= lon <= 180 and -90 <= lat <= 90:
-                features.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    },
-                    "properties": {
-                        "name": str(point['name']),
-                        "description": str(point.get('description', ''))
-                    }
-                })
-        except (ValueError, TypeError, KeyError):
-            continue
-    
-    # Lignes - utiliser MultiLineString pour Tippecanoe
-    for line in st.session_state.lines_data:
-        if 'points' in line and line['points'] and len(line['points']) >= 2:
-            coordinates = []
-            for coord in line['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 2:
-                features.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "MultiLineString",
-                        "coordinates": [coordinates]
-                    },
-                    "properties": {
-                        "name": str(line['name']),
-                        "description": str(line.get('description', ''))
-                    }
-                })
-    
-    # Cercles - représentés comme Polygon simple
-    for circle in st.session_state.circles_data:
-        if 'points' in circle and circle['points'] and len(circle['points']) >= 3:
-            coordinates = []
-            for coord in circle['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 3:
-                # Assurer fermeture du polygone
-                if coordinates[0] != coordinates[-1]:
-                    coordinates.append(coordinates[0])
-                
-                if len(coordinates) >= 4:
-                    features.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [coordinates]
-                        },
-                        "properties": {
-                            "name": str(circle['name'])
-                        }
-                    })
-    
-    # Polygones et rectangles
-    for rect in st.session_state.rectangles_data:
-        if 'points' in rect and rect['points'] and len(rect['points']) >= 3:
-            coordinates = []
-            for coord in rect['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 3:
-                # Assurer fermeture du polygone
-                if coordinates[0] != coordinates[-1]:
-                    coordinates.append(coordinates[0])
-                
-                if len(coordinates) >= 4:
-                    features.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [coordinates]
-                        },
-                        "properties": {
-                            "name": str(rect['name']),
-                            "description": str(rect.get('description', ''))
-                        }
-                    })
-    
-    # Structure GeoJSON strictement conforme
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
-def group_objects_by_color():
-    """Groupe les objets par couleur pour créer des MBTiles séparés"""
-    colors_data = {}
-    
-    def add_to_color(color, feature):
-        if color not in colors_data:
-            colors_data[color] = {"type": "FeatureCollection", "features": []}
-        colors_data[color]["features"].append(feature)
-    
-    # Points convertis en cercles de 25m - tous dans "points" pour une couleur standard
-    if st.session_state.points_data:
-        for point in st.session_state.points_data:
-            try:
-                lat, lon = float(point['lat']), float(point['lon'])
-                if -180 <= lon <= 180 and -90 <= lat <= 90:
-                    circle_points = calculate_circle_points(lat, lon, 0.025, 36, is_arc=False)
-                    
-                    if len(circle_points) >= 3:
-                        if circle_points[0] != circle_points[-1]:
-                            circle_points.append(circle_points[0])
-                        
-                        feature = {
-                            "type": "Feature",
-                            "geometry": {
-                                "type": "Polygon",
-                                "coordinates": [circle_points]
-                            },
-                            "properties": {
-                                "name": str(point['name']),
-                                "description": str(point.get('description', ''))
-                            }
-                        }
-                        add_to_color("points", feature)
-            except (ValueError, TypeError, KeyError):
-                continue
-    
-    # Lignes groupées par couleur
-    for line in st.session_state.lines_data:
-        if 'points' in line and line['points'] and len(line['points']) >= 2:
-            coordinates = []
-            for coord in line['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 2:
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "MultiLineString",
-                        "coordinates": [coordinates]
-                    },
-                    "properties": {
-                        "name": str(line['name']),
-                        "description": str(line.get('description', ''))
-                    }
-                }
-                color = line.get('color', 'rouge')
-                add_to_color(color, feature)
-    
-    # Cercles groupés par couleur
-    for circle in st.session_state.circles_data:
-        if 'points' in circle and circle['points'] and len(circle['points']) >= 3:
-            coordinates = []
-            for coord in circle['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 3:
-                if coordinates[0] != coordinates[-1]:
-                    coordinates.append(coordinates[0])
-                
-                if len(coordinates) >= 4:
-                    feature = {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [coordinates]
-                        },
-                        "properties": {
-                            "name": str(circle['name'])
-                        }
-                    }
-                    color = circle.get('color', 'rouge')
-                    add_to_color(color, feature)
-    
-    # Polygones groupés par couleur
-    for rect in st.session_state.rectangles_data:
-        if 'points' in rect and rect['points'] and len(rect['points']) >= 3:
-            coordinates = []
-            for coord in rect['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 3:
-                if coordinates[0] != coordinates[-1]:
-                    coordinates.append(coordinates[0])
-                
-                if len(coordinates) >= 4:
-                    feature = {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [coordinates]
-                        },
-                        "properties": {
-                            "name": str(rect['name']),
-                            "description": str(rect.get('description', ''))
-                        }
-                    }
-                    color = rect.get('color', 'rouge')
-                    add_to_color(color, feature)
-    
-    return colors_data
-
-def generate_geojson_for_tippecanoe():
-    """Génère un GeoJSON pour Tippecanoe - fichier unique avec points convertis en cercles"""
-    features = []
-    
-    # Points convertis en cercles de 25m de rayon pour SD VFR Next
-    for point in st.session_state.points_data:
-        try:
-            lat, lon = float(point['lat']), float(point['lon'])
-            if -180 <= lon <= 180 and -90 <= lat <= 90:
-                circle_points = calculate_circle_points(lat, lon, 0.025, 36, is_arc=False)
-                
-                if len(circle_points) >= 3:
-                    if circle_points[0] != circle_points[-1]:
-                        circle_points.append(circle_points[0])
-                    
-                    features.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [circle_points]
-                        },
-                        "properties": {
-                            "name": str(point['name']),
-                            "description": str(point.get('description', ''))
-                        }
-                    })
-        except (ValueError, TypeError, KeyError):
-            continue
-    
-    # Lignes - utiliser MultiLineString pour Tippecanoe
-    for line in st.session_state.lines_data:
-        if 'points' in line and line['points'] and len(line['points']) >= 2:
-            coordinates = []
-            for coord in line['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 2:
-                features.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "MultiLineString",
-                        "coordinates": [coordinates]
-                    },
-                    "properties": {
-                        "name": str(line['name']),
-                        "description": str(line.get('description', ''))
-                    }
-                })
-    
-    # Cercles - représentés comme Polygon simple
-    for circle in st.session_state.circles_data:
-        if 'points' in circle and circle['points'] and len(circle['points']) >= 3:
-            coordinates = []
-            for coord in circle['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 3:
-                if coordinates[0] != coordinates[-1]:
-                    coordinates.append(coordinates[0])
-                
-                if len(coordinates) >= 4:
-                    features.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [coordinates]
-                        },
-                        "properties": {
-                            "name": str(circle['name'])
-                        }
-                    })
-    
-    # Polygones et rectangles
-    for rect in st.session_state.rectangles_data:
-        if 'points' in rect and rect['points'] and len(rect['points']) >= 3:
-            coordinates = []
-            for coord in rect['points']:
-                try:
-                    lon, lat = float(coord[0]), float(coord[1])
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        coordinates.append([lon, lat])
-                except (ValueError, TypeError, IndexError):
-                    continue
-            
-            if len(coordinates) >= 3:
-                if coordinates[0] != coordinates[-1]:
-                    coordinates.append(coordinates[0])
-                
-                if len(coordinates) >= 4:
-                    features.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [coordinates]
-                        },
-                        "properties": {
-                            "name": str(rect['name']),
-                            "description": str(rect.get('description', ''))
-                        }
-                    })
+def tiff_overview_factors(width, height, min_size=TIFF_OVERVIEW_MIN_SIZE):
+    """Facteurs de décimation de la pyramide (2, 4, 8...) jusqu'à une taille minimale"""
+    factors = []
+    factor = 2
+    while max(width, height) // factor >= min_size:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+def build_tiff_overviews(tiff_path):
+    """Construit les niveaux réduits (overviews) du TIFF s'il n'en a pas déjà"""
+    from rasterio.enums import Resampling
+    
+    with rasterio.open(tiff_path, 'r+') as src:
+        if src.overviews(1):
+            return
+        factors = tiff_overview_factors(src.width, src.height)
+        if factors:
+            src.build_overviews(factors, Resampling.average)
+            src.update_tags(ns='rio_overview', resampling='average')
+
+def tiff_read_factor(width, height, max_pixels):
+    """Plus petit niveau de la pyramide (puissance de 2) qui tient dans le budget de pixels"""
+    factor = 1
+    while (width // factor) * (height // factor) > max_pixels:
+        factor *= 2
+    return factor
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def render_tiff_overlay(tiff_path, mtime, max_pixels):
+    """Rendu PNG de l'overlay, mis en cache par fichier et date de modification"""
+    from rasterio.enums import Resampling
+    from rasterio.warp import transform_bounds
+    from PIL import Image
     
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
-
-
-def convert_geojson_minimal(geojson_data, name="minimal_tiles"):
-    """Convertit GeoJSON en MBTiles avec paramètres ultra-minimaux"""
-    try:
-        files = {'file': (f'{name}.geojson', json.dumps(geojson_data), 'application/geo+json')}
+    with rasterio.open(tiff_path) as src:
+        bounds = src.bounds
+        crs = src.crs
         
-        response = requests.post(
-            f"{get_api_url()}/convert-geojson-minimal",
-            files=files,
-            data={'name': name},
-            timeout=API_TIMEOUT
-        )
+        if crs != 'EPSG:4326':
+            bounds = transform_bounds(crs, 'EPSG:4326', *bounds)
+        
+        # Lecture décimée : GDAL utilise les overviews quand elles existent
+        factor = tiff_read_factor(src.width, src.height, max_pixels)
+        out_shape = (src.count, max(1, src.height // factor), max(1, src.width // factor))
+        img_array = src.read(out_shape=out_shape, resampling=Resampling.average)
         
-        if response.status_code == 200:
-            return response.content
+        if img_array.shape[0] == 3:  # RGB
+            img = Image.fromarray(np.transpose(img_array, (1, 2, 0)), mode='RGB')
+        elif img_array.shape[0] == 4:  # RGBA
+            img = Image.fromarray(np.transpose(img_array, (1, 2, 0)), mode='RGBA')
         else:
-            error_msg = response.json().get('detail', 'Erreur inconnue') if response.headers.get('content-type') == 'application/json' else response.text
-            raise Exception(f"Erreur API: {error_msg}")
-            
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Erreur de connexion à l'API: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Erreur lors de la conversion: {str(e)}")
-
-
-
-
-
-
-
-
+            img = Image.fromarray(img_array[0], mode='L')
+        
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+        img_b64 = base64.b64encode(buffer.getvalue()).decode()
+        
+        return {
+            'bounds': [[bounds[1], bounds[0]], [bounds[3], bounds[2]]],
+            'image': f"data:image/png;base64,{img_b64}",
+            'opacity': 0.7
+        }
 
+@timed
 def process_tiff_overlay(tiff_path):
     """Traite un fichier TIFF géoréferencé pour l'overlay"""
     if not RASTERIO_AVAILABLE:
         return None
     
     try:
-        with rasterio.open(tiff_path) as src:
-            bounds = src.bounds
-            crs = src.crs
-            
-            if crs != 'EPSG:4326':
-                bounds = transform_bounds(crs, 'EPSG:4326', *bounds)
-            
-            img_array = src.read()
-            
-            if img_array.shape[0] == 3:  # RGB
-                img = Image.fromarray(np.transpose(img_array, (1, 2, 0)), mode='RGB')
-            elif img_array.shape[0] == 4:  # RGBA
-                img = Image.fromarray(np.transpose(img_array, (1, 2, 0)), mode='RGBA')
-            else:
-                img = Image.fromarray(img_array[0], mode='L')
-            
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            img_b64 = base64.b64encode(buffer.getvalue()).decode()
-            
-            return {
-                'bounds': [[bounds[1], bounds[0]], [bounds[3], bounds[2]]],
-                'image': f"data:image/png;base64,{img_b64}",
-                'opacity': 0.7
-            }
+        return render_tiff_overlay(tiff_path, os.path.getmtime(tiff_path), TIFF_OVERLAY_MAX_PIXELS)
     except Exception as e:
         st.error(f"Erreur TIFF: {e}")
         return None
 
+@st.cache_data(max_entries=16, show_spinner=False)
+def render_mbtiles_overlay(mbtiles_path, mtime, max_pixels):
+    """Aperçu PNG d'un MBTiles (tuiles assemblées), mis en cache par fichier et date de modification"""
+    mosaic = mbtiles_mosaic(mbtiles_path, max_pixels)
+    if mosaic is None:
+        return None
+    image, bounds = mosaic
+    return {
+        'bounds': bounds,
+        'image': f"data:image/png;base64,{base64.b64encode(image).decode()}",
+        'opacity': 0.7
+    }
 
-def create_map():
-    # Calculer le centre de la carte (optimisé)
-    all_lats, all_lons = [], []
-       
-    for point in st.session_state.points_data:
-        all_lats.append(point['lat'])
-        all_lons.append(point['lon'])
-    
-    for line in st.session_state.lines_data:
-        for lon, lat in line['points']:
-            all_lats.append(lat)
-            all_lons.append(lon)
-    
-    for circle in st.session_state.circles_data:
-        if 'points' in circle:
-            for lon, lat in circle['points']:
-                all_lats.append(lat)
-                all_lons.append(lon)
-    
-    for rect in st.session_state.rectangles_data:
-        if 'points' in rect:
-            for lon, lat in rect['points']:
-                all_lats.append(lat)
-                all_lons.append(lon)
-    
-    if all_lats and all_lons:
-        center_lat = sum(all_lats) / len(all_lats)
-        center_lon = sum(all_lons) / len(all_lons)
-    else:
-        center_lat, center_lon = 44.52, -1.12
-    
-  # Créer la carte
-    m = folium.Map(
-        location=[center_lat, center_lon], 
-        zoom_start=11,
-        prefer_canvas=False,
-        max_zoom=18
-    )
-    
-    # Fonds de carte
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-        attr='Esri',
-        name='Satellite',
-        overlay=False,
-        control=True
-    ).add_to(m)
-    
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}',
-        attr='Esri',
-        name='Plan',
-        overlay=False,
-        control=True
-    ).add_to(m)
-    
+@timed
+def process_mbtiles_overlay(mbtiles_path):
+    """Traite un fichier MBTiles pour l'overlay"""
+    if not PIL_AVAILABLE:
+        return None
     
+    try:
+        return render_mbtiles_overlay(mbtiles_path, os.path.getmtime(mbtiles_path), TIFF_OVERLAY_MAX_PIXELS)
+    except (sqlite3.DatabaseError, OSError, ValueError, ImportError) as e:
+        st.error(f"Erreur MBTiles: {e}")
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_tile_server():
+    """Serveur de tuiles local, partagé par toutes les sessions"""
+    return TileServer(host=TILE_SERVER_HOST, port=TILE_SERVER_PORT, public_url=TILE_SERVER_URL,
+                      cache_max_bytes=TILE_CACHE_MAX_MB * 1024 * 1024)
+
+def add_custom_tile_layer(m, tile):
+    """Ajoute une carte personnalisée (TIFF ou MBTiles) en couche de tuiles XYZ servies localement"""
+    try:
+        server = get_tile_server()
+        if tile['type'] == 'mbtiles':
+            source = server.add_mbtiles(tile['path'])
+        else:
+            source = server.add_tiff(tile['path'])
+    except Exception as e:
+        st.error(f"Erreur carte '{tile['name']}': {e}")
+        return
     
     folium.TileLayer(
-        tiles='https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}',
-        attr='Google',
-        name='Satellite (Google)',
-        overlay=False,
-        control=True
+        tiles=server.tile_url(source.source_id),
+        attr=tile['name'],
+        name=tile['name'],
+        overlay=True,
+        control=True,
+        opacity=0.7,
+        max_zoom=18,
+        min_native_zoom=source.min_zoom,
+        max_native_zoom=source.max_native_zoom,
+        bounds=source.bounds_latlon
     ).add_to(m)
-        
-    folium.TileLayer(
-        tiles='https://mt1.google.com/vt/lyrs=y&x={x}&y={y}&z={z}',
-        attr='Google',
-        name='Hybride (Google)',
-        overlay=False,
-        control=True
-    ).add_to(m)
-    
 
-    
-    # Ajouter un marqueur temporaire si une position a été cliquée
-    if 'clicked_position' in st.session_state and st.session_state.clicked_position:
-        folium.Marker(
-            st.session_state.clicked_position,
-            popup="📍 Position cliquée",
-            tooltip=f"Clic: {st.session_state.clicked_position[0]:.6f}, {st.session_state.clicked_position[1]:.6f}",
-            icon=folium.Icon(color='red', icon='star')
-        ).add_to(m)
-    
+def kind_extents(kind):
+    """Emprises des objets d'un type, depuis l'index d'emprise (sans parcourir les sommets)"""
+    objects = st.session_state[f"{kind}_data"]
+    if isinstance(objects, SQLiteObjectCollection):
+        # Emprise agrégée par la base depuis l'index R*Tree, sans relire les objets
+        return [objects.extent()]
+    index = st.session_state.object_extents[kind]
+    # Reconstruire l'index si la collection a été modifiée sans passer par add_objects/remove_object
+    if len(index) != len(objects):
+        index = {id(obj): (obj, object_extent(obj)) for obj in objects}
+        st.session_state.object_extents[kind] = index
+    return [extent for _, extent in index.values()]
+
+def map_extent():
+    """Emprise et centre de tous les objets"""
+    return merge_extents([extent for kind in OBJECT_KINDS for extent in kind_extents(kind)])
+
+def layer_tolerance(kind):
+    """Tolérance de simplification d'une couche : niveau de détail choisi, ou en automatique d'après
+    l'emprise de la couche seule (un objet ajouté à une autre couche ne l'invalide pas)"""
+    detail_zoom = MAP_DETAIL_LEVELS.get(st.session_state.map_detail_level)
+    if detail_zoom is None:
+        extent = merge_extents(kind_extents(kind))
+        if extent is None:
+            return 0.0
+        detail_zoom = min(bounds_fit_zoom(extent[0]), MAP_FIT_MAX_ZOOM) + MAP_DETAIL_ZOOM_MARGIN
+    return zoom_tolerance(detail_zoom_band(detail_zoom))
+
+def store_query_bounds(bounds):
+    """Emprise (sud, ouest, nord, est) lue dans la base pour une vue : élargie d'une demi-vue de chaque côté
+    et alignée sur une grille de pas puissance de 2 (un petit déplacement réutilise les couches en cache)"""
+    (south, west), (north, east) = bounds
+    span = max(north - south, east - west, 1e-6)
+    step = 2.0 ** math.ceil(math.log2(span))
+    return (max(-90.0, math.floor((south - span / 2) / step) * step),
+            max(-180.0, math.floor((west - span / 2) / step) * step),
+            min(90.0, math.ceil((north + span / 2) / step) * step),
+            min(180.0, math.ceil((east + span / 2) / step) * step))
+
+def get_map_layer(kind, builder, data, *options, query_bounds=None):
+    """Couche folium d'un type d'objet, reconstruite uniquement si sa révision ou ses options ont changé
+
+    Pour une collection de la base d'objets, seuls les objets qui intersectent `query_bounds` sont lus
+    (au plus STORE_MAP_MAX_OBJECTS) ; retourne (couche, vrai si des objets de la vue ont été omis).
+    """
+    store = isinstance(data, SQLiteObjectCollection)
+    cache_key = (data_revision(kind), query_bounds if store else None, options)
+    cached = st.session_state.map_layer_cache.get(kind)
+    if cached is None or cached[0] != cache_key:
+        truncated = False
+        if store:
+            data = data.query_bbox(*query_bounds, limit=STORE_MAP_MAX_OBJECTS) if query_bounds else []
+            truncated = len(data) >= STORE_MAP_MAX_OBJECTS
+        cached = (cache_key, builder(data, *options), truncated)
+        st.session_state.map_layer_cache[kind] = cached
+    return cached[1], cached[2]
+
+@timed
+def create_map():
+    # La carte de base est recréée à chaque fois (un folium.Map ne peut pas être rendu deux fois
+    # sans dupliquer ses scripts) ; les couches d'objets, coûteuses, viennent du cache
+    extent = map_extent()
+    if extent:
+        bounds, (center_lat, center_lon) = extent
+    else:
+        bounds, (center_lat, center_lon) = None, MAP_DEFAULT_CENTER
+    # Base d'objets : la carte reste sur la vue de l'utilisateur, dont seuls les objets sont chargés
+    view = st.session_state.map_view if OBJECT_STORE_PATH else None
+    if view:
+        m = create_base_map(*view['center'], zoom_start=view['zoom'], prefer_canvas=st.session_state.map_prefer_canvas)
+    else:
+        m = create_base_map(center_lat, center_lon, zoom_start=MAP_ZOOM_START,
+                            prefer_canvas=st.session_state.map_prefer_canvas)
+        if bounds:
+            m.fit_bounds(bounds, max_zoom=MAP_FIT_MAX_ZOOM)
+    query_bounds = None
+    if OBJECT_STORE_PATH and (view or bounds):
+        query_bounds = store_query_bounds(view['bounds'] if view else bounds)
+    cluster_threshold = st.session_state.map_cluster_threshold
 
-    
+    # Ajouter un marqueur temporaire si une position a été cliquée
+    if st.session_state.clicked_position:
+        build_clicked_marker(st.session_state.clicked_position).add_to(m)
 
-    
     # Ajouter les tuiles personnalisées
     for tile in st.session_state.custom_tiles:
-        if tile['type'] == 'tiff' and RASTERIO_AVAILABLE:
-            overlay_data = process_tiff_overlay(tile['path'])
+        if TILE_SERVER_ENABLED and (tile['type'] == 'mbtiles' or RASTERIO_AVAILABLE):
+            add_custom_tile_layer(m, tile)
+        else:
+            if tile['type'] == 'mbtiles':
+                overlay_data = process_mbtiles_overlay(tile['path'])
+            else:
+                overlay_data = process_tiff_overlay(tile['path'])
             if overlay_data:
                 folium.raster_layers.ImageOverlay(
                     image=overlay_data['image'],
@@ -1188,126 +994,32 @@ def create_map():
                     name=tile['name'],
                     show=True
                 ).add_to(m)
-    
-    # Ajouter le contrôle des couches (toujours présent maintenant)
-    folium.LayerControl().add_to(m)
-    
+
     # Ajouter les points de référence si activés
     if st.session_state.show_reference:
-        for point in st.session_state.reference_data['points']:
-            folium.Marker(
-                [point['lat'], point['lon']],
-                popup=f"📍 REF: {point['name']}",
-                tooltip=f"Référence: {point['name']}",
-                icon=folium.Icon(color='blue', icon='star')
-            ).add_to(m)
-    
-    # Ajouter les points utilisateur
-    for point in st.session_state.points_data:
-        folium.Marker(
-            [point['lat'], point['lon']],
-            popup=point['name'],
-            tooltip=f"{point['name']}: {point['lat']:.4f}, {point['lon']:.4f}"
-        ).add_to(m)
-    
-    # Ajouter les lignes
-    color_mapping = {
-        'rouge': 'red', 'vert': 'green', 'bleu': 'blue', 'jaune': 'yellow',
-        'orange': 'orange', 'cyan': 'cyan', 'magenta': 'magenta', 'noir': 'black', 'blanc': 'white'
-    }
-    
-    for line in st.session_state.lines_data:
-        coords = [[lat, lon] for lon, lat in line['points']]
-        line_color = color_mapping.get(line.get('color', 'rouge'), 'red')
-        folium.PolyLine(
-            coords,
-            color=line_color,
-            weight=line.get('width', 2),
-            popup=line['name'],
-            tooltip=f"Ligne: {line['name']}"
-        ).add_to(m)
-    
-    # Ajouter les cercles
-    for circle in st.session_state.circles_data:
-        if 'points' in circle:
-            coords = [[lat, lon] for lon, lat in circle['points']]
-            circle_color = color_mapping.get(circle.get('color', 'rouge'), 'red')
-            
-            # Utiliser PolyLine pour les arcs ouverts, Polygon pour les arcs fermés et cercles
-            if circle.get('type') == 'Arc' and not circle.get('close_arc', True):
-                folium.PolyLine(
-                    coords,
-                    color=circle_color,
-                    weight=circle.get('width', 2),
-                    popup=circle['name']
-                ).add_to(m)
-            else:
-                folium.Polygon(
-                    coords,
-                    color=circle_color,
-                    weight=circle.get('width', 2),
-                    fill=circle.get('fill', False),
-                    popup=circle['name']
-                ).add_to(m)
-    
-    # Ajouter les rectangles
-    for rect in st.session_state.rectangles_data:
-        if 'points' in rect:
-            coords = [[lat, lon] for lon, lat in rect['points']]
-            rect_color = color_mapping.get(rect.get('color', 'rouge'), 'red')
-            folium.Polygon(
-                coords,
-                color=rect_color,
-                weight=rect.get('width', 2),
-                fill=rect.get('fill', False),
-                popup=rect['name']
-            ).add_to(m)
-            
-            # Ajouter la flèche d'orientation si demandée
-            if rect.get('add_arrow', False) and 'center_lat' in rect and 'bearing_deg' in rect:
-                center_lat = rect['center_lat']
-                center_lon = rect['center_lon']
-                bearing = rect['bearing_deg']
-                length_km = rect.get('length_km', 0.001)
-                width_km = rect.get('width_km', 0.001)
-                
-                R = 6371.0
-                bearing_rad = math.radians(bearing)
-                lat_rad = math.radians(center_lat)
-                lon_rad = math.radians(center_lon)
-                
-                # Point de départ : milieu du côté avant (orienté vers le cap)
-                front_offset_km = length_km / 2
-                arrow_start_lat_rad = math.asin(math.sin(lat_rad) * math.cos(front_offset_km / R) +
-                                              math.cos(lat_rad) * math.sin(front_offset_km / R) * math.cos(bearing_rad))
-                
-                arrow_start_lon_rad = lon_rad + math.atan2(math.sin(bearing_rad) * math.sin(front_offset_km / R) * math.cos(lat_rad),
-                                                         math.cos(front_offset_km / R) - math.sin(lat_rad) * math.sin(arrow_start_lat_rad))
-                
-                arrow_start_lat = math.degrees(arrow_start_lat_rad)
-                arrow_start_lon = math.degrees(arrow_start_lon_rad)
-                
-                # Point de fin de la flèche (longueur = moitié de la largeur)
-                arrow_length_km = width_km / 2
-                arrow_end_lat_rad = math.asin(math.sin(math.radians(arrow_start_lat)) * math.cos(arrow_length_km / R) +
-                                            math.cos(math.radians(arrow_start_lat)) * math.sin(arrow_length_km / R) * math.cos(bearing_rad))
-                
-                arrow_end_lon_rad = math.radians(arrow_start_lon) + math.atan2(math.sin(bearing_rad) * math.sin(arrow_length_km / R) * math.cos(math.radians(arrow_start_lat)),
-                                                                             math.cos(arrow_length_km / R) - math.sin(math.radians(arrow_start_lat)) * math.sin(arrow_end_lat_rad))
-                
-                arrow_end_lat = math.degrees(arrow_end_lat_rad)
-                arrow_end_lon = math.degrees(arrow_end_lon_rad)
-                
-                # Dessiner la flèche
-                folium.PolyLine(
-                    [[arrow_start_lat, arrow_start_lon], [arrow_end_lat, arrow_end_lon]],
-                    color=rect_color,
-                    weight=rect.get('width', 2),
-                    popup=f"Orientation {rect['name']}: {bearing}°"
-                ).add_to(m)
-                
+        get_map_layer('reference', build_reference_layer, st.session_state.reference_data['points'], cluster_threshold)[0].add_to(m)
+
+    # Ajouter les objets utilisateur (une couche par type) ; lignes et contours simplifiés selon le niveau
+    # de détail (affichage uniquement)
+    layers = [
+        ('points', build_points_layer, cluster_threshold),
+        ('lines', build_lines_layer, layer_tolerance('lines')),
+        ('circles', build_circles_layer, layer_tolerance('circles')),
+        ('rectangles', build_rectangles_layer, layer_tolerance('rectangles')),
+    ]
+    truncated = []
+    for kind, builder, option in layers:
+        layer, omitted = get_map_layer(kind, builder, st.session_state[f"{kind}_data"], option, query_bounds=query_bounds)
+        layer.add_to(m)
+        if omitted:
+            truncated.append(OBJECT_KIND_LABELS[kind])
+    if truncated:
+        st.caption(f"Affichage limité à {STORE_MAP_MAX_OBJECTS} objets par type dans la vue "
+                   f"({', '.join(truncated)}) : zoomez pour voir les autres.")
+
+    # Le contrôle des couches doit être ajouté en dernier pour lister toutes les couches
+    folium.LayerControl().add_to(m)
 
-    
     return m
 
 # Interface principale adaptative
@@ -1356,10 +1068,7 @@ with tab1:
                     
                     if st.button("✅ Importer le KML", key="main_import", use_container_width=True):
                         if import_mode == "Remplacer toutes les données":
-                            st.session_state.points_data = []
-                            st.session_state.lines_data = []
-                            st.session_state.circles_data = []
-                            st.session_state.rectangles_data = []
+                            clear_objects('points', 'lines', 'circles', 'rectangles')
                         
                         load_kml_data(points, lines, polygons)
                         st.success(f"KML importé avec succès! ({len(points + lines + polygons)} objets)")
@@ -1367,6 +1076,46 @@ with tab1:
                 else:
                     st.warning("Aucun objet valide trouvé dans le fichier KML")
     
+    # Section Projet : sauvegarde complète (rayons, segments, caps, flèches...) sans recalcul au chargement
+    with st.expander("💾 Projet (sauvegarde complète de la session)"):
+        col_load, col_save = st.columns(2)
+        
+        with col_load:
+            uploaded_project = st.file_uploader("Ouvrir un projet", type=[PROJECT_EXTENSION, 'zip'], key="project_upload")
+            if uploaded_project is not None:
+                project_mode = st.radio(
+                    "Mode d'ouverture:",
+                    ["Remplacer toutes les données", "Ajouter aux données existantes"],
+                    key="project_mode"
+                )
+                if st.button("📂 Ouvrir le projet", key="project_open", use_container_width=True):
+                    try:
+                        project = load_project(uploaded_project.getvalue())
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        if project_mode == "Remplacer toutes les données":
+                            clear_objects(*OBJECT_KINDS)
+                        for kind in OBJECT_KINDS:
+                            add_objects(kind, project.get(kind, []))
+                        st.session_state.current_line_points = []
+                        st.session_state.current_polygon_points = []
+                        st.success(f"Projet ouvert ({sum(len(objs) for objs in project.values())} objets)")
+                        st.rerun()
+        
+        with col_save:
+            project_name = st.text_input("Nom du projet", value="projet_sdvfr", key="project_name")
+            if st.button("💾 Générer le projet", key="project_save", use_container_width=True,
+                         disabled=not any(st.session_state[f"{kind}_data"] for kind in OBJECT_KINDS)):
+                project_bytes = save_project({kind: st.session_state[f"{kind}_data"] for kind in OBJECT_KINDS})
+                st.download_button(
+                    label="💾 Télécharger le projet",
+                    data=project_bytes,
+                    file_name=f"{project_name or 'projet_sdvfr'}.{PROJECT_EXTENSION}",
+                    mime="application/zip",
+                    use_container_width=True
+                )
+    
     st.markdown("---")
     
     # Section Export
@@ -1413,8 +1162,7 @@ with tab1:
                 if st.button("📥 Générer KML", use_container_width=True, key="export_kml"):
                     clean_filename = filename.replace('.kml', '') if filename else "export_sdvfr"
                     
-                    kml = generate_kml()
-                    kml_str = kml.kml()
+                    kml_str = export_kml_text(**session_objects(), workers=EXPORT_WORKERS)
                     st.download_button(
                         label="💾 Télécharger KML",
                         data=kml_str,
@@ -1438,13 +1186,11 @@ with tab1:
                     clean_filename = filename.replace('.kml', '') if filename else "export_sdvfr"
                     
                     try:
-                        geojson_data = generate_geojson()
+                        geojson_str, feature_count = export_geojson_text(**session_objects(), workers=EXPORT_WORKERS)
                         
-                        if not geojson_data['features']:
+                        if not feature_count:
                             st.warning("⚠️ Aucune donnée à convertir")
                         else:
-                            geojson_str = json.dumps(geojson_data, indent=2, ensure_ascii=False)
-                            
                             st.download_button(
                                 label="💾 Télécharger GeoJSON",
                                 data=geojson_str,
@@ -1452,7 +1198,7 @@ with tab1:
                                 mime="application/geo+json",
                                 use_container_width=True
                             )
-                            st.success(f"✅ GeoJSON généré! ({len(geojson_data['features'])} objets)")
+                            st.success(f"✅ GeoJSON généré! ({feature_count} objets)")
                             
                     except Exception as e:
                         st.error(f"❌ Erreur: {str(e)}")
@@ -1484,12 +1230,12 @@ with tab1:
                         if mode == "Fichier unique":
                             with st.spinner("Conversion..."):
                                 try:
-                                    geojson_data = generate_geojson_for_tippecanoe()
+                                    geojson_data = export_geojson_for_tippecanoe(**session_objects(), workers=EXPORT_WORKERS)
                                     
                                     if not geojson_data['features']:
                                         st.warning("⚠️ Aucune donnée")
                                     else:
-                                        mbtiles_data = convert_geojson_minimal(geojson_data, name=clean_filename)
+                                        mbtiles_data = convert_geojson_minimal(geojson_data, name=clean_filename, api_url=get_api_url(), timeout=API_TIMEOUT)
                                         
                                         st.download_button(
                                             label="💾 Télécharger MBTiles",
@@ -1506,7 +1252,7 @@ with tab1:
                         else:  # Par couleur
                             with st.spinner("Génération par couleur..."):
                                 try:
-                                    colors_data = group_objects_by_color()
+                                    colors_data = export_groups_by_color(**session_objects(), workers=EXPORT_WORKERS)
                                     
                                     if not colors_data:
                                         st.warning("⚠️ Aucune donnée")
@@ -1515,7 +1261,7 @@ with tab1:
                                         
                                         for color, geojson_data in colors_data.items():
                                             if geojson_data['features']:
-                                                mbtiles_data = convert_geojson_minimal(geojson_data, name=f"{clean_filename}_{color}")
+                                                mbtiles_data = convert_geojson_minimal(geojson_data, name=f"{clean_filename}_{color}", api_url=get_api_url(), timeout=API_TIMEOUT)
                                                 st.session_state.generated_mbtiles[color] = {
                                                     'data': mbtiles_data,
                                                     'filename': f"{clean_filename}_{color}.mbtiles",
@@ -1563,54 +1309,9 @@ with tab1:
         st.markdown("---")
         st.subheader("👁️ Aperçu des données")
         
-        # Créer un DataFrame avec tous les objets
-        all_objects = []
-        
-        for point in st.session_state.points_data:
-            all_objects.append({
-                "Type": "📍 Point",
-                "Nom": point['name'],
-                "Détails": f"Lat: {point['lat']:.4f}, Lon: {point['lon']:.4f}",
-                "Description": point.get('description', '')
-            })
-        
-        for line in st.session_state.lines_data:
-            all_objects.append({
-                "Type": "📏 Ligne",
-                "Nom": line['name'],
-                "Détails": f"{len(line['points'])} points, {line['color']}",
-                "Description": line.get('description', '')
-            })
-        
-        for circle in st.session_state.circles_data:
-            radius_display = circle['radius_km'] / 1.852 if circle['radius_unit'] == 'nautiques' else circle['radius_km'] * 1000
-            unit_display = "NM" if circle['radius_unit'] == 'nautiques' else "m"
-            all_objects.append({
-                "Type": "⭕ Cercle/Arc",
-                "Nom": circle['name'],
-                "Détails": f"R={radius_display:.2f}{unit_display}, {circle['color']}",
-                "Description": circle.get('description', '')
-            })
-        
-        for rect in st.session_state.rectangles_data:
-            if 'length_km' in rect:
-                all_objects.append({
-                    "Type": "🔷 Rectangle",
-                    "Nom": rect['name'],
-                    "Détails": f"{rect['length_km']*1000:.0f}m x {rect['width_km']*1000:.0f}m",
-                    "Description": rect.get('description', '')
-                })
-            else:
-                all_objects.append({
-                    "Type": "🔷 Polygone",
-                    "Nom": rect['name'],
-                    "Détails": f"{len(rect['points'])} points",
-                    "Description": rect.get('description', '')
-                })
-        
-        if all_objects:
-            df = pd.DataFrame(all_objects)
-            st.dataframe(df, use_container_width=True, hide_index=True)
+        # Aperçu mis en cache par révision des données : un rerun ne fait que l'afficher
+        st.dataframe(get_preview_frame(), use_container_width=True, hide_index=True)
+        store_table_caption(*OBJECT_KINDS)
     
     # Informations et aide
     st.markdown("---")
@@ -1793,11 +1494,11 @@ with tab2:
             if lon_dir == 'W': lon = -lon
         
         if st.button("➕ Ajouter Point", use_container_width=True):
-            if point_name and not any(p['name'] == point_name for p in st.session_state.points_data):
+            if point_name and not st.session_state.points_data.has_name(point_name):
                 try:
                     if coord_format == "Calamar":
                         lat, lon = convert_calamar_to_gps(x_val, y_val, x_unit, y_unit)
-                    st.session_state.points_data.append({
+                    add_object('points', {
                         "type": "Point", "name": point_name, "lat": lat, "lon": lon, "description": ""
                     })
                     st.success(f"Point '{point_name}' ajouté!")
@@ -1813,6 +1514,8 @@ with tab2:
         # Charger la base de données si nécessaire
         if st.session_state.nav_database is None:
             st.session_state.nav_database = load_nav_database()
+        if st.session_state.nav_search_index is None:
+            st.session_state.nav_search_index = NavSearchIndex(st.session_state.nav_database)
         
         # Sélection du type de point de départ
         point_source = st.radio("Point de départ", ["Points créés", "Base aéronautique"], key="point_source_type")
@@ -1821,33 +1524,32 @@ with tab2:
             if st.session_state.points_data:
                 start_point_name = st.selectbox("Point de départ", 
                                               [p['name'] for p in st.session_state.points_data], key="manual_start_point")
-                start_point = next(p for p in st.session_state.points_data if p['name'] == start_point_name)
+                start_point = st.session_state.points_data.get(start_point_name)
                 start_lat, start_lon = start_point['lat'], start_point['lon']
             else:
                 st.info("Créez d'abord un point manuel")
                 start_lat, start_lon = None, None
         else:
             # Filtrage par type
-            nav_types = list(set([data['type'] for data in st.session_state.nav_database.values()]))
+            nav_index = st.session_state.nav_search_index
+            nav_types = sorted(set(nav_index.types))
             selected_type = st.selectbox("Type de point", ["Tous"] + nav_types, key="nav_type_filter")
             
-            # Filtrer les points selon le type
-            if selected_type == "Tous":
-                filtered_points = st.session_state.nav_database
-            else:
-                filtered_points = {name: data for name, data in st.session_state.nav_database.items() 
-                                 if data['type'] == selected_type}
+            # Recherche : seule une courte liste de candidats est envoyée au navigateur
+            nav_query = st.text_input("Rechercher (OACI, IATA ou nom)", placeholder="LFSB, BSL, Bâle...", key="nav_search_query")
+            candidates = nav_index.search(nav_query, limit=NAV_SEARCH_LIMIT,
+                                          type_filter=None if selected_type == "Tous" else selected_type)
             
-            if filtered_points:
+            if candidates:
                 start_point_name = st.selectbox("Point aéronautique", 
-                                              list(filtered_points.keys()), key="nav_start_point")
-                nav_point = filtered_points[start_point_name]
+                                              candidates, key="nav_start_point")
+                nav_point = st.session_state.nav_database[start_point_name]
                 start_lat, start_lon = nav_point['lat'], nav_point['lon']
                 
                 # Afficher les infos du point sélectionné
                 st.info(f"📍 **{start_point_name}** - {nav_point['type']} - Freq: {nav_point['freq']}")
             else:
-                st.warning("Aucun point de ce type")
+                st.warning("Aucun point correspondant")
                 start_lat, start_lon = None, None
         
         if start_lat is not None and start_lon is not None:
@@ -1861,14 +1563,14 @@ with tab2:
                 bearing_deg = st.number_input("Gisement (degrés)", value=0.0, min_value=0.0, max_value=359.9, key="points_bearing")
             
             if st.button("🎯 Créer Point", use_container_width=True):
-                if new_point_name and not any(p['name'] == new_point_name for p in st.session_state.points_data):
+                if new_point_name and not st.session_state.points_data.has_name(new_point_name):
                     distance_km = distance_val * 1.852 if distance_unit == "nautiques" else distance_val / 1000
                     
                     new_lat, new_lon = create_point_from_bearing_distance(
                         {"lat": start_lat, "lon": start_lon}, distance_km, bearing_deg
                     )
                     
-                    st.session_state.points_data.append({
+                    add_object('points', {
                         "type": "Point", "name": new_point_name, "lat": new_lat, "lon": new_lon,
                         "description": f"Généré depuis {start_point_name}"
                     })
@@ -1899,45 +1601,42 @@ with tab2:
                 
                 # Mapping des colonnes
                 st.write("**Correspondance des colonnes:**")
+                mass_format = st.selectbox("Format des coordonnées", COORD_FORMATS, key="mass_coord_format")
+                is_calamar = mass_format == "Calamar"
                 col_name = st.selectbox("Colonne nom", df.columns, key="mass_col_name")
-                col_lat = st.selectbox("Colonne latitude", df.columns, key="mass_col_lat")
-                col_lon = st.selectbox("Colonne longitude", df.columns, key="mass_col_lon")
+                col_lat = st.selectbox("Colonne axe Y (mL/mC)" if is_calamar else "Colonne latitude", df.columns, key="mass_col_lat")
+                col_lon = st.selectbox("Colonne axe X (mD/mG)" if is_calamar else "Colonne longitude", df.columns, key="mass_col_lon")
                 
                 # Colonne description optionnelle
                 col_desc = st.selectbox("Colonne description (optionnel)", [""] + list(df.columns), key="mass_col_desc")
                 
                 if st.button("📥 Importer tous les points", use_container_width=True):
-                    imported_count = 0
-                    errors = []
-                    
-                    for idx, row in df.iterrows():
-                        try:
-                            name = str(row[col_name]).strip()
-                            lat = float(row[col_lat])
-                            lon = float(row[col_lon])
-                            desc = str(row[col_desc]).strip() if col_desc and col_desc in row else ""
-                            
-                            # Vérifier si le point existe déjà
-                            if not any(p['name'] == name for p in st.session_state.points_data):
-                                st.session_state.points_data.append({
-                                    "type": "Point", "name": name, "lat": lat, "lon": lon, 
-                                    "description": desc
-                                })
-                                imported_count += 1
-                            else:
-                                errors.append(f"Point '{name}' existe déjà")
-                        except Exception as e:
-                            errors.append(f"Ligne {idx+1}: {str(e)}")
+                    new_points, rejected = parse_points_frame(
+                        df, col_name, col_lat, col_lon, col_desc or None, mass_format,
+                        existing_names=st.session_state.points_data.names(),
+                        calamar_converter=convert_calamar_to_gps
+                    )
+                    add_objects('points', new_points)
+                    st.session_state.mass_import_result = (len(new_points), rejected)
                     
+                    if new_points:
+                        st.rerun()
+                
+                # Résultat du dernier import (conservé après le rerun)
+                if st.session_state.mass_import_result:
+                    imported_count, rejected = st.session_state.mass_import_result
                     if imported_count > 0:
                         st.success(f"✅ {imported_count} points importés!")
-                    if errors:
-                        st.warning(f"⚠️ {len(errors)} erreurs:")
-                        for error in errors[:5]:  # Afficher max 5 erreurs
-                            st.caption(f"• {error}")
-                    
-                    if imported_count > 0:
-                        st.rerun()
+                    if not rejected.empty:
+                        st.warning(f"⚠️ {len(rejected)} lignes rejetées:")
+                        st.dataframe(rejected, use_container_width=True)
+                        st.download_button(
+                            "📥 Télécharger les lignes rejetées (CSV)",
+                            data=rejected.to_csv(index=False).encode('utf-8'),
+                            file_name="lignes_rejetees.csv",
+                            mime="text/csv",
+                            key="mass_import_rejected_download"
+                        )
                         
             except Exception as e:
                 st.error(f"Erreur lors de la lecture du fichier: {e}")
@@ -1946,14 +1645,14 @@ with tab2:
     if st.session_state.points_data:
         st.markdown("---")
         st.subheader("Points existants")
-        df_points = pd.DataFrame(st.session_state.points_data)
-        st.dataframe(df_points[['name', 'lat', 'lon', 'description']], use_container_width=True)
+        st.dataframe(get_points_frame(), use_container_width=True, hide_index=True)
+        store_table_caption('points')
         
         # Suppression de points
         point_to_delete = st.selectbox("Supprimer un point", 
                                      [""] + [p['name'] for p in st.session_state.points_data], key="points_delete_select")
         if point_to_delete and st.button("🗑️ Supprimer"):
-            st.session_state.points_data = [p for p in st.session_state.points_data if p['name'] != point_to_delete]
+            remove_objects_named('points', point_to_delete)
             st.success(f"Point '{point_to_delete}' supprimé!")
             st.rerun()
 
@@ -1989,6 +1688,8 @@ with tab3:
                                     ["rouge", "vert", "bleu", "jaune", "orange", "cyan", "magenta", "noir", "blanc"], key="line_color")
         with col_style2:
             line_width = st.number_input("Épaisseur", value=5, min_value=1, max_value=20, key="line_width")
+        line_geodesic = st.checkbox("🌐 Tracé géodésique (grand cercle)", value=True, key="line_geodesic",
+                                    help="Sommets intermédiaires le long de la géodésique entre les points (KML, GeoJSON et carte)")
         
         # Affichage des points de la ligne
         if st.session_state.current_line_points:
@@ -2016,11 +1717,11 @@ with tab3:
         
         if st.button("📏 Générer Ligne", use_container_width=True):
             if line_name and len(st.session_state.current_line_points) >= 2:
-                if not any(l['name'] == line_name for l in st.session_state.lines_data):
-                    line_coords = [(p["lon"], p["lat"]) for p in st.session_state.current_line_points]
-                    st.session_state.lines_data.append({
-                        "type": "Ligne", "name": line_name, "points": line_coords,
-                        "description": "", "color": line_color, "width": line_width
+                if not st.session_state.lines_data.has_name(line_name):
+                    line_points = [(p["lon"], p["lat"]) for p in st.session_state.current_line_points]
+                    add_object('lines', {
+                        "type": "Ligne", "name": line_name, "points": line_points,
+                        "description": "", "color": line_color, "width": line_width, "geodesic": line_geodesic
                     })
                     st.session_state.current_line_points = []
                     st.success(f"Ligne '{line_name}' générée!")
@@ -2040,14 +1741,26 @@ with tab3:
         
 
     
+    # Analyse des routes : distance, route vraie et temps de vol estimé de chaque ligne
+    if st.session_state.lines_data:
+        st.subheader("Analyse des routes")
+        ground_speed = st.number_input("Vitesse sol (kt)", value=100, min_value=1, max_value=1000, key="route_ground_speed")
+        st.dataframe(get_routes_frame(ground_speed), hide_index=True, use_container_width=True)
+    
     # Liste des lignes existantes
     if st.session_state.lines_data:
         st.subheader("Lignes existantes")
         for i, line in enumerate(st.session_state.lines_data):
             with st.expander(f"📏 {line['name']}"):
                 st.write(f"Points: {len(line['points'])}, Couleur: {line['color']}, Largeur: {line['width']}")
+                if line.get('geodesic'):
+                    st.caption(f"🌐 Tracé géodésique : {len(line_coords(line))} sommets")
+                if len(line['points']) >= 2:
+                    st.dataframe(get_route_legs_frame(line, ground_speed), hide_index=True, use_container_width=True)
+                    if len(line['points']) - 1 > ROUTE_LEGS_DISPLAY_MAX:
+                        st.caption(f"{ROUTE_LEGS_DISPLAY_MAX} premiers tronçons affichés sur {len(line['points']) - 1}")
                 if st.button(f"🗑️ Supprimer {line['name']}", key=f"del_line_list_{i}"):
-                    st.session_state.lines_data.remove(line)
+                    remove_object('lines', line)
                     st.rerun()
 
 # ONGLET CERCLES/ARCS
@@ -2064,7 +1777,7 @@ with tab4:
             if use_existing:
                 center_point_name = st.selectbox("Point centre", 
                                                 [p['name'] for p in st.session_state.points_data], key="circle_center_point")
-                center_point = next(p for p in st.session_state.points_data if p['name'] == center_point_name)
+                center_point = st.session_state.points_data.get(center_point_name)
                 center_lat, center_lon = center_point['lat'], center_point['lon']
             else:
                 coord_format_circle = st.selectbox("Format coordonnées centre", 
@@ -2316,7 +2029,7 @@ with tab4:
                     circle_data["end_angle"] = end_angle
                     circle_data["close_arc"] = close_arc_param
                 
-                st.session_state.circles_data.append(circle_data)
+                add_object('circles', circle_data)
                 st.success(f"{circle_type} '{circle_name}' généré!")
                 st.rerun()
             else:
@@ -2332,7 +2045,7 @@ with tab4:
                 st.write(f"Centre: ({circle['center_lat']:.4f}, {circle['center_lon']:.4f})")
                 st.write(f"Rayon: {radius_display:.2f}{unit_display}, Couleur: {circle['color']}")
                 if st.button(f"🗑️ Supprimer {circle['name']}", key=f"del_circle_list_{i}"):
-                    st.session_state.circles_data.remove(circle)
+                    remove_object('circles', circle)
                     st.rerun()
 
 # ONGLET POLYGONES
@@ -2399,11 +2112,11 @@ with tab5:
             
             if st.button("🔷 Générer Polygone", use_container_width=True):
                 if polygon_name and len(st.session_state.current_polygon_points) >= 3:
-                    if not any(r['name'] == polygon_name for r in st.session_state.rectangles_data):
+                    if not st.session_state.rectangles_data.has_name(polygon_name):
                         polygon_coords = [(p["lon"], p["lat"]) for p in st.session_state.current_polygon_points]
                         polygon_coords.append(polygon_coords[0])  # Fermer le polygone
                         
-                        st.session_state.rectangles_data.append({
+                        add_object('rectangles', {
                             "type": "Polygone", "name": polygon_name, "points": polygon_coords,
                             "description": "", "color": polygon_color, "width": polygon_width, "fill": fill_polygon
                         })
@@ -2433,7 +2146,7 @@ with tab5:
                 if use_existing_rect:
                     rect_center_name = st.selectbox("Point centre", 
                                                    [p['name'] for p in st.session_state.points_data], key="rect_center")
-                    rect_center = next(p for p in st.session_state.points_data if p['name'] == rect_center_name)
+                    rect_center = st.session_state.points_data.get(rect_center_name)
                     rect_center_lat, rect_center_lon = rect_center['lat'], rect_center['lon']
                 else:
                     coord_format_rect = st.selectbox("Format coordonnées centre", 
@@ -2663,7 +2376,7 @@ with tab5:
                                 "fill": fill_rect, "add_arrow": add_arrow
                             }
                             
-                            st.session_state.rectangles_data.append(rect_data)
+                            add_object('rectangles', rect_data)
                             st.success(f"Rectangle '{rect_name}' généré!")
                             st.rerun()
                     except Exception as e:
@@ -2682,7 +2395,7 @@ with tab5:
                 else:
                     st.write(f"Polygone - {len(rect['points'])} points")
                 if st.button(f"🗑️ Supprimer {rect['name']}", key=f"del_rect_list_{i}"):
-                    st.session_state.rectangles_data.remove(rect)
+                    remove_object('rectangles', rect)
                     st.rerun()
 
 # ONGLET DIVERS  
@@ -2789,8 +2502,8 @@ with tab6:
             point_b = st.selectbox("Point B", [p['name'] for p in st.session_state.points_data], key="calc_point_b")
         
         if st.button("📐 Calculer") and point_a != point_b:
-            p_a = next(p for p in st.session_state.points_data if p['name'] == point_a)
-            p_b = next(p for p in st.session_state.points_data if p['name'] == point_b)
+            p_a = st.session_state.points_data.get(point_a)
+            p_b = st.session_state.points_data.get(point_b)
             
             distance_m = calculate_distance(p_a['lat'], p_a['lon'], p_b['lat'], p_b['lon'])
             distance_km = distance_m / 1000
@@ -2825,34 +2538,68 @@ with tab7:
         with st.spinner("📱 Chargement optimisé pour mobile..."):
             load_reference_kml()
     
-    # Message informatif
-    st.info("💡 **Astuce :** Cliquez directement sur la carte pour créer un point à l'endroit souhaité !")
-    
-    # Créer et afficher la carte avec optimisations mobiles
-    m = create_map()
-    
-    # Afficher la carte avec paramètres adaptés
-    map_height = 500
-    
-    map_data = st_folium(
-        m, 
-        use_container_width=True, 
-        height=map_height,
-        returned_objects=["last_clicked"],
-        key="main_map"
-    )
+    # La carte n'est construite que si elle est affichée (st.tabs exécute tous les onglets à chaque rerun) ;
+    # masquée par défaut pour que folium, streamlit_folium et pandas ne soient pas chargés au premier rendu
+    st.toggle("🗺️ Afficher la carte", key="show_map")
+    
+    if not st.session_state.show_map:
+        st.caption("Activez l'affichage pour charger la carte et créer des points par clic.")
+    
+    if st.session_state.show_map:
+        with st.expander("⚙️ Options d'affichage"):
+            st.number_input("Regrouper les points au-delà de", min_value=0, step=100,
+                            key="map_cluster_threshold",
+                            help="Au-delà de ce nombre, les points sont regroupés en clusters")
+            st.checkbox("Rendu canvas des lignes et polygones", key="map_prefer_canvas",
+                        help="Plus fluide avec de nombreux objets")
+            st.selectbox("Niveau de détail des géométries", list(MAP_DETAIL_LEVELS), key="map_detail_level",
+                         help="Simplifie les lignes, cercles et polygones affichés (l'export KML n'est pas modifié)")
+    
+        # Message informatif
+        st.info("💡 **Astuce :** Cliquez directement sur la carte pour créer un point à l'endroit souhaité !")
+    
+        # Créer et afficher la carte avec optimisations mobiles
+        from streamlit_folium import st_folium
+        m = create_map()
+    
+        # Afficher la carte avec paramètres adaptés
+        map_height = 500
+    
+        with timer("st_folium"):
+            map_data = st_folium(
+                m, 
+                use_container_width=True, 
+                height=map_height,
+                returned_objects=["last_clicked", "bounds", "center", "zoom"] if OBJECT_STORE_PATH else ["last_clicked"],
+                key="main_map"
+            )
+    
+        # Base d'objets : recharger les objets quand la vue sort de l'emprise déjà lue
+        if OBJECT_STORE_PATH and map_data.get('bounds') and map_data.get('center') and map_data.get('zoom') is not None:
+            view_bounds = map_data['bounds']
+            if view_bounds.get('_southWest') and view_bounds.get('_northEast'):
+                south_west, north_east = view_bounds['_southWest'], view_bounds['_northEast']
+                previous_view = st.session_state.map_view
+                st.session_state.map_view = {
+                    'bounds': [[south_west['lat'], south_west['lng']], [north_east['lat'], north_east['lng']]],
+                    'center': (map_data['center']['lat'], map_data['center']['lng']),
+                    'zoom': map_data['zoom'],
+                }
+                if previous_view is None or (store_query_bounds(previous_view['bounds'])
+                                             != store_query_bounds(st.session_state.map_view['bounds'])):
+                    st.rerun()
     
-    # Gestion du clic sur la carte
-    if map_data['last_clicked'] is not None:
-        clicked_lat = map_data['last_clicked']['lat']
-        clicked_lon = map_data['last_clicked']['lng']
-        
-        # Vérifier si c'est un nouveau clic
-        if 'clicked_position' not in st.session_state or st.session_state.clicked_position != [clicked_lat, clicked_lon]:
-            # Sauvegarder la position cliquée dans la session
-            st.session_state.clicked_position = [clicked_lat, clicked_lon]
-            # Forcer la mise à jour pour afficher le marqueur
-            st.rerun()
+        # Gestion du clic sur la carte
+        if map_data['last_clicked'] is not None:
+            clicked_lat = map_data['last_clicked']['lat']
+            clicked_lon = map_data['last_clicked']['lng']
+        
+            # Vérifier si c'est un nouveau clic
+            if 'clicked_position' not in st.session_state or st.session_state.clicked_position != [clicked_lat, clicked_lon]:
+                # Sauvegarder la position cliquée dans la session
+                st.session_state.clicked_position = [clicked_lat, clicked_lon]
+                # Forcer la mise à jour pour afficher le marqueur
+                st.rerun()
     
     # Afficher le formulaire si une position est sélectionnée
     if st.session_state.clicked_position is not None:
@@ -2869,8 +2616,8 @@ with tab7:
         col1, col2 = st.columns([1, 1])
         with col1:
             if st.button("➕ Créer point depuis clic", use_container_width=True, key="create_point_btn"):
-                if point_name_click and not any(p['name'] == point_name_click for p in st.session_state.points_data):
-                    st.session_state.points_data.append({
+                if point_name_click and not st.session_state.points_data.has_name(point_name_click):
+                    add_object('points', {
                         "type": "Point", "name": point_name_click, 
                         "lat": clicked_lat, "lon": clicked_lon, 
                         "description": "Créé depuis la carte"
@@ -2891,64 +2638,68 @@ with tab7:
         
         st.markdown("---")
     
-    # Gestion des objets KML
+    # Gestion des objets KML (tableau paginé : nombre de widgets constant quel que soit le nombre d'objets)
     if any([st.session_state.points_data, st.session_state.lines_data, st.session_state.circles_data, st.session_state.rectangles_data]):
         st.markdown("---")
         st.subheader("🛠️ Gestion des objets KML")
         
-        # Points
-        if st.session_state.points_data:
-            st.write(f"**📍 Points ({len(st.session_state.points_data)})**")
-            for i, point in enumerate(st.session_state.points_data):
-                col_info, col_action = st.columns([4, 1])
-                with col_info:
-                    st.write(f"**{point['name']}**: {point['lat']:.4f}, {point['lon']:.4f}")
-                with col_action:
-                    if st.button("🗑️", key=f"del_point_viz_{i}"):
-                        st.session_state.points_data.remove(point)
-                        st.rerun()
-        
-        # Lignes
-        if st.session_state.lines_data:
-            st.write(f"**📏 Lignes ({len(st.session_state.lines_data)})**")
-            for i, line in enumerate(st.session_state.lines_data):
-                col_info, col_action = st.columns([4, 1])
-                with col_info:
-                    st.write(f"**{line['name']}**: {len(line['points'])} points, {line['color']}")
-                with col_action:
-                    if st.button("🗑️", key=f"del_line_viz_{i}"):
-                        st.session_state.lines_data.remove(line)
-                        st.rerun()
-        
-        # Cercles
-        if st.session_state.circles_data:
-            st.write(f"**⭕ Cercles/Arcs ({len(st.session_state.circles_data)})**")
-            for i, circle in enumerate(st.session_state.circles_data):
-                radius_display = circle['radius_km'] / 1.852 if circle['radius_unit'] == 'nautiques' else circle['radius_km'] * 1000
-                unit_display = "NM" if circle['radius_unit'] == 'nautiques' else "m"
-                
-                col_info, col_action = st.columns([4, 1])
-                with col_info:
-                    st.write(f"**{circle['name']}**: R={radius_display:.2f}{unit_display}, {circle['color']}")
-                with col_action:
-                    if st.button("🗑️", key=f"del_circle_viz_{i}"):
-                        st.session_state.circles_data.remove(circle)
-                        st.rerun()
-        
-        # Rectangles/Polygones
-        if st.session_state.rectangles_data:
-            st.write(f"**🔷 Polygones/Rectangles ({len(st.session_state.rectangles_data)})**")
-            for i, rect in enumerate(st.session_state.rectangles_data):
-                col_info, col_action = st.columns([4, 1])
-                with col_info:
-                    if 'length_km' in rect:
-                        st.write(f"**{rect['name']}** (Rectangle): {rect['length_km']*1000:.0f}m x {rect['width_km']*1000:.0f}m")
-                    else:
-                        st.write(f"**{rect['name']}** (Polygone): {len(rect['points'])} points")
-                with col_action:
-                    if st.button("🗑️", key=f"del_rect_viz_{i}"):
-                        st.session_state.rectangles_data.remove(rect)
-                        st.rerun()
+        col_type, col_color, col_name = st.columns(3)
+        with col_type:
+            type_filter = st.multiselect("Types", list(OBJECT_KIND_LABELS), format_func=OBJECT_KIND_LABELS.get,
+                                         key="objects_type_filter", placeholder="Tous")
+        with col_color:
+            available_colors = sorted({
+                obj.get('color') for kind in OBJECT_KINDS for obj in st.session_state[f"{kind}_data"] if obj.get('color')
+            })
+            color_filter = st.multiselect("Couleurs", available_colors, key="objects_color_filter", placeholder="Toutes")
+        with col_name:
+            name_filter = st.text_input("Nom contient", key="objects_name_filter")
+        
+        matches = filter_objects(type_filter, color_filter, name_filter)
+        
+        col_size, col_page, col_count = st.columns(3)
+        with col_size:
+            page_size = st.selectbox("Objets par page", OBJECT_TABLE_PAGE_SIZES, key="objects_page_size")
+        page_count = max(1, math.ceil(len(matches) / page_size))
+        if st.session_state.get('objects_page', 1) > page_count:
+            st.session_state.objects_page = page_count
+        with col_page:
+            page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="objects_page")
+        with col_count:
+            st.metric("Objets filtrés", len(matches))
+        
+        page_objects = matches[(page - 1) * page_size:page * page_size]
+        if page_objects:
+            rows = {f"{kind}:{id(obj)}": (kind, obj) for kind, obj in page_objects}
+            table = pd.DataFrame({
+                "Supprimer": pd.Series(False, index=list(rows), dtype=bool),
+                "Type": pd.Series([OBJECT_KIND_LABELS[kind] for kind, _ in page_objects], index=list(rows), dtype=str),
+                "Nom": pd.Series([str(obj.get('name', '')) for _, obj in page_objects], index=list(rows), dtype=str),
+                "Couleur": pd.Series([obj.get('color', '') for _, obj in page_objects], index=list(rows), dtype=str),
+                "Détails": pd.Series([object_details(kind, obj) for kind, obj in page_objects], index=list(rows), dtype=str),
+            })
+            
+            # La clé change avec les données, les filtres et la page : une sélection ne survit pas à un changement de lignes
+            editor_key = "objects_editor_" + str(abs(hash((
+                tuple(data_revision(kind) for kind in OBJECT_KINDS),
+                tuple(type_filter), tuple(color_filter), name_filter, page, page_size
+            ))))
+            edited = st.data_editor(
+                table,
+                key=editor_key,
+                hide_index=True,
+                use_container_width=True,
+                disabled=["Type", "Nom", "Couleur", "Détails"],
+                column_config={"Supprimer": st.column_config.CheckboxColumn("🗑️", help="Sélectionner pour suppression")}
+            )
+            
+            selected = [rows[key] for key in edited.index[edited["Supprimer"]]]
+            if st.button(f"🗑️ Supprimer la sélection ({len(selected)})", disabled=not selected, key="objects_delete_selected"):
+                for kind, obj in selected:
+                    remove_object(kind, obj)
+                st.rerun()
+        else:
+            st.info("Aucun objet ne correspond aux filtres")
     else:
         st.markdown("---")
         st.info("💡 Aucun objet KML présent. Créez des objets dans les autres onglets ou importez un fichier KML.")
@@ -2995,6 +2746,23 @@ with tab7:
                             st.error(f"❌ Erreur lecture TIFF: {e}")
                             os.unlink(tmp_path)
                             valid_file = False
+                        
+                        if valid_file:
+                            try:
+                                build_tiff_overviews(tmp_path)
+                            except (rasterio.errors.RasterioError, OSError, TypeError) as e:
+                                # Les lectures décimées fonctionnent aussi sans overviews ; rasterio lève
+                                # TypeError quand il ne reconnaît pas le fichier à ouvrir en écriture
+                                logger.warning("Overviews non construites pour %s : %s", uploaded_map.name, e)
+                    
+                    elif file_extension == 'mbtiles':
+                        try:
+                            metadata = read_mbtiles_metadata(tmp_path)
+                            st.success(f"✅ MBTiles détecté (format: {metadata.get('format', 'png')})")
+                        except sqlite3.DatabaseError as e:
+                            st.error(f"❌ Fichier MBTiles invalide: {e}")
+                            os.unlink(tmp_path)
+                            valid_file = False
                     
                     if valid_file:
                         tile_info = {
@@ -3005,6 +2773,7 @@ with tab7:
                         }
                         
                         st.session_state.custom_tiles.append(tile_info)
+                        bump_revision('custom_tiles')
                         st.success(f"Carte '{uploaded_map.name}' chargée!")
                         st.rerun()
     
@@ -3020,14 +2789,77 @@ with tab7:
             with col3:
                 if st.button("🗑️", key=f"del_tile_{i}"):
                     try:
+                        if TILE_SERVER_ENABLED:
+                            get_tile_server().remove_file(tile['path'])
                         os.unlink(tile['path'])
                     except:
                         pass
                     st.session_state.custom_tiles.pop(i)
+                    bump_revision('custom_tiles')
                     st.rerun()
 
 
 # Footer
 st.markdown("---")
 
-st.markdown("*Générateur KML pour SDVFR - Version Streamlit par Valentin BALAYN*")
\ No newline at end of file
+st.markdown("*Générateur KML pour SDVFR - Version Streamlit par Valentin BALAYN*")
+
+# Fin du profilage : le profil de l'exécution, marqué du nombre d'objets, reste disponible au téléchargement
+if 'active_profiler' in st.session_state:
+    st.session_state.last_profile = st.session_state.pop('active_profiler').result(
+        **{kind: len(st.session_state[f"{kind}_data"]) for kind in OBJECT_KINDS}
+    )
+
+# Panneau de performance (KML_PERF=1) : durée des étapes sur les dernières exécutions de la session
+if PERF_ENABLED:
+    perf_record = finish_collection(objects={kind: len(st.session_state[f"{kind}_data"]) for kind in OBJECT_KINDS})
+    st.session_state.perf_history.append(perf_record)
+    with st.expander("⏱️ Performance"):
+        history = list(st.session_state.perf_history)
+        st.caption(f"{len(history)} dernière(s) exécution(s) de la session (maximum {PERF_HISTORY_SIZE})")
+        st.dataframe(pd.DataFrame([
+            {
+                "Exécution": datetime.fromtimestamp(rec["time"]).strftime("%H:%M:%S"),
+                "Durée (ms)": round(rec["total"] * 1000, 1),
+                **{OBJECT_KIND_LABELS[kind]: count for kind, count in rec["objects"].items()},
+            }
+            for rec in reversed(history)
+        ]), hide_index=True, use_container_width=True)
+
+        stage_rows = {}
+        for rec in history:
+            for stage, (elapsed, calls) in rec["stages"].items():
+                runs, total, longest = stage_rows.get(stage, (0, 0.0, 0.0))
+                stage_rows[stage] = (runs + 1, total + elapsed, max(longest, elapsed))
+        rows = []
+        for stage, (runs, total, longest) in stage_rows.items():
+            elapsed, calls = perf_record["stages"].get(stage, (0.0, 0))
+            rows.append({
+                "Étape": stage,
+                "Dernière (ms)": round(elapsed * 1000, 1),
+                "Appels (dernière)": calls,
+                "Moyenne (ms)": round(total / runs * 1000, 1),
+                "Max (ms)": round(longest * 1000, 1),
+                "Exécutions": runs,
+            })
+        rows.sort(key=lambda row: row["Dernière (ms)"], reverse=True)
+        st.dataframe(pd.DataFrame(rows, columns=["Étape", "Dernière (ms)", "Appels (dernière)", "Moyenne (ms)",
+                                                 "Max (ms)", "Exécutions"]),
+                     hide_index=True, use_container_width=True)
+
+if st.session_state.last_profile:
+    profile = st.session_state.last_profile
+    with st.expander("🔬 Profil de l'exécution"):
+        st.caption(" · ".join(f"{OBJECT_KIND_LABELS[kind]} : {count}" for kind, count in profile['tags'].items()))
+        if profile['name'].endswith(".pstats"):
+            st.caption("Lecture : `python -m pstats fichier.pstats` (ou snakeviz)")
+        else:
+            st.caption("Lecture : https://www.speedscope.app")
+        st.download_button(
+            label="📥 Télécharger le profil",
+            data=profile['data'],
+            file_name=profile['name'],
+            mime=profile['mime'],
+            on_click="ignore",
+            use_container_width=True
+        )
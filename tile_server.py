@@ -0,0 +1,497 @@
+# Serveur de tuiles XYZ local pour les cartes personnalisées
+# Les TIFF sont découpés à la demande en tuiles web-mercator et mis en cache sur disque (taille bornée),
+# les MBTiles sont lus en lecture seule (tuiles raster servies telles quelles, vectorielles rendues en PNG)
+# Le navigateur doit pouvoir joindre le serveur : en déploiement, il faut l'exposer (proxy) et
+# indiquer son URL publique, sinon les tuiles sont demandées au localhost de l'utilisateur
+
+import gzip
+import hashlib
+import math
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+TILE_SIZE = 256
+WEB_MERCATOR_HALF = 20037508.342789244  # Demi-circonférence de la projection EPSG:3857 (m)
+TILE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "kml_generator_tiles")
+TILE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+TILE_CACHE_EVICT_RATIO = 0.8  # Après dépassement, le cache est ramené à 80 % de sa taille maximale
+
+MBTILES_POOL_SIZE = 4
+MBTILES_CACHE_TILES = 512
+VECTOR_TILE_COLOR = (255, 0, 255)  # Magenta, comme l'affichage par défaut de SD VFR Next
+
+IMAGE_CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+}
+
+TILE_PATH_PATTERN = re.compile(r'^/tiles/([A-Za-z0-9_-]+)/(\d+)/(\d+)/(\d+)\.png$')
+
+
+def file_source_id(path):
+    """Identifiant stable d'un fichier source (chemin, taille et date de modification)"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def cache_files(directory):
+    """[(date de modification, taille, chemin)] des fichiers d'un dossier de cache"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def tile_bounds_mercator(z, x, y):
+    """Emprise (gauche, bas, droite, haut) d'une tuile XYZ en EPSG:3857"""
+    tile_span = 2 * WEB_MERCATOR_HALF / (2 ** z)
+    left = -WEB_MERCATOR_HALF + x * tile_span
+    top = WEB_MERCATOR_HALF - y * tile_span
+    return left, top - tile_span, left + tile_span, top
+
+
+def tile_latlon_bounds(z, x0, y0, x1, y1):
+    """Emprise [[sud, ouest], [nord, est]] du bloc de tuiles XYZ x0..x1, y0..y1 (inclus)"""
+    n = 2 ** z
+
+    def tile_lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return [[tile_lat(y1 + 1), x0 / n * 360 - 180], [tile_lat(y0), (x1 + 1) / n * 360 - 180]]
+
+
+def latlon_tile(lat, lon, z):
+    """Tuile XYZ (x, y) contenant un point, au zoom z"""
+    n = 2 ** z
+    lat = max(-85.0511, min(85.0511, lat))
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(n - 1, max(0, x)), min(n - 1, max(0, y))
+
+
+def native_zoom(resolution_m):
+    """Niveau de zoom dont la résolution correspond à celle de l'image source"""
+    if resolution_m <= 0:
+        return 18
+    zoom = math.log2(2 * WEB_MERCATOR_HALF / (TILE_SIZE * resolution_m))
+    return max(0, min(18, int(math.ceil(zoom))))
+
+
+class TiffTileSource:
+    """Source de tuiles PNG issues d'un TIFF géoréférencé (lectures fenêtrées reprojetées)"""
+
+    def __init__(self, path, source_id, on_cache_write=None):
+        import rasterio
+        from rasterio.enums import Resampling
+        from rasterio.vrt import WarpedVRT
+
+        self.path = path
+        self.source_id = source_id
+        self.cache_dir = os.path.join(TILE_CACHE_DIR, source_id)
+        self._on_cache_write = on_cache_write  # Appelé avec la taille de chaque tuile écrite sur disque
+        self._lock = threading.Lock()
+        self._src = rasterio.open(path)
+        # Canal alpha ajouté pour rendre transparentes les zones hors image après reprojection
+        add_alpha = self._src.nodata is None and self._src.count not in (2, 4)
+        self._vrt = WarpedVRT(self._src, crs='EPSG:3857', resampling=Resampling.bilinear, add_alpha=add_alpha)
+        self._color_bands = [1, 2, 3] if self._src.count >= 3 else [1]
+        self.content_type = 'image/png'
+        self.min_zoom = 0
+
+        self.bounds_mercator = tuple(self._vrt.bounds)
+        self.bounds_latlon = self._latlon_bounds()
+        self.max_native_zoom = native_zoom(self._vrt.res[0])
+
+    def _latlon_bounds(self):
+        from rasterio.warp import transform_bounds
+        west, south, east, north = transform_bounds('EPSG:3857', 'EPSG:4326', *self.bounds_mercator)
+        return [[south, west], [north, east]]
+
+    def get_tile(self, z, x, y):
+        """Tuile PNG (bytes), lue depuis le cache disque ou générée ; None hors de l'image"""
+        cache_path = os.path.join(self.cache_dir, str(z), str(x), f"{y}.png")
+        try:
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass  # Jamais générée, ou évincée du cache
+
+        tile = self._render_tile(z, x, y)
+        if tile is None:
+            return None
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(tile)
+        os.replace(tmp_path, cache_path)
+        if self._on_cache_write is not None:
+            self._on_cache_write(len(tile))
+        return tile
+
+    def _render_tile(self, z, x, y):
+        import numpy as np
+        from PIL import Image
+        from rasterio.enums import Resampling
+        from rasterio.windows import from_bounds
+
+        left, bottom, right, top = tile_bounds_mercator(z, x, y)
+        src_left, src_bottom, src_right, src_top = self.bounds_mercator
+
+        # Intersection tuile / image : le VRT reprojeté n'accepte pas les lectures hors emprise
+        inter_left, inter_right = max(left, src_left), min(right, src_right)
+        inter_bottom, inter_top = max(bottom, src_bottom), min(top, src_top)
+        if inter_left >= inter_right or inter_bottom >= inter_top:
+            return None
+
+        pixels_per_meter = TILE_SIZE / (right - left)
+        col0 = int(round((inter_left - left) * pixels_per_meter))
+        col1 = int(round((inter_right - left) * pixels_per_meter))
+        row0 = int(round((top - inter_top) * pixels_per_meter))
+        row1 = int(round((top - inter_bottom) * pixels_per_meter))
+        if col1 <= col0 or row1 <= row0:
+            return None
+
+        window = from_bounds(inter_left, inter_bottom, inter_right, inter_top, transform=self._vrt.transform)
+        out_shape = (row1 - row0, col1 - col0)
+        with self._lock:
+            data = self._vrt.read(self._color_bands, window=window, out_shape=(len(self._color_bands),) + out_shape,
+                                  resampling=Resampling.bilinear)
+            mask = self._vrt.dataset_mask(window=window, out_shape=out_shape)
+
+        rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        if len(self._color_bands) == 1:
+            data = np.repeat(data, 3, axis=0)
+        rgba[row0:row1, col0:col1, :3] = np.transpose(data, (1, 2, 0)).astype(np.uint8)
+        rgba[row0:row1, col0:col1, 3] = mask
+
+        buffer = BytesIO()
+        Image.fromarray(rgba).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def close(self):
+        self._vrt.close()
+        self._src.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def read_mbtiles_metadata(path):
+    """Lit la table metadata d'un MBTiles (lève sqlite3.DatabaseError si le fichier est invalide)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        conn.execute("SELECT 1 FROM tiles LIMIT 1")
+        return dict(conn.execute("SELECT name, value FROM metadata").fetchall())
+    finally:
+        conn.close()
+
+
+class MBTilesConnectionPool:
+    """Connexions SQLite en lecture seule réutilisées entre les requêtes de tuiles"""
+
+    def __init__(self, path, size=MBTILES_POOL_SIZE):
+        self._uri = f"file:{path}?mode=ro"
+        self._size = size
+        self._created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self._size
+                if create:
+                    self._created += 1
+            if create:
+                conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class MBTilesSource:
+    """Source de tuiles issues d'un fichier MBTiles (schéma TMS, lignes inversées)"""
+
+    def __init__(self, path, source_id):
+        self.path = path
+        self.source_id = source_id
+        self.metadata = read_mbtiles_metadata(path)
+        self.tile_format = self.metadata.get('format', 'png').lower()
+        self.is_vector = self.tile_format in ('pbf', 'mvt')
+        self.content_type = 'image/png' if self.is_vector else IMAGE_CONTENT_TYPES.get(self.tile_format, 'image/png')
+        self._pool = MBTilesConnectionPool(path)
+        self.get_tile = lru_cache(maxsize=MBTILES_CACHE_TILES)(self._fetch_tile)
+
+        self.min_zoom = int(self.metadata.get('minzoom', 0))
+        self.max_native_zoom = min(18, int(self.metadata.get('maxzoom', 14)))
+        self.bounds_latlon = None
+        if self.metadata.get('bounds'):
+            west, south, east, north = (float(v) for v in self.metadata['bounds'].split(','))
+            self.bounds_latlon = [[south, west], [north, east]]
+
+    def _fetch_tile(self, z, x, y):
+        tms_row = (2 ** z) - 1 - y
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, tms_row)
+            ).fetchone()
+        if row is None:
+            return None
+        data = bytes(row[0])
+        return self._render_vector_tile(data) if self.is_vector else data
+
+    def _render_vector_tile(self, data):
+        """Rendu PNG simple (contours et lignes) d'une tuile vectorielle Mapbox"""
+        import mapbox_vector_tile
+        from PIL import Image, ImageDraw
+
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        layers = mapbox_vector_tile.decode(data, default_options={'y_coord_down': True})
+
+        image = Image.new('RGBA', (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image, 'RGBA')
+        line_color = VECTOR_TILE_COLOR + (255,)
+        fill_color = VECTOR_TILE_COLOR + (60,)
+
+        for layer in layers.values():
+            scale = TILE_SIZE / layer.get('extent', 4096)
+            for feature in layer['features']:
+                geometry = feature['geometry']
+                geom_type = geometry['type']
+                coordinates = geometry['coordinates']
+                if geom_type.startswith('Multi'):
+                    parts, geom_type = coordinates, geom_type[len('Multi'):]
+                else:
+                    parts = [coordinates]
+
+                for part in parts:
+                    if geom_type == 'Point':
+                        px, py = part[0] * scale, part[1] * scale
+                        draw.ellipse([px - 3, py - 3, px + 3, py + 3], fill=line_color)
+                    elif geom_type == 'LineString':
+                        draw.line([(px * scale, py * scale) for px, py in part], fill=line_color, width=2)
+                    elif geom_type == 'Polygon':
+                        for ring in part:
+                            ring_pixels = [(px * scale, py * scale) for px, py in ring]
+                            if len(ring_pixels) >= 3:
+                                draw.polygon(ring_pixels, fill=fill_color, outline=line_color)
+
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def close(self):
+        self._pool.close()
+
+
+def mbtiles_mosaic(path, max_pixels):
+    """Assemble les tuiles d'un MBTiles en une image PNG, au plus grand zoom qui tient dans le budget
+    de pixels (affichage en overlay, sans serveur de tuiles)
+
+    Retourne (PNG en bytes, [[sud, ouest], [nord, est]]) ou None si le fichier n'a pas de tuile.
+    L'image est en web-mercator, comme la carte : Leaflet la place sans déformation.
+    """
+    from PIL import Image
+
+    source = MBTilesSource(path, None)
+    try:
+        with source._pool.connection() as conn:
+            # Bloc de tuiles (XYZ) de chaque zoom : depuis les bornes des métadonnées, ou depuis la table
+            blocks = {}
+            if source.bounds_latlon:
+                (south, west), (north, east) = source.bounds_latlon
+                for z in range(source.min_zoom, source.max_native_zoom + 1):
+                    if conn.execute("SELECT 1 FROM tiles WHERE zoom_level = ? LIMIT 1", (z,)).fetchone() is None:
+                        continue  # Zoom annoncé par les métadonnées mais absent du fichier
+                    x0, y0 = latlon_tile(north, west, z)
+                    x1, y1 = latlon_tile(south, east, z)
+                    blocks[z] = (x0, y0, x1, y1)
+            else:
+                rows = conn.execute(
+                    "SELECT zoom_level, MIN(tile_column), MIN(tile_row), MAX(tile_column), MAX(tile_row) "
+                    "FROM tiles GROUP BY zoom_level"
+                ).fetchall()
+                for z, x0, row0, x1, row1 in rows:
+                    blocks[z] = (x0, (2 ** z) - 1 - row1, x1, (2 ** z) - 1 - row0)
+            if not blocks:
+                return None
+
+            def block_pixels(z):
+                x0, y0, x1, y1 = blocks[z]
+                return (x1 - x0 + 1) * (y1 - y0 + 1) * TILE_SIZE * TILE_SIZE
+
+            fitting = [z for z in blocks if block_pixels(z) <= max_pixels]
+            z = max(fitting) if fitting else min(blocks)
+            x0, y0, x1, y1 = blocks[z]
+            tiles = conn.execute(
+                "SELECT tile_column, tile_row, tile_data FROM tiles "
+                "WHERE zoom_level = ? AND tile_column BETWEEN ? AND ? AND tile_row BETWEEN ? AND ?",
+                (z, x0, x1, (2 ** z) - 1 - y1, (2 ** z) - 1 - y0)
+            ).fetchall()
+        if not tiles:
+            return None
+
+        mosaic = Image.new('RGBA', ((x1 - x0 + 1) * TILE_SIZE, (y1 - y0 + 1) * TILE_SIZE), (0, 0, 0, 0))
+        for x, tms_row, data in tiles:
+            data = bytes(data)
+            if source.is_vector:
+                data = source._render_vector_tile(data)
+            tile = Image.open(BytesIO(data)).convert('RGBA')
+            if tile.size != (TILE_SIZE, TILE_SIZE):
+                tile = tile.resize((TILE_SIZE, TILE_SIZE))
+            y = (2 ** z) - 1 - tms_row
+            mosaic.paste(tile, ((x - x0) * TILE_SIZE, (y - y0) * TILE_SIZE))
+    finally:
+        source.close()
+
+    buffer = BytesIO()
+    mosaic.save(buffer, format='PNG')
+    return buffer.getvalue(), tile_latlon_bounds(z, x0, y0, x1, y1)
+
+
+class TileServer:
+    """Petit serveur HTTP local qui sert les tuiles des sources enregistrées"""
+
+    def __init__(self, host='127.0.0.1', port=0, public_url=None, cache_max_bytes=TILE_CACHE_MAX_BYTES):
+        self.sources = {}
+        self._sources_lock = threading.Lock()
+        # Cache disque des tuiles TIFF, partagé avec les exécutions précédentes : repris puis borné
+        self.cache_max_bytes = cache_max_bytes
+        self._cache_lock = threading.Lock()
+        self._cache_bytes = sum(size for _, size, _ in cache_files(TILE_CACHE_DIR))
+        self._evict_cache()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self.public_url = (public_url or f"http://localhost:{self.port}").rstrip('/')
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="tile-server", daemon=True)
+        self._thread.start()
+
+    def _make_handler(self):
+        server = self
+
+        class TileRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = TILE_PATH_PATTERN.match(self.path.split('?', 1)[0])
+                source = server.sources.get(match.group(1)) if match else None
+                if source is None:
+                    self.send_error(404)
+                    return
+                try:
+                    tile = source.get_tile(int(match.group(2)), int(match.group(3)), int(match.group(4)))
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                if tile is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', source.content_type)
+                self.send_header('Content-Length', str(len(tile)))
+                self.send_header('Cache-Control', 'max-age=3600')
+                self.end_headers()
+                self.wfile.write(tile)
+
+            def log_message(self, format, *args):
+                pass  # Pas de log par tuile
+
+        return TileRequestHandler
+
+    def _get_or_create(self, source_id, factory):
+        with self._sources_lock:
+            source = self.sources.get(source_id)
+            if source is None:
+                source = factory()
+                self.sources[source_id] = source
+            return source
+
+    def _tile_cached(self, size):
+        with self._cache_lock:
+            self._cache_bytes += size
+            over = self._cache_bytes > self.cache_max_bytes
+        if over:
+            self._evict_cache()
+
+    def _evict_cache(self):
+        """Supprime les tuiles les plus anciennes jusqu'à revenir sous TILE_CACHE_EVICT_RATIO de la taille maximale"""
+        with self._cache_lock:
+            if self._cache_bytes <= self.cache_max_bytes:
+                return
+            files = sorted(cache_files(TILE_CACHE_DIR))
+            total = sum(size for _, size, _ in files)
+            target = self.cache_max_bytes * TILE_CACHE_EVICT_RATIO
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._cache_bytes = total
+
+    def add_tiff(self, path):
+        """Enregistre un TIFF (une seule fois par version du fichier) et retourne sa source"""
+        source_id = file_source_id(path)
+        return self._get_or_create(source_id, lambda: TiffTileSource(path, source_id, self._tile_cached))
+
+    def add_mbtiles(self, path):
+        """Enregistre un fichier MBTiles et retourne sa source"""
+        source_id = file_source_id(path)
+        return self._get_or_create(source_id, lambda: MBTilesSource(path, source_id))
+
+    def unregister(self, source_id):
+        """Ferme une source ; les tuiles TIFF en cache sont supprimées avec elle"""
+        with self._sources_lock:
+            source = self.sources.pop(source_id, None)
+        if source is not None:
+            source.close()
+            with self._cache_lock:
+                self._cache_bytes = sum(size for _, size, _ in cache_files(TILE_CACHE_DIR))
+
+    def remove_file(self, path):
+        """Ferme les sources ouvertes sur un fichier avant sa suppression"""
+        for source_id, source in list(self.sources.items()):
+            if source.path == path:
+                self.unregister(source_id)
+
+    def tile_url(self, source_id):
+        """Modèle d'URL XYZ à passer à folium.TileLayer"""
+        return f"{self.public_url}/tiles/{source_id}/{{z}}/{{x}}/{{y}}.png"
+
+    def shutdown(self):
+        self._httpd.shutdown()
+        for source_id in list(self.sources):
+            self.unregister(source_id)